@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+append_ids.py – id книг, издателей и авторов для дозагрузки в живую БД
+======================================================================
+
+Без дозагрузки дамп рассчитан на пустую схему: id идут с 1 (IdPool без
+соединения).  С parse_irbis_file --append:
+
+    • load_existing() – уже имеющиеся издатели и авторы, по одному
+      запросу на таблицу, в те же словари, что ведёт DumpBuilder; новые
+      строки пишутся только для тех, кого там нет;
+    • IdPool(conn) – id берутся из последовательностей SERIAL-колонок
+      (nextval), блоками: один запрос резервирует сразу блок для
+      нескольких таблиц.  Блок растёт вдвое до MAX_BLOCK.  Неиспользованные
+      id остаются дырой в последовательности – для SERIAL это нормально,
+      зато приложение, пишущее в те же таблицы, с дампом не пересечётся.
+      Полный дамп пишет id явно и последовательности не двигает, поэтому
+      перед первым резервированием sync_sequences() поднимает каждую не
+      ниже max(id) таблицы.
+"""
+
+from __future__ import annotations
+from collections import deque
+from typing import Dict, Iterable, Optional, Tuple
+
+MIN_BLOCK = 1024
+MAX_BLOCK = 1 << 16
+
+_RESERVE_SQL = """
+SELECT w.t, nextval(s.seq)
+  FROM unnest(%s::text[], %s::int[]) AS w(t, n)
+ CROSS JOIN LATERAL (SELECT pg_get_serial_sequence('public.' || w.t, 'id')::regclass AS seq) s
+ CROSS JOIN LATERAL generate_series(1, w.n)
+"""
+
+
+def sync_sequences(conn, tables: Iterable[str]) -> None:
+    """Последовательность каждой таблицы – не ниже max(id) (после полной загрузки)."""
+    parts = [f"SELECT setval(pg_get_serial_sequence('public.{t}', 'id'), "
+             f"GREATEST(nextval(pg_get_serial_sequence('public.{t}', 'id')), "
+             f"COALESCE(max(id), 0))) FROM public.{t}" for t in tables]
+    with conn.cursor() as cur:
+        cur.execute(' UNION ALL '.join(parts))
+
+
+def reserve_ids(conn, wanted: Dict[str, int]) -> Dict[str, list]:
+    """{таблица: сколько} &rarr; {таблица: [id, ...]} – один запрос."""
+    tables = [t for t, n in wanted.items() if n > 0]
+    got: Dict[str, list] = {t: [] for t in tables}
+    if not tables:
+        return got
+    with conn.cursor() as cur:
+        cur.execute(_RESERVE_SQL, (tables, [wanted[t] for t in tables]))
+        for table, value in cur:
+            got[table].append(value)
+    for ids in got.values():
+        ids.sort()
+    return got
+
+
+class IdPool:
+    """
+    take(таблица) &rarr; следующий id.  Без conn – счётчик с 1 на таблицу
+    (пустая схема), с conn – из последовательностей БД блоками.
+    """
+
+    def __init__(self, tables: Iterable[str], conn=None):
+        self.conn = conn
+        self.next: Dict[str, int] = {t: 1 for t in tables}
+        self.pools: Dict[str, deque] = {t: deque() for t in self.next}
+        self.block: Dict[str, int] = {t: MIN_BLOCK for t in self.next}
+        self.reserved = 0                       # id взято из БД всего
+        if conn is not None:
+            sync_sequences(conn, self.next)
+
+    def take(self, table: str) -> int:
+        if self.conn is None:
+            value = self.next[table]
+            self.next[table] = value + 1
+            return value
+        pool = self.pools[table]
+        if not pool:
+            self.prefetch({table: self.block[table]})
+            self.block[table] = min(self.block[table] * 2, MAX_BLOCK)
+        return pool.popleft()
+
+    def prefetch(self, wanted: Dict[str, int]) -> None:
+        """Зарезервировать блоки сразу для нескольких таблиц (один запрос)."""
+        if self.conn is None:
+            return
+        for table, ids in reserve_ids(self.conn, wanted).items():
+            self.pools[table].extend(ids)
+            self.reserved += len(ids)
+
+    # ───── контрольные точки ─────
+    def checkpoint(self) -> Dict:
+        return {'next': dict(self.next), 'block': dict(self.block), 'reserved': self.reserved,
+                'pools': {t: list(p) for t, p in self.pools.items()}}
+
+    def restore(self, state: Dict) -> None:
+        self.next = dict(state['next'])
+        self.block = dict(state['block'])
+        self.reserved = state['reserved']
+        self.pools = {t: deque(p) for t, p in state['pools'].items()}
+
+
+def load_existing(conn, itersize: int = 50000
+                  ) -> Tuple[Dict[str, int], Dict[Tuple[str, str, str, Optional[int]], int]]:
+    """
+    Издатели name &rarr; id и авторы (last, first, patr, birth) &rarr; id из БД.
+    NULL в ФИО &rarr; '' – как у split_author_fields(); строки читаются
+    серверным курсором, по *itersize* за раз.
+    """
+    publishers: Dict[str, int] = {}
+    authors: Dict[Tuple[str, str, str, Optional[int]], int] = {}
+    with conn.cursor('append_publishers') as cur:
+        cur.itersize = itersize
+        cur.execute("SELECT name, id FROM public.publisher")
+        for name, pid in cur:
+            publishers[name] = pid
+    with conn.cursor('append_authors') as cur:
+        cur.itersize = itersize
+        cur.execute("SELECT last_name, first_name, patronymic, birth_year, id FROM public.author")
+        for last, first, patr, birth, aid in cur:
+            authors.setdefault((last or '', first or '', patr or '', birth), aid)
+    return publishers, authors
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+author_dedup.py – слияние вариантов написания одного автора
+===========================================================
+
+После normalize_author() / split_author_fields() автор – это кортеж
+(фамилия, имя, отчество), и в каталоге у одного человека их бывает
+несколько:
+
+    ('Иванов', 'И', 'И')    ('ИВАНОВ', 'И', 'И')    ('Ивaнов', 'И', 'И')   # латинская &laquo;a&raquo;
+    ('Иванов', 'И', '')     ('Семенов', 'П', 'А')   ('Семёнов', 'П', 'А')
+
+AuthorResolver собирает все варианты с частотами и строит карту
+слияния {вариант: канонический вариант}, которую DumpBuilder применяет
+до назначения id.
+
+Сравнение идёт только внутри блока – вариантов с одинаковым ключом
+blocking_key(): фамилия без регистра, &laquo;ё&raquo;, дефисов и латинских
+букв-двойников плюс первый инициал.  Блоки – словарь, поэтому всё
+вместе линейно по числу вариантов.  Внутри блока:
+
+    • одинаковое (после той же нормализации) отчество – один автор;
+    • вариант без отчества присоединяется к автору этого блока, если
+      отчество в блоке только одно; если их несколько – остаётся сам
+      по себе (&laquo;Иванов И.&raquo; при &laquo;Иванов И.И.&raquo; и &laquo;Иванов И.П.&raquo; неясен);
+    • вариант совсем без инициалов – так же, но по всем блокам фамилии.
+
+Затем нечёткий проход – опечатки (&laquo;Иваноов&raquo;, &laquo;Иавнов&raquo;, &laquo;Петрвоич&raquo;).
+Фамилии от FUZZY_MIN_LEN букв сводятся в кандидаты по ключам &laquo;фамилия
+без одной буквы&raquo; (у фамилий на расстоянии Дамерау ≤ 1 такой ключ
+общий), так что и здесь сравниваются только пары внутри маленьких
+групп.  Два кластера сливаются, если у них:
+
+    • фамилии совпадают или на расстоянии Дамерау ≤ 1 (обе не короче
+      FUZZY_MIN_LEN) и различаются не родовым окончанием – &laquo;Иванов&raquo; /
+      &laquo;Иванова&raquo;, &laquo;Ильин&raquo; / &laquo;Ильина&raquo;, &laquo;-ский&raquo; / &laquo;-ская&raquo; – разные люди;
+    • один первый инициал;
+    • отчества (у обоих есть) совпадают или так же близки;
+    • кроме друг друга, подходящих кластеров нет (иначе – неоднозначно).
+
+Такие слияния считаются отдельно (summary(), колонка в карте CLI) –
+их стоит просмотреть.  Канонический вариант – самый полный (с
+отчеством) и самый частый, с латинскими двойниками, исправленными на
+кириллицу.
+
+Запуск отдельно (карта слияния для просмотра):
+    python author_dedup.py irbis_data.txt [merge.tsv]
+"""
+
+from __future__ import annotations
+import re, sys
+from collections import Counter, defaultdict
+from itertools import combinations
+from typing import Dict, Iterable, List, Set, Tuple
+
+AuthorKey = Tuple[str, str, str]                # (фамилия, имя, отчество)
+
+# латинские буквы, которые в кириллическом тексте выглядят как русские
+_LOOKALIKES = str.maketrans('AaBCcEeHKkMOoPpTXxyY', 'АаВСсЕеНКкМОоРрТХхуУ')
+_CYRILLIC   = re.compile(r'[а-яё]', re.IGNORECASE)
+_NOT_LETTER = re.compile(r'[\W_]+')
+
+FUZZY_MIN_LEN = 6                               # короче – опечатку от другой фамилии не отличить
+# мужское / женское окончание (после нормализации): такие пары не сливаются
+_GENDER_ENDINGS = (('', 'а'), ('ий', 'ая'), ('ой', 'ая'), ('ый', 'ая'))
+
+
+def _cyrillic_fix(key: AuthorKey) -> AuthorKey:
+    """Латинские двойники &rarr; кириллица, если фамилия кириллическая."""
+    if not _CYRILLIC.search(key[0]):
+        return key
+    return tuple(part.translate(_LOOKALIKES) for part in key)
+
+
+def _norm(text: str) -> str:
+    return _NOT_LETTER.sub('', text.casefold().replace('ё', 'е'))
+
+
+def blocking_key(key: AuthorKey) -> Tuple[str, str]:
+    """(нормализованная фамилия, первый инициал) – варианты сравниваются только внутри."""
+    last, first, _ = _cyrillic_fix(key)
+    return _norm(last), _norm(first)[:1]
+
+
+def within_one(a: str, b: str) -> bool:
+    """Расстояние Дамерау (замена, вставка, удаление, перестановка соседних) ≤ 1."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+    if len(a) != len(b):
+        longer, shorter = (a, b) if len(a) > len(b) else (b, a)
+        return longer[i + 1:] == shorter[i:]
+    if a[i + 1:] == b[i + 1:]:                                  # замена
+        return True
+    return a[i:i + 2] == b[i + 1:i + 2] + b[i] and a[i + 2:] == b[i + 2:]     # перестановка
+
+
+def _gendered(a: str, b: str) -> bool:
+    """&laquo;Иванов&raquo; / &laquo;Иванова&raquo;, &laquo;Ильин&raquo; / &laquo;Ильина&raquo;, &laquo;Бельский&raquo; / &laquo;Бельская&raquo;."""
+    for x, y in ((a, b), (b, a)):
+        for male, female in _GENDER_ENDINGS:
+            if (x.endswith(male) and y.endswith(female)
+                    and x[:len(x) - len(male)] == y[:len(y) - len(female)]):
+                return True
+    return False
+
+
+def _close(a: str, b: str) -> bool:
+    """Равны или – обе не короче FUZZY_MIN_LEN – опечатка, но не родовое окончание."""
+    return a == b or (min(len(a), len(b)) >= FUZZY_MIN_LEN
+                      and within_one(a, b) and not _gendered(a, b))
+
+
+class AuthorResolver:
+    """
+    add() – варианты по мере чтения, merge_map() – карта слияния.
+    После merge_map(): blocks / variants / merged / ambiguous – для статистики,
+    fuzzy – варианты, слитые нечётким проходом.
+    """
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.blocks = self.variants = self.merged = self.ambiguous = 0
+        self.fuzzy: Set[AuthorKey] = set()
+
+    def add(self, key: AuthorKey, n: int = 1) -> None:
+        self.counts[key] += n
+
+    def update(self, keys: Iterable[AuthorKey]) -> None:
+        self.counts.update(keys)
+
+    def merge_map(self) -> Dict[AuthorKey, AuthorKey]:
+        """{вариант: канонический} – только варианты, которые меняются."""
+        # фамилия &rarr; инициал &rarr; отчество &rarr; [варианты]; '' – нет инициала / отчества
+        by_surname: Dict[str, Dict[str, Dict[str, List[AuthorKey]]]] = \
+            defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+        for key in self.counts:
+            surname, first = blocking_key(key)
+            by_surname[surname][first][_norm(key[2])].append(key)
+
+        clusters: List[List[AuthorKey]] = []
+        for blocks in by_surname.values():
+            bare = blocks.pop('', {}).get('', [])               # только фамилия
+            self.blocks += len(blocks) + bool(bare)
+            surname_clusters = []
+            for patrs in blocks.values():
+                no_patr = patrs.pop('', [])
+                groups = list(patrs.values())
+                if no_patr and len(groups) == 1:
+                    groups[0] = groups[0] + no_patr
+                elif no_patr:
+                    groups.append(no_patr)
+                    self.ambiguous += len(groups) > 1
+                surname_clusters.extend(groups)
+            if bare and len(surname_clusters) == 1:
+                surname_clusters[0] = surname_clusters[0] + bare
+            elif bare:
+                surname_clusters.append(bare)
+                self.ambiguous += len(surname_clusters) > 1
+            clusters.extend(surname_clusters)
+
+        # нечёткие пары: j сливается в i, cut[i] – где в i начинаются варианты j
+        cut: Dict[int, int] = {}
+        for i, j in self._fuzzy_links(clusters):
+            cut[i] = len(clusters[i])
+            clusters[i] = clusters[i] + clusters[j]
+            clusters[j] = []
+
+        merge: Dict[AuthorKey, AuthorKey] = {}
+        self.variants = len(self.counts)
+        self.fuzzy = set()
+        for n, cluster in enumerate(clusters):
+            if not cluster:
+                continue
+            best = max(cluster, key=lambda k: (bool(k[1]), bool(k[2]),
+                                                k == _cyrillic_fix(k), self.counts[k]))
+            canon = _cyrillic_fix(best)
+            for key in cluster:
+                if key != canon:
+                    merge[key] = canon
+            if n in cut:
+                # нечётко слита та часть, где нет выбранного варианта
+                first, second = cluster[:cut[n]], cluster[cut[n]:]
+                self.fuzzy.update(k for k in (second if best in first else first) if k != canon)
+        self.merged = len(merge)
+        return merge
+
+    def _fuzzy_links(self, clusters: List[List[AuthorKey]]) -> List[Tuple[int, int]]:
+        """Пары (i, j) кластеров – опечатки одного автора (см. описание модуля)."""
+        # кластер &rarr; (фамилия, инициал, отчество); без инициала или отчества – не участвует
+        info: Dict[int, Tuple[str, str, str]] = {}
+        by_surname: Dict[str, List[int]] = defaultdict(list)
+        for n, cluster in enumerate(clusters):
+            key = next((k for k in cluster if _norm(k[2])), None)
+            if key is None:
+                continue
+            surname, first = blocking_key(key)
+            if not first:
+                continue
+            info[n] = (surname, first, _norm(_cyrillic_fix(key)[2]))
+            by_surname[surname].append(n)
+
+        # фамилия &rarr; кандидаты по ключам &laquo;без одной буквы&raquo;
+        deletes: Dict[str, Set[str]] = defaultdict(set)
+        for surname in by_surname:
+            if len(surname) >= FUZZY_MIN_LEN:
+                deletes[surname].add(surname)
+                for i in range(len(surname)):
+                    deletes[surname[:i] + surname[i + 1:]].add(surname)
+        surname_pairs: Set[Tuple[str, str]] = {(s, s) for s in by_surname}
+        for bucket in deletes.values():
+            for a, b in combinations(sorted(bucket), 2):
+                if _close(a, b):
+                    surname_pairs.add((a, b))
+
+        partners: Dict[int, Set[int]] = defaultdict(set)
+        for a, b in surname_pairs:
+            pairs = (combinations(by_surname[a], 2) if a == b
+                     else ((i, j) for i in by_surname[a] for j in by_surname[b]))
+            for i, j in pairs:
+                if info[i][1] == info[j][1] and _close(info[i][2], info[j][2]):
+                    partners[i].add(j)
+                    partners[j].add(i)
+
+        links = []
+        for i, js in sorted(partners.items()):
+            if len(js) > 1:
+                self.ambiguous += 1
+                continue
+            j, = js
+            if i < j and len(partners[j]) == 1:
+                links.append((i, j))
+        return links
+
+    def summary(self) -> str:
+        return (f"вариантов {self.variants}, блоков {self.blocks}, "
+                f"слито {self.merged} (из них нечётко {len(self.fuzzy)}), "
+                f"неоднозначных {self.ambiguous}")
+
+# ──────────────── CLI ────────────────
+def _cli(infile: str, out_tsv: str = '') -> None:
+    from parse_irbis_file import collect_authors
+    resolver = collect_authors(infile)
+    merge = resolver.merge_map()
+    print(f"{infile}: {resolver.summary()}")
+    if out_tsv:
+        with open(out_tsv, 'w', encoding='utf-8', newline='\n') as f:
+            f.write("вариант\tканонический\tупоминаний\tнечётко\n")
+            for key, canon in sorted(merge.items()):
+                f.write(f"{' '.join(filter(None, key))}\t{' '.join(filter(None, canon))}"
+                        f"\t{resolver.counts[key]}\t{'да' if key in resolver.fuzzy else ''}\n")
+        print(f"Карта слияния: {out_tsv}")
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Использование: python author_dedup.py <irbis_data.txt> [merge.tsv]")
+    _cli(*sys.argv[1:])
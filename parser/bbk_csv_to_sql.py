@@ -1,15 +1,49 @@
 #!/usr/bin/env python3
 # bbk_csv_to_sql.py — CSV (ББК) &rarr; INSERT-ы PostgreSQL
 # Читает CSV в cp1251 (по умолчанию) с разделителем ‘;’.
-
+# CSV и SQL могут быть сжатыми: .gz / .bz2 / .xz (см. streams.py).
+#
+# --load DSN: CSV потоком идёт через COPY во временную таблицу, оттуда –
+# один INSERT ... SELECT ... ON CONFLICT DO UPDATE: новые коды
+# добавляются, у существующих обновляется описание, если оно другое.
+# В конце – сколько кодов добавлено / обновлено / не изменилось.
+# --format copy пишет то же самое SQL-скриптом.
+
+import argparse
 import csv
+import io
 import sys
 from pathlib import Path
 
+from streams import open_stream
+from sql_writer import copy_line
+
 OUT_COLS     = ("bbk_abb", "description")
 DELIM        = ';'
 HEADER_TAG   = ("bbk_full", "ББК.", "Рабочие таблицы")
 DEFAULT_ENC  = "cp1251"
+BATCH_ROWS   = 10000          # строк в одной пачке COPY для --load
+
+# ord – номер строки в CSV: при повторе кода берётся первое вхождение,
+# как у INSERT ... DO NOTHING
+STAGE_DDL  = ("CREATE TEMP TABLE bbk_load (ord INT, bbk_abb TEXT, description TEXT) "
+              "ON COMMIT DROP")
+STAGE_COPY = "COPY bbk_load (ord, bbk_abb, description) FROM stdin"
+MERGE_SQL  = """\
+WITH src AS (
+    SELECT DISTINCT ON (bbk_abb) bbk_abb, description
+      FROM bbk_load ORDER BY bbk_abb, ord
+), merged AS (
+    INSERT INTO public.bbk (bbk_abb, description)
+    SELECT bbk_abb, description FROM src
+    ON CONFLICT (bbk_abb) DO UPDATE SET description = EXCLUDED.description
+     WHERE public.bbk.description IS DISTINCT FROM EXCLUDED.description
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT (SELECT count(*) FROM src),
+       count(*) FILTER (WHERE inserted),
+       count(*) FILTER (WHERE NOT inserted)
+  FROM merged"""
 
 def escape_pg(text: str) -> str:
     return text.replace("'", "''")
@@ -26,7 +60,11 @@ def collect_records(reader):
     Склеивает строки и возвращает список [bbk_abb, description]
     (только те, у кого описание не пустое).
     """
-    records, cur = [], None
+    return list(iter_records(reader))
+
+def iter_records(reader):
+    """То же, что collect_records(), но потоком – по записи."""
+    cur = None
     for raw in reader:
         if is_header(raw):
             continue
@@ -36,7 +74,7 @@ def collect_records(reader):
         has_codes = any(row[:2])           # bbk_full или bbk_abb
         if has_codes:
             if cur and cur[1]:
-                records.append(cur)
+                yield cur
             abb  = row[1] or row[0]
             desc = row[2]
             cur  = [abb, desc]
@@ -47,12 +85,10 @@ def collect_records(reader):
                 cur[1] = f"{cur[1]} {strip_lead_comma(row[2])}".strip()
 
     if cur and cur[1]:
-        records.append(cur)
-
-    return records
+        yield cur
 
 def write_sql(recs, dst_sql: Path, src_name: str):
-    with dst_sql.open("w", encoding="utf-8", newline='\n') as out:
+    with open_stream(dst_sql, "w", encoding="utf-8", newline='\n') as out:
         out.write(f"-- INSERT-ы ББК, сгенерировано из {src_name}\n")
         for abb, desc in recs:
             out.write(
@@ -61,22 +97,76 @@ def write_sql(recs, dst_sql: Path, src_name: str):
                 "ON CONFLICT (bbk_abb) DO NOTHING;\n"
             )
 
-def main(src_csv: Path, dst_sql: Path, enc_in: str = DEFAULT_ENC):
+def write_copy(recs, dst_sql: Path, src_name: str) -> int:
+    """COPY во временную таблицу + слияние – SQL-скриптом; возвращает число записей."""
+    n = 0
+    with open_stream(dst_sql, "w", encoding="utf-8", newline='\n') as out:
+        out.write(f"-- COPY ББК, сгенерировано из {src_name}\n"
+                  f"BEGIN;\n{STAGE_DDL};\n{STAGE_COPY};\n")
+        for n, (abb, desc) in enumerate(recs, 1):
+            out.write(copy_line((n, abb, desc)))
+        out.write(f"\\.\n{MERGE_SQL};\nCOMMIT;\n")
+    return n
+
+def load(recs, dsn: str):
+    """
+    COPY пачками во временную таблицу и слияние с public.bbk в одной
+    транзакции.  Возвращает (записей в CSV, кодов, добавлено, обновлено).
+    """
+    import psycopg2
+    n = 0
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute(STAGE_DDL)
+        batch = []
+        for n, (abb, desc) in enumerate(recs, 1):
+            batch.append(copy_line((n, abb, desc)))
+            if len(batch) >= BATCH_ROWS:
+                cur.copy_expert(STAGE_COPY, io.StringIO(''.join(batch)))
+                batch.clear()
+        if batch:
+            cur.copy_expert(STAGE_COPY, io.StringIO(''.join(batch)))
+        cur.execute(MERGE_SQL)
+        codes, inserted, updated = cur.fetchone()
+    return n, codes, inserted, updated
+
+def main(src_csv: Path, dst_sql: Path = None, enc_in: str = DEFAULT_ENC,
+         fmt: str = 'sql', dsn: str = None):
     if not src_csv.exists():
         sys.exit(f"Файл {src_csv} не найден")
 
-    with src_csv.open(encoding=enc_in, newline='') as f:
+    with open_stream(src_csv, "r", encoding=enc_in, newline='') as f:
         reader = csv.reader(f, delimiter=DELIM)
-        records = collect_records(reader)
+        if dsn:
+            n, codes, inserted, updated = load(iter_records(reader), dsn)
+        elif fmt == 'copy':
+            n = write_copy(iter_records(reader), dst_sql, src_csv.name)
+        else:
+            records = collect_records(reader)
+            n = len(records)
+            if n:
+                write_sql(records, dst_sql, src_csv.name)
 
-    if not records:
+    if not n:
         sys.exit("После очистки не осталось ни одной записи")
-
-    write_sql(records, dst_sql, src_csv.name)
-    print(f"Сохранено {len(records)} BBK-записей в {dst_sql}")
+    if dsn:
+        print(f"BBK: записей {n}, кодов {codes} – добавлено {inserted}, "
+              f"обновлено {updated}, без изменений {codes - inserted - updated}")
+    else:
+        print(f"Сохранено {n} BBK-записей в {dst_sql}")
 
 if __name__ == "__main__":
-    if len(sys.argv) not in (3, 4):
-        sys.exit("usage: python bbk_csv_to_sql.py <src.csv> <out.sql> [encoding]")
-    enc = sys.argv[3] if len(sys.argv) == 4 else DEFAULT_ENC
-    main(Path(sys.argv[1]), Path(sys.argv[2]), enc)
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="CSV ББК &rarr; SQL / COPY / БД.")
+    ap.add_argument('src_csv', type=Path)
+    ap.add_argument('dst_sql', type=Path, nargs='?')
+    ap.add_argument('encoding', nargs='?', default=DEFAULT_ENC)
+    ap.add_argument('--format', dest='fmt', choices=('sql', 'copy'), default='sql',
+                    help='sql – INSERT ... DO NOTHING на строку (по умолчанию), '
+                         'copy – COPY во временную таблицу и слияние с обновлением описаний')
+    ap.add_argument('--load', metavar='DSN',
+                    help='грузить прямо в БД: COPY во временную таблицу и один '
+                         'INSERT ... ON CONFLICT DO UPDATE; счётчики добавленных / '
+                         'обновлённых / неизменных кодов')
+    args = ap.parse_args()
+    if not args.load and args.dst_sql is None:
+        ap.error("нужен выходной файл или --load DSN")
+    main(args.src_csv, args.dst_sql, args.encoding, args.fmt, args.load)
\ No newline at end of file
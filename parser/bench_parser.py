@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_parser.py – замеры скорости и памяти парсера ИРБИС
+=======================================================
+
+Прогоняет на синтетическом корпусе (gen_irbis_corpus.py) или на заданном
+экспорте набор замеров и печатает для каждого скорость (записей или
+вызовов в секунду) и пиковую память процесса (RSS):
+
+    parse_irbis_file[sql]   – весь парсер, офлайн по снимку справочников,
+    parse_irbis_file[copy]    дамп INSERT / COPY во временный файл;
+    parse_pub_info          – нормализаторы по отдельности, на значениях
+    normalize_author          тех же полей корпуса (#210, #700/#701, #910),
+    parse_copies              без кэша memo – чистая стоимость функции.
+
+Каждый замер идёт в отдельном процессе – иначе пиковый RSS одного
+смешивался бы с другим; из --repeat прогонов берётся лучшее время.
+
+Результаты можно сохранить (--json) и сравнить с сохранёнными раньше
+(--baseline): замедление или рост памяти больше --tolerance процентов
+считается регрессией, код возврата тогда 1.
+
+Запуск:
+    python bench_parser.py [--records 20000] [--input irbis_data.txt]
+                           [--dict-snapshot dicts.sqlite] [--workers N]
+                           [--json bench.json] [--baseline bench.json]
+"""
+
+from __future__ import annotations
+import argparse, json, os, platform, resource, subprocess, sys, tempfile, time
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, Tuple
+
+import memo
+from irbis_reader import iter_records
+
+CASES = ['parse_irbis_file[sql]', 'parse_irbis_file[copy]',
+         'parse_pub_info', 'normalize_author', 'parse_copies']
+
+Result = Dict[str, float]
+
+# ───────────────────────── замеры (в дочернем процессе) ─────────────────────────
+def _peak_rss_kb(who: int = resource.RUSAGE_SELF) -> int:
+    peak = resource.getrusage(who).ru_maxrss
+    return peak // 1024 if platform.system() == 'Darwin' else peak     # macOS – байты
+
+
+def _field_values(infile: str) -> Dict[str, list]:
+    """Входы нормализаторов – ровно то, что им передаёт parse_record()."""
+    from parse_irbis_file import _on_210, parse_author_700_701
+    values: Dict[str, list] = {'210': [], 'author': [], '910': []}
+    with open(infile, 'rb') as f:
+        for rec in iter_records(f):
+            copies = []
+            for line in rec:
+                tag, _, content = line.partition(':')
+                if tag == '#210':
+                    fields: Dict[str, str] = {}
+                    _on_210(content, fields)
+                    values['210'].append(fields['pub_info'])
+                elif tag in ('#700', '#701'):
+                    values['author'].append(parse_author_700_701(content))
+                elif tag == '#910':
+                    copies.append((0, content.strip()))
+            values['910'].append(copies)
+    return values
+
+
+def _run_parser(infile: str, snapshot: str, fmt: str, workers: int,
+                memo_size: int) -> Tuple[int, float]:
+    from parse_irbis_file import parse_irbis_file, OFFLINE_DSN
+    with open(infile, 'rb') as f:
+        n = sum(1 for _ in iter_records(f))
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        t0 = time.perf_counter()
+        with redirect_stdout(devnull):
+            parse_irbis_file(OFFLINE_DSN, infile, os.path.join(tmp, 'out.sql'), fmt,
+                             workers=workers, dict_snapshot=snapshot,
+                             memo_size=memo_size)
+        return n, time.perf_counter() - t0
+
+
+def _run_normalizer(case: str, infile: str) -> Tuple[int, float]:
+    from fix_pub_info import parse_pub_info
+    from fix_authors import normalize_author
+    from parse_irbis_file import parse_copies
+    values = _field_values(infile)
+    memo.configure(0)
+    fn: Callable
+    fn, items = {
+        'parse_pub_info':   (parse_pub_info, values['210']),
+        'normalize_author': (normalize_author, values['author']),
+        'parse_copies':     (parse_copies, values['910']),
+    }[case]
+    t0 = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items), time.perf_counter() - t0
+
+
+def run_case(case: str, infile: str, snapshot: str, workers: int = 1,
+             memo_size: int = memo.DEFAULT_SIZE) -> Result:
+    """Один замер в текущем процессе &rarr; {items, seconds, rate, rss_kb, rss_workers_kb}."""
+    if case.startswith('parse_irbis_file['):
+        n, sec = _run_parser(infile, snapshot, case[len('parse_irbis_file['):-1],
+                             workers, memo_size)
+    else:
+        n, sec = _run_normalizer(case, infile)
+    return {'items': n, 'seconds': sec, 'rate': n / sec if sec else 0.0,
+            'rss_kb': _peak_rss_kb(),
+            'rss_workers_kb': _peak_rss_kb(resource.RUSAGE_CHILDREN)}
+
+# ───────────────────────── прогон (родительский процесс) ─────────────────────────
+def _spawn(case: str, args) -> Result:
+    cmd = [sys.executable, os.path.abspath(__file__), '--case', case,
+           '--input', args.input, '--dict-snapshot', args.dict_snapshot,
+           '--workers', str(args.workers), '--memo-size', str(args.memo_size)]
+    proc = subprocess.run(cmd, capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode:
+        sys.exit(f"Ошибка в замере {case}:\n{proc.stderr}")
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def bench(args) -> Dict[str, Result]:
+    results: Dict[str, Result] = {}
+    for case in args.cases:
+        runs = [_spawn(case, args) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r['seconds'])
+        best['rss_kb'] = max(r['rss_kb'] for r in runs)
+        best['rss_workers_kb'] = max(r['rss_workers_kb'] for r in runs)
+        results[case] = best
+        unit = 'записей/с' if case.startswith('parse_irbis_file') else 'вызовов/с'
+        workers = (f"  (+ процессы {best['rss_workers_kb'] / 1024:.0f} МиБ)"
+                   if best['rss_workers_kb'] else '')
+        print(f"  ▸ {case:<23}: {best['rate']:>11,.0f} {unit}  "
+              f"({best['items']} за {best['seconds']:.2f} с), "
+              f"пик RSS {best['rss_kb'] / 1024:.0f} МиБ{workers}")
+    return results
+
+
+def compare(results: Dict[str, Result], baseline: Dict[str, Result],
+            tolerance: float) -> List[str]:
+    """Регрессии относительно *baseline*: медленнее или тяжелее больше чем на tolerance %."""
+    problems = []
+    k = tolerance / 100
+    for case, cur in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        if cur['rate'] < base['rate'] * (1 - k):
+            problems.append(f"{case}: скорость {cur['rate']:,.0f} против {base['rate']:,.0f}/с "
+                            f"({(cur['rate'] / base['rate'] - 1) * 100:+.1f}%)")
+        if cur['rss_kb'] > base['rss_kb'] * (1 + k):
+            problems.append(f"{case}: пик RSS {cur['rss_kb']} против {base['rss_kb']} КиБ "
+                            f"({(cur['rss_kb'] / base['rss_kb'] - 1) * 100:+.1f}%)")
+    return problems
+
+# ──────────────── CLI ────────────────
+def main() -> None:
+    ap = argparse.ArgumentParser(description='Замеры скорости и памяти парсера ИРБИС.')
+    ap.add_argument('--input', metavar='FILE',
+                    help='экспорт ИРБИС; без него корпус генерируется (gen_irbis_corpus.py)')
+    ap.add_argument('--records', type=int, default=20000, metavar='N',
+                    help='записей в генерируемом корпусе (по умолчанию 20000)')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--dict-snapshot', metavar='FILE',
+                    help='снимок справочников BBK/UDC; без него – из словаря генератора')
+    ap.add_argument('--workers', type=int, default=1, metavar='N',
+                    help='--workers для parse_irbis_file (по умолчанию 1)')
+    ap.add_argument('--memo-size', type=int, default=memo.DEFAULT_SIZE, metavar='N',
+                    help='--memo-size для parse_irbis_file (у нормализаторов кэш выключен)')
+    ap.add_argument('--repeat', type=int, default=3, metavar='N',
+                    help='прогонов на замер, берётся лучший (по умолчанию 3)')
+    ap.add_argument('--cases', nargs='+', choices=CASES, default=CASES, metavar='CASE',
+                    help=f"какие замеры запускать: {', '.join(CASES)}")
+    ap.add_argument('--json', metavar='FILE', help='сохранить результаты')
+    ap.add_argument('--baseline', metavar='FILE', help='сравнить с сохранёнными результатами')
+    ap.add_argument('--tolerance', type=float, default=10.0, metavar='PCT',
+                    help='допустимое ухудшение, %% (по умолчанию 10)')
+    ap.add_argument('--case', help=argparse.SUPPRESS)           # дочерний процесс
+    args = ap.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.input, args.dict_snapshot,
+                                  args.workers, args.memo_size)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from gen_irbis_corpus import DEFAULT_BBK, DEFAULT_UDC, snapshot_codes, write_corpus
+        if not args.dict_snapshot:
+            from dict_snapshot import save_snapshot
+            args.dict_snapshot = os.path.join(tmp, 'dicts.sqlite')
+            save_snapshot(args.dict_snapshot,
+                          {c: i for i, c in enumerate(DEFAULT_BBK, 1)},
+                          {c: i for i, c in enumerate(DEFAULT_UDC, 1)})
+        args.dict_snapshot = os.path.abspath(args.dict_snapshot)
+        if not args.input:
+            args.input = os.path.join(tmp, 'corpus.txt')
+            size = write_corpus(args.input, args.records, args.seed,
+                                **snapshot_codes(args.dict_snapshot))
+            print(f"Корпус: {args.records} записей, {size / 2**20:.1f} МиБ (seed {args.seed})")
+        args.input = os.path.abspath(args.input)
+
+        print(f"Замеры (лучший из {args.repeat} прогонов), Python {platform.python_version()}:")
+        results = bench(args)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print(f"Регрессии (больше {args.tolerance:g}%):")
+            for p in problems:
+                print(f"  ▸ {p}")
+            sys.exit(1)
+        print(f"Регрессий нет (порог {args.tolerance:g}%).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+checkpoint.py – контрольные точки долгих импортов
+=================================================
+
+Состояние (словарь из простых типов) сохраняется рядом с входным файлом
+через pickle.  Запись атомарная: сначала во временный файл, затем
+os.replace(), поэтому падение в момент сохранения не портит предыдущую
+контрольную точку.
+"""
+
+from __future__ import annotations
+import os, pickle
+from typing import Any, Dict, Optional
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump({'version': CHECKPOINT_VERSION, **state}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    """Состояние из *path* или None, если файла нет."""
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"{path}: несовместимая версия контрольной точки")
+    return state
+
+
+def remove_checkpoint(path: str) -> None:
+    for p in (path, f"{path}.tmp"):
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+code_index.py – префиксный индекс кодов BBK / UDC
+=================================================
+
+Оба классификатора десятичные: каждый следующий символ кода уточняет
+предыдущий (&laquo;32&raquo; &rarr; &laquo;32.9&raquo; &rarr; &laquo;32.97&raquo; &rarr; &laquo;32.973&raquo;).  Поэтому код, которого нет в
+справочнике дословно (&laquo;32.973.26-018.2&raquo;, &laquo;004.42:681.3&raquo;), можно привязать
+к самому длинному его префиксу, который в справочнике есть.
+
+Но предок засчитывается только на границе сегмента кода: дальше идёт
+разделитель (&laquo;.&raquo;, &laquo;-&raquo;, &laquo;(&raquo;, &laquo;:&raquo;, &laquo;/&raquo;, пробел...), конец кода или смена цифр
+на буквы и обратно (&laquo;24.235я73&raquo; &rarr; &laquo;24.235&raquo; – буквенные подразделения ББК).
+Посреди числа или слова код не режется: &laquo;15&raquo; не привязывается к &laquo;1&raquo;,
+&laquo;32.97&raquo; – к &laquo;32.9&raquo;, &laquo;99.999&raquo; – к &laquo;9&raquo;; такой код уходит к предку
+на прошлой границе (&laquo;32&raquo;) – грубее, но не чужой.
+
+CodeIndex строит по справочнику {код: id} префиксное дерево и находит
+такого предка за один проход по символам кода – O(длина кода).
+"""
+
+from __future__ import annotations
+from collections import Counter
+from typing import Dict, NamedTuple, Optional
+
+_ID = ''                         # ключ узла дерева, под которым лежит id кода
+
+
+def at_boundary(code: str, i: int) -> bool:
+    """Можно ли отрезать *code* перед символом i: не посреди числа и не посреди слова."""
+    if i >= len(code):
+        return True
+    a, b = code[i - 1], code[i]
+    return not (a.isdigit() and b.isdigit() or a.isalpha() and b.isalpha())
+
+
+class Match(NamedTuple):
+    id: int
+    depth: int        # уровень найденного кода: сколько кодов справочника на пути от корня
+    exact: bool       # код найден дословно
+
+
+class CodeIndex:
+    """
+    Префиксное дерево по кодам справочника.
+
+    Счётчики exact / by_ancestor / depths копят статистику всех вызовов
+    resolve() – для итоговых отчётов.
+    """
+
+    def __init__(self, code_map: Dict[str, int]):
+        self.root: dict = {}
+        for code, _id in code_map.items():
+            node = self.root
+            for ch in code:
+                node = node.setdefault(ch, {})
+            node[_ID] = _id
+        self.exact = 0
+        self.by_ancestor = 0
+        self.depths: Counter = Counter()
+
+    def resolve(self, code: str) -> Optional[Match]:
+        """
+        Самый длинный префикс *code*, который есть в справочнике и
+        кончается на границе сегмента (at_boundary), или None.
+        """
+        node, best, best_len, depth, best_depth = self.root, None, 0, 0, 0
+        for i, ch in enumerate(code, 1):
+            node = node.get(ch)
+            if node is None:
+                break
+            if _ID in node:
+                depth += 1
+                if at_boundary(code, i):
+                    best, best_len, best_depth = node[_ID], i, depth
+        if best is None:
+            return None
+        exact = best_len == len(code)
+        if exact:
+            self.exact += 1
+        else:
+            self.by_ancestor += 1
+        self.depths[best_depth] += 1
+        return Match(best, best_depth, exact)
+
+    def summary(self) -> str:
+        """&laquo;точно N, по предку M, уровни: 1×a 2×b ...&raquo;"""
+        levels = ' '.join(f"{d}×{n}" for d, n in sorted(self.depths.items()))
+        return f"точно {self.exact}, по предку {self.by_ancestor}; уровни: {levels or '–'}"
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+compact_store.py – компактные накопители строк до конца разбора
+===============================================================
+
+DumpBuilder до finish() держит все пары (книга, код BBK/UDC) и все
+экземпляры.  Списком кортежей каждая пара – это кортеж, int и строка,
+больше сотни байт; здесь строка – несколько чисел в array:
+
+    CodePairs  – book_id в array('I'), код – номер в словаре кодов
+                 (Interner), 8 байт на пару;
+    CopyRows   – book_id, номера даты / места хранения / цены в
+                 словаре, инвентарный номер – байты в общем bytearray.
+
+Когда в памяти набирается *spill_rows* строк, столбцы дописываются во
+временный файл и память освобождается; итерация отдаёт строки по
+порядку – сначала из файла, потом из памяти.  spill_rows = 0 – без
+сброса.  Словари значений всегда в памяти: различных кодов и дат мало.
+
+Для контрольных точек накопители пиклятся: массивы – как байты, а
+сброшенная часть – с spill_path файл именованный (рядом с контрольной
+точкой), и в пикл идут только путь и длина: файл только дописывается,
+при восстановлении он обрезается до длины на момент точки.  Без
+spill_path (временный файл) сброшенная часть пиклится байтами.
+"""
+
+from __future__ import annotations
+import os, struct, tempfile
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_SPILL_ROWS = 1 << 20
+
+_CHUNK = struct.Struct('<QQ')           # строк в куске, байт текста
+
+
+class Interner:
+    """Строка &rarr; номер; номер 0 – None."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.ids: Dict[Optional[str], int] = {None: 0}
+
+    def __call__(self, value: Optional[str]) -> int:
+        n = self.ids.get(value)
+        if n is None:
+            n = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return n
+
+    def __len__(self) -> int:
+        return len(self.values) - 1
+
+
+class _Columns:
+    """
+    Столбцы array('I') + необязательный текстовый столбец (bytearray и
+    концы значений в array('Q')), со сбросом кусков во временный файл
+    (или в файл spill_path).
+    """
+
+    def __init__(self, n_cols: int, text: bool, spill_rows: int,
+                 spill_path: Optional[str] = None):
+        self.cols = [array('I') for _ in range(n_cols)]
+        self.text = bytearray() if text else None
+        self.ends = array('Q') if text else None
+        self.spill_rows = spill_rows
+        self.spilled = 0                    # строк в файле
+        self.spill_path = spill_path
+        self._file = None
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.cols[0])
+
+    def _maybe_spill(self) -> None:
+        if self.spill_rows and len(self.cols[0]) >= self.spill_rows:
+            self._spill()
+
+    def _spill(self) -> None:
+        if self._file is None:
+            self._file = (open(self.spill_path, 'w+b') if self.spill_path else
+                          tempfile.TemporaryFile(prefix='irbis-', suffix='.cols'))
+        f = self._file
+        f.seek(0, 2)
+        rows = len(self.cols[0])
+        f.write(_CHUNK.pack(rows, len(self.text) if self.text is not None else 0))
+        for col in self.cols:
+            col.tofile(f)
+            del col[:]
+        if self.text is not None:
+            self.ends.tofile(f)
+            f.write(self.text)
+            del self.ends[:]
+            del self.text[:]
+        self.spilled += rows
+
+    def _chunks(self) -> Iterator[Tuple[List[array], Optional[array], Optional[bytes]]]:
+        """(столбцы, концы, текст) – куски из файла, затем из памяти."""
+        f = self._file
+        if f is not None:
+            f.seek(0)
+            left = self.spilled
+            while left:
+                rows, text_len = _CHUNK.unpack(f.read(_CHUNK.size))
+                cols = []
+                for _ in self.cols:
+                    col = array('I')
+                    col.fromfile(f, rows)
+                    cols.append(col)
+                ends = text = None
+                if self.text is not None:
+                    ends = array('Q')
+                    ends.fromfile(f, rows)
+                    text = f.read(text_len)
+                yield cols, ends, text
+                left -= rows
+        yield self.cols, self.ends, self.text
+
+    # ───── контрольные точки: сброшенная часть – длиной файла или байтами ─────
+    def __getstate__(self) -> Dict:
+        state = dict(self.__dict__)
+        f = state.pop('_file')
+        if f is not None and self.spill_path:
+            f.flush()
+            os.fsync(f.fileno())
+            state['_spilled_len'] = f.seek(0, 2)
+        elif f is not None:
+            f.seek(0)
+            state['_spilled_bytes'] = f.read()
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        data = state.pop('_spilled_bytes', None)
+        length = state.pop('_spilled_len', None)
+        self.__dict__.update(state)
+        self._file = None
+        if length is not None:
+            try:
+                self._file = open(self.spill_path, 'r+b')
+            except FileNotFoundError:
+                raise ValueError(f"нет файла сброшенных строк {self.spill_path}") from None
+            if self._file.seek(0, 2) < length:
+                raise ValueError(f"{self.spill_path} короче, чем при контрольной точке")
+            self._file.truncate(length)
+        elif data is not None:
+            self._file = tempfile.TemporaryFile(prefix='irbis-', suffix='.cols')
+            self._file.write(data)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            if self.spill_path:
+                os.remove(self.spill_path)
+
+
+class CodePairs(_Columns):
+    """(book_id, код) – как список пар, 8 байт на пару."""
+
+    def __init__(self, spill_rows: int = DEFAULT_SPILL_ROWS, spill_path: Optional[str] = None):
+        super().__init__(2, False, spill_rows, spill_path)
+        self.codes = Interner()
+
+    def append(self, book_id: int, code: str) -> None:
+        books, codes = self.cols
+        books.append(book_id)
+        codes.append(self.codes(code))
+        self._maybe_spill()
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        values = self.codes.values
+        for (books, codes), _, _ in self._chunks():
+            for book_id, n in zip(books, codes):
+                yield book_id, values[n]
+
+
+class CopyRows(_Columns):
+    """(book_id, инв. номер, дата, место хранения, цена) экземпляров."""
+
+    def __init__(self, spill_rows: int = DEFAULT_SPILL_ROWS, spill_path: Optional[str] = None):
+        super().__init__(4, True, spill_rows, spill_path)
+        self.values = Interner()            # даты, места хранения и цены вместе
+
+    def append(self, book_id: int, inv_no: str, date_in: Optional[str],
+               storage: Optional[str], price: Optional[str]) -> None:
+        books, dates, places, prices = self.cols
+        intern = self.values
+        books.append(book_id)
+        dates.append(intern(date_in))
+        places.append(intern(storage))
+        prices.append(intern(price))
+        self.text += inv_no.encode('utf-8')
+        self.ends.append(len(self.text))
+        self._maybe_spill()
+
+    def __iter__(self) -> Iterator[Tuple[int, str, Optional[str], Optional[str], Optional[str]]]:
+        values = self.values.values
+        for (books, dates, places, prices), ends, text in self._chunks():
+            begin = 0
+            for book_id, d, s, p, end in zip(books, dates, places, prices, ends):
+                yield book_id, text[begin:end].decode('utf-8'), values[d], values[s], values[p]
+                begin = end
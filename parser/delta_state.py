@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+delta_state.py – состояние для дельта-выгрузки (parse_irbis_file --delta)
+========================================================================
+
+Полный экспорт ИРБИС приходит каждую неделю, меняется в нём несколько
+процентов записей.  С --delta STATE парсер пишет только разницу с
+прошлым запуском, а здесь, в SQLite-файле STATE, хранится то, с чем
+сравнивать:
+
+    records   – идентичность записи &rarr; (book_id, отпечаток);
+    entities  – издатели и авторы &rarr; id (новые книги ссылаются на них);
+    gone      – book_id записей, пропавших из экспорта: DELETE пишется в
+                каждую дельту, пока книга может оставаться в БД (на руках);
+    meta      – следующие id (без --append), версия, время запуска.
+
+Идентичность записи – шифр хранения #903; у повторов одного шифра – с
+номером вхождения (&laquo;Ш-1#2&raquo;).  Без #903 – хэш заглавия, авторов и
+выходных данных (такая запись при их правке считается удалённой и
+новой).  Отпечаток – blake2b всех полей ParsedRecord: совпал – книга не
+менялась и в дамп не попадает.
+
+Все изменения STATE – в одной транзакции, которая фиксируется только
+после того, как дамп дописан (commit()); упавший запуск STATE не портит.
+Дампы надо загружать в том же порядке, в каком они сделаны.
+
+Запуск:
+    python delta_state.py <state.sqlite>   – сколько записей, издателей, авторов
+"""
+
+from __future__ import annotations
+import hashlib, json, sqlite3, sys
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+STATE_VERSION = '1'
+
+_DDL = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS records (identity TEXT PRIMARY KEY, "
+    "book_id INTEGER NOT NULL, fp BLOB NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS entities (kind TEXT NOT NULL, key TEXT NOT NULL, "
+    "id INTEGER NOT NULL, PRIMARY KEY (kind, key)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS gone (book_id INTEGER PRIMARY KEY)",
+)
+
+AuthorKey4 = Tuple[str, str, str, Optional[int]]
+
+
+def fingerprint(record: Sequence) -> bytes:
+    """Отпечаток разобранной записи: blake2b (16 байт) её полей."""
+    return hashlib.blake2b(repr(tuple(record)).encode('utf-8'), digest_size=16).digest()
+
+
+def content_key(title: str, authors: Sequence, publisher: Optional[str],
+                year: Optional[int]) -> str:
+    """Идентичность записи без #903 – по заглавию, авторам и выходным данным."""
+    return 'h:' + hashlib.blake2b(repr((title, tuple(authors), publisher, year))
+                                  .encode('utf-8'), digest_size=12).hexdigest()
+
+
+class DeltaState:
+    """
+    Открытый STATE.  По записи: identity() &rarr; lookup() &rarr; put();
+    в конце deleted(), save_entities() и commit().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        for ddl in _DDL:
+            self.db.execute(ddl)
+        meta = self.meta()
+        if meta.get('version') not in (None, STATE_VERSION):
+            self.db.close()
+            raise ValueError(f"{path}: версия состояния {meta['version']}, "
+                             f"ожидается {STATE_VERSION}")
+        self.fresh = 'version' not in meta
+        # идентичности этого запуска – по ним видно удалённые записи
+        self.db.execute("CREATE TEMP TABLE seen (identity TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.db.execute("BEGIN")
+        self.new = self.changed = self.unchanged = self.removed = self.retried = 0
+
+    def meta(self) -> Dict[str, str]:
+        return dict(self.db.execute("SELECT key, value FROM meta"))
+
+    # ───── записи ─────
+    def identity(self, base: str) -> str:
+        """*base* (шифр или content_key) &rarr; идентичность, уникальная в запуске."""
+        identity, n = base, 1
+        while self.db.execute("INSERT OR IGNORE INTO seen (identity) VALUES (?)",
+                              (identity,)).rowcount == 0:
+            n += 1
+            identity = f"{base}#{n}"
+        return identity
+
+    def lookup(self, identity: str) -> Optional[Tuple[int, bytes]]:
+        """(book_id, отпечаток) из прошлого запуска или None."""
+        return self.db.execute("SELECT book_id, fp FROM records WHERE identity = ?",
+                               (identity,)).fetchone()
+
+    def put(self, identity: str, book_id: int, fp: bytes) -> None:
+        self.db.execute("INSERT OR REPLACE INTO records (identity, book_id, fp) "
+                        "VALUES (?, ?, ?)", (identity, book_id, fp))
+
+    def deleted(self) -> List[int]:
+        """
+        book_id к удалению: записи, которых в этом запуске не было (из
+        records переходят в gone), и все пропавшие раньше – книга, выданная
+        на руки, дельтой не удаляется, и DELETE повторяется, пока в БД
+        её не станет (для уже удалённой он ничего не делает).
+        """
+        self.retried, = self.db.execute("SELECT count(*) FROM gone").fetchone()
+        self.removed = self.db.execute(
+            "INSERT OR IGNORE INTO gone (book_id) SELECT book_id FROM records "
+            "WHERE identity NOT IN (SELECT identity FROM seen)").rowcount
+        self.db.execute("DELETE FROM records WHERE identity NOT IN (SELECT identity FROM seen)")
+        return [bid for bid, in self.db.execute("SELECT book_id FROM gone ORDER BY book_id")]
+
+    # ───── издатели, авторы, счётчики id ─────
+    def entities(self) -> Tuple[Dict[str, int], Dict[AuthorKey4, int]]:
+        publishers: Dict[str, int] = {}
+        authors: Dict[AuthorKey4, int] = {}
+        for kind, key, eid in self.db.execute("SELECT kind, key, id FROM entities"):
+            if kind == 'publisher':
+                publishers[key] = eid
+            else:
+                authors[tuple(json.loads(key))] = eid
+        return publishers, authors
+
+    def save_entities(self, publisher_ids: Dict[str, int],
+                      author_ids: Dict[AuthorKey4, int]) -> None:
+        rows: List[Tuple[str, str, int]] = [('publisher', k, v) for k, v in publisher_ids.items()]
+        rows += [('author', json.dumps(list(k), ensure_ascii=False), v)
+                 for k, v in author_ids.items()]
+        self.db.executemany("INSERT OR REPLACE INTO entities (kind, key, id) VALUES (?, ?, ?)",
+                            rows)
+
+    def next_ids(self) -> Dict[str, int]:
+        """Следующие id по таблицам (для IdPool без БД); пустое – с 1."""
+        return {k[5:]: int(v) for k, v in self.meta().items() if k.startswith('next_')}
+
+    def commit(self, next_ids: Dict[str, int], parser: str) -> None:
+        self.db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ('version', STATE_VERSION), ('parser', parser),
+            ('updated', f"{datetime.now():%Y-%m-%d %H:%M:%S}"),
+            *((f"next_{t}", str(v)) for t, v in next_ids.items()),
+        ])
+        self.db.execute("COMMIT")
+
+    def close(self) -> None:
+        """Без commit() – откат: STATE остаётся как до запуска."""
+        if self.db.in_transaction:
+            self.db.execute("ROLLBACK")
+        self.db.close()
+
+    def summary(self) -> str:
+        return (f"новых {self.new}, изменено {self.changed}, без изменений "
+                f"{self.unchanged}, удалено {self.removed}"
+                f"{f' (и повторно DELETE пропавших раньше: {self.retried})' if self.retried else ''}")
+
+# ──────────────── CLI ────────────────
+def _cli(path: str) -> None:
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        meta = dict(db.execute("SELECT key, value FROM meta"))
+        records, = db.execute("SELECT count(*) FROM records").fetchone()
+        kinds = dict(db.execute("SELECT kind, count(*) FROM entities GROUP BY kind"))
+        gone, = db.execute("SELECT count(*) FROM gone").fetchone()
+    finally:
+        db.close()
+    print(f"Состояние {path}: версия {meta.get('version')}, парсер {meta.get('parser')}, "
+          f"обновлено {meta.get('updated')}")
+    print(f"Записей: {records}, издателей: {kinds.get('publisher', 0)}, "
+          f"авторов: {kinds.get('author', 0)}, пропавших из экспорта: {gone}")
+    nexts = {k[5:]: v for k, v in meta.items() if k.startswith('next_')}
+    if nexts:
+        print("Следующие id: " + ', '.join(f"{t} {v}" for t, v in sorted(nexts.items())))
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit("Использование: python delta_state.py <state.sqlite>")
+    _cli(sys.argv[1])
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+dict_snapshot.py – локальный снимок справочников BBK / UDC
+==========================================================
+
+Парсеру от БД нужны только словари {bbk_abb: id} и {udc_abb: id}.
+Снимок хранит их в SQLite-файле вместе с контрольной суммой исходной
+таблицы (md5 по строкам id + код, считается на сервере), поэтому:
+    • без БД парсер работает полностью офлайн;
+    • с БД таблица целиком скачивается, только если её сумма изменилась.
+
+Запуск отдельно (создать / обновить снимок):
+    python dict_snapshot.py "<DSN>" dicts.sqlite
+"""
+
+from __future__ import annotations
+import sqlite3, sys, psycopg2
+from datetime import datetime
+from typing import Dict, Tuple
+
+from fix_bbk import load_bbk_map
+from fix_udc import load_udc_map
+
+SNAPSHOT_VERSION = '1'
+
+# таблица снимка &rarr; (таблица БД, колонка кода, загрузчик)
+_SOURCES = {
+    'bbk': ('public.bbk', 'bbk_abb', load_bbk_map),
+    'udc': ('public.udc', 'udc_abb', load_udc_map),
+}
+
+# ───────────────────────── helpers ─────────────────────────
+def table_checksum(cur, name: str) -> Tuple[int, str]:
+    """(число строк, md5) таблицы справочника – считается на сервере."""
+    table, col, _ = _SOURCES[name]
+    cur.execute(
+        f"SELECT count(*), coalesce(md5(string_agg(id::text || E'\\t' || {col}, "
+        f"E'\\n' ORDER BY id)), '') FROM {table};")
+    rows, digest = cur.fetchone()
+    return rows, digest
+
+
+def _open(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    for name in _SOURCES:
+        db.execute(f"CREATE TABLE IF NOT EXISTS {name} "
+                   f"(abb TEXT PRIMARY KEY, id INTEGER NOT NULL) WITHOUT ROWID")
+    version = _meta(db).get('version')
+    if version not in (None, SNAPSHOT_VERSION):
+        db.close()
+        raise ValueError(f"{path}: версия снимка {version}, ожидается {SNAPSHOT_VERSION}")
+    return db
+
+
+def _meta(db: sqlite3.Connection) -> Dict[str, str]:
+    return dict(db.execute("SELECT key, value FROM meta"))
+
+
+def _store(db: sqlite3.Connection, name: str, code_map: Dict[str, int], digest: str) -> None:
+    with db:
+        db.execute(f"DELETE FROM {name}")
+        db.executemany(f"INSERT INTO {name} (abb, id) VALUES (?, ?)", code_map.items())
+        db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ('version', SNAPSHOT_VERSION),
+            (f"{name}_checksum", digest),
+            (f"{name}_rows", str(len(code_map))),
+            (f"{name}_refreshed", f"{datetime.now():%Y-%m-%d %H:%M:%S}"),
+        ])
+
+# ─────────────────────────── public API ─────────────────────────
+def refresh_snapshot(cur, path: str) -> Dict[str, bool]:
+    """
+    Сверяет суммы таблиц БД со снимком *path* и перезаливает изменившиеся.
+    Возвращает {имя: была_ли_перезалита}.
+    """
+    refreshed = {}
+    db = _open(path)
+    try:
+        meta = _meta(db)
+        for name, (_, _, loader) in _SOURCES.items():
+            _, digest = table_checksum(cur, name)
+            if meta.get(f"{name}_checksum") == digest:
+                refreshed[name] = False
+                continue
+            _store(db, name, loader(cur), digest)
+            refreshed[name] = True
+    finally:
+        db.close()
+    return refreshed
+
+
+def save_snapshot(path: str, bbk_map: Dict[str, int], udc_map: Dict[str, int]) -> None:
+    """
+    Снимок из готовых словарей, без БД (тесты, бенчмарки).  Сумма пустая,
+    поэтому первый же refresh_snapshot() с БД перезальёт обе таблицы.
+    """
+    db = _open(path)
+    try:
+        _store(db, 'bbk', bbk_map, '')
+        _store(db, 'udc', udc_map, '')
+    finally:
+        db.close()
+
+
+def load_snapshot(path: str) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """(bbk_map, udc_map) из снимка; FileNotFoundError, если снимка нет."""
+    try:
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.OperationalError:
+        raise FileNotFoundError(path) from None
+    try:
+        if _meta(db).get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"{path}: снимок пуст или другой версии")
+        bbk_map = dict(db.execute("SELECT abb, id FROM bbk"))
+        udc_map = dict(db.execute("SELECT abb, id FROM udc"))
+    finally:
+        db.close()
+    return bbk_map, udc_map
+
+# ──────────────── CLI ────────────────
+def _cli(dsn: str, path: str) -> None:
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        refreshed = refresh_snapshot(cur, path)
+    bbk_map, udc_map = load_snapshot(path)
+    for name, size in (('bbk', len(bbk_map)), ('udc', len(udc_map))):
+        state = 'обновлён' if refreshed[name] else 'без изменений'
+        print(f"{name.upper()}: {size} кодов, {state}")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Использование: python dict_snapshot.py \"<строка-DSN>\" <снимок.sqlite>")
+    _cli(sys.argv[1], sys.argv[2])
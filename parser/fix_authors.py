@@ -31,6 +31,8 @@ from __future__ import annotations
 import re
 from typing import Dict, List
 
+from memo import memoized
+
 # ─────────────────────────── helpers ────────────────────────────
 _SUBFIELD_SEP = "\x1f"          # разделитель подполя в ИРБИС-экспорте
 _INITIAL_RE   = re.compile(r"^[A-ZА-ЯЁ]$", re.IGNORECASE)   # однобуквенная инициала
@@ -55,6 +57,7 @@ def _parse_subfields(field_text: str) -> Dict[str, str]:
 
 
 # ─────────────────────────── public API ─────────────────────────
+@memoized('parse_author_700_701')
 def parse_author_700_701(field_text: str) -> str:
     """
     &laquo;\x1fAИванов\x1fBИ.О.&raquo;      &rarr; &laquo;Иванов И.О.&raquo;
@@ -70,6 +73,7 @@ def parse_author_700_701(field_text: str) -> str:
     return f"{last_name} {initials}".strip()
 
 
+@memoized('normalize_author')
 def normalize_author(full: str) -> str:
     """
     &laquo;Евтеев  Ю.И.&raquo;     &rarr; &laquo;Евтеев Ю.И.&raquo;
@@ -8,8 +8,10 @@ fix_bbk.py
     • запускать отдельно: python fix_bbk.py "<DSN>"
 """
 
-from typing import Dict, List, Tuple
-import sys, psycopg2
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from code_index import CodeIndex
+from relink import BBK, run_cli
 
 # ────────────────────────────────────────────────────────────────────
 def load_bbk_map(cur) -> Dict[str, int]:
@@ -19,38 +21,34 @@ def load_bbk_map(cur) -> Dict[str, int]:
 
 
 def filter_links(
-    pairs: List[Tuple[int, str]], bbk_map: Dict[str, int]
+    pairs: Iterable[Tuple[int, str]], bbk_map: Dict[str, int],
+    index: Optional[CodeIndex] = None,
 ) -> Tuple[List[Tuple[int, int]], int]:
     """
     Принимает [(book_id, bbk_code), …] и сопоставление code&rarr;id.
     Возвращает (валидные_связи, количество_пропущенных).
+
+    С index (CodeIndex) код, которого нет в справочнике дословно,
+    привязывается к самому длинному предку (&laquo;32.973.26-018.2&raquo; &rarr; &laquo;32.973&raquo;).
+    Повторяющиеся связи отбрасываются.
     """
     links, skipped = [], 0
+    seen = set()                                # book_id << 32 | bbk_id
     for book_id, code in pairs:
-        bbk_id = bbk_map.get(code)
-        if bbk_id:
-            links.append((book_id, bbk_id))
+        if index is None:
+            bbk_id = bbk_map.get(code)
         else:
+            m = index.resolve(code)
+            bbk_id = m.id if m else None
+        if not bbk_id:
             skipped += 1
+        elif (key := book_id << 32 | bbk_id) not in seen:     # два кода &rarr; один предок
+            seen.add(key)
+            links.append((book_id, bbk_id))
     return links, skipped
 # ────────────────────────────────────────────────────────────────────
-def _cli(dsn: str) -> None:
-    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
-        bbk_map = load_bbk_map(cur)
-        cur.execute("SELECT book_id, bbk_code FROM public.book_bbk_raw;")
-        raw_pairs = cur.fetchall()
-
-        links, skipped = filter_links(raw_pairs, bbk_map)
-        print(f"Всего пар RAW: {len(raw_pairs)}")
-        print(f"Совпали: {len(links)}   |   Пропущены: {skipped}")
-
-        # Для демонстрации выведем первые 10 строк INSERT-ов.
-        print("\nПример INSERT-ов:")
-        for book_id, bbk_id in links[:10]:
-            print(f"INSERT INTO public.book_bbk (book_id, bbk_id) "
-                  f"VALUES ({book_id}, {bbk_id});")
+def _cli() -> None:
+    run_cli(BBK, load_bbk_map, filter_links, 'fix_bbk.py')
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        sys.exit("Использование: python fix_bbk.py \"<строка-DSN>\"")
-    _cli(sys.argv[1])
\ No newline at end of file
+    _cli()
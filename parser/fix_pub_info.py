@@ -19,6 +19,8 @@ from __future__ import annotations
 import re
 from typing import Optional, Tuple
 
+from memo import memoized
+
 _RE_YEAR = re.compile(r'(\d{4})\s*$')  # год, 4 цифры в конце
 
 # Популярные аббревиатуры / синонимы для городов
@@ -58,6 +60,7 @@ def _looks_like_publisher(token: str) -> bool:
     low = token.lower()
     return any(h in low for h in _PUBLISHER_HINTS)
 
+@memoized('parse_pub_info')
 def parse_pub_info(raw: str) -> Tuple[Optional[str], Optional[str], Optional[int]]:
     """Главная точка входа."""
     if not raw:
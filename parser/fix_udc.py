@@ -3,8 +3,10 @@
 fix_udc.py — полная функциональная копия fix_bbk.py, но для УДК.
 """
 
-from typing import Dict, List, Tuple
-import sys, psycopg2
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from code_index import CodeIndex
+from relink import UDC, run_cli
 
 
 def load_udc_map(cur) -> Dict[str, int]:
@@ -13,34 +15,27 @@ def load_udc_map(cur) -> Dict[str, int]:
 
 
 def filter_links(
-    pairs: List[Tuple[int, str]], udc_map: Dict[str, int]
+    pairs: Iterable[Tuple[int, str]], udc_map: Dict[str, int],
+    index: Optional[CodeIndex] = None,
 ) -> Tuple[List[Tuple[int, int]], int]:
     links, skipped = [], 0
+    seen = set()                                # book_id << 32 | udc_id
     for book_id, code in pairs:
-        udc_id = udc_map.get(code)
-        if udc_id:
-            links.append((book_id, udc_id))
+        if index is None:
+            udc_id = udc_map.get(code)
         else:
+            m = index.resolve(code)
+            udc_id = m.id if m else None
+        if not udc_id:
             skipped += 1
+        elif (key := book_id << 32 | udc_id) not in seen:     # два кода &rarr; один предок
+            seen.add(key)
+            links.append((book_id, udc_id))
     return links, skipped
 
 
-def _cli(dsn: str) -> None:
-    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
-        udc_map = load_udc_map(cur)
-        cur.execute("SELECT book_id, udc_code FROM public.book_udc_raw;")
-        raw_pairs = cur.fetchall()
-
-        links, skipped = filter_links(raw_pairs, udc_map)
-        print(f"Всего пар RAW: {len(raw_pairs)}")
-        print(f"Совпали: {len(links)}   |   Пропущены: {skipped}")
-
-        print("\nПример INSERT-ов:")
-        for book_id, udc_id in links[:10]:
-            print(f"INSERT INTO public.book_udc (book_id, udc_id) "
-                  f"VALUES ({book_id}, {udc_id});")
+def _cli() -> None:
+    run_cli(UDC, load_udc_map, filter_links, 'fix_udc.py')
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        sys.exit("Использование: python fix_udc.py \"<строка-DSN>\"")
-    _cli(sys.argv[1])
\ No newline at end of file
+    _cli()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+gen_irbis_corpus.py – синтетический экспорт ИРБИС для тестов и бенчмарков
+========================================================================
+
+Настоящие выгрузки каталога в репозиторий не кладутся, поэтому для
+замеров и проверок экспорт генерируется.  Записи похожи на живые:
+
+    • #920 IBIS (и доля не-IBIS записей, которые парсер отбрасывает);
+    • #200 ^A заглавие ^E вид издания ^F ответственность, #205, #215, #225;
+    • #210 ^A город ^C издательство ^D год – в тех написаниях, что
+      встречаются в каталоге (&laquo;М.&raquo;, &laquo;М. СПб&raquo;, без издательства, без года);
+    • #700 / #701 – инициалы в разных видах (&laquo;И.О.&raquo;, &laquo;И. О.&raquo;, &laquo;И.О&raquo;,
+      только фамилия), изредка латинские буквы-двойники в фамилии;
+    • #964 / #675 – коды из справочника, в т.ч. уточнённые (&laquo;32.973.26-018.2&raquo;)
+      и отсутствующие в справочнике вовсе;
+    • #910 – экземпляры, иногда несколько в одном поле, с датами и ценами
+      в разных форматах; битые (без ^B) и повторы инвентарных номеров;
+    • разделитель подполей &laquo;\\x1f&raquo; или &laquo;^&raquo; (на запись);
+    • дубликаты: запись целиком повторяет одну из предыдущих.
+
+Одинаковые параметры и seed дают побайтно одинаковый файл.
+
+Запуск:
+    python gen_irbis_corpus.py corpus.txt[.gz] --records 100000 [--seed 1]
+                               [--dict-snapshot dicts.sqlite]
+"""
+
+from __future__ import annotations
+import argparse, os, random
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from irbis_reader import RECORD_SEP
+from streams import open_stream
+
+# ───── словарь &laquo;по умолчанию&raquo; (если снимок справочников не задан) ─────
+DEFAULT_BBK = ['20', '22', '22.1', '22.11', '22.3', '32', '32.97', '32.973',
+               '32.973.26', '60', '65', '65.9', '65.9(2)', '74', '74.58', '81',
+               '83', '84', '84(2Рос=Рус)']
+DEFAULT_UDC = ['004', '004.4', '004.42', '37', '378', '51', '519', '519.2', '53',
+               '62', '621', '621.3', '681', '681.3', '82', '94', '94(47)']
+
+_BBK_TAILS = ['-018.2', '.1', '(2Рос)', '-7', '.26', 'я73']
+_UDC_TAILS = [':681.3', '.01', '(075.8)', '=161.1', '.0']
+_UNKNOWN   = ['99.999', '000.000', 'Х', '7А']
+
+# ───── словари для текста ─────
+_SURNAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов',
+             'Васильев', 'Соколов', 'Михайлов', 'Новиков', 'Фёдоров', 'Морозов',
+             'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров', 'Павлов',
+             'Козлов', 'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров',
+             'Никитин', 'Захаров', 'Зайцев', 'Соловьёв', 'Борисов', 'Яковлев',
+             'Евтеев', 'Чернышев', 'Григорьев', 'Романов', 'Воробьёв']
+_INITIALS = 'АБВГДЕИКЛМНОПРСТФЮЯ'
+_LOOKALIKE = str.maketrans('аеосрх', 'aeocpx')            # кириллица &rarr; латиница
+
+_WORDS = ['основы', 'теория', 'практика', 'введение', 'в', 'и', 'методы',
+          'анализ', 'систем', 'управления', 'экономика', 'предприятия',
+          'информатика', 'программирование', 'языке', 'математика', 'высшая',
+          'история', 'России', 'физика', 'курс', 'лекций', 'задачи',
+          'упражнения', 'технология', 'машиностроения', 'сети', 'данных',
+          'базы', 'проектирование', 'педагогика', 'психология', 'право',
+          'статистика', 'химия', 'органическая', 'литература', 'русская']
+_TYPES   = ['учебник', 'учеб. пособие', 'монография', 'сб. ст.', 'справочник',
+            'практикум', 'метод. указания', '']
+_PUBLISHERS = [('М.', 'Наука'), ('СПб', 'Питер'), ('М', 'Юнити-Дана'),
+               ('М.', 'Изд-во МГУ'), ('М.', 'Высш. шк.'), ('Ростов н/Д', 'Феникс'),
+               ('М. СПб', 'АО АСКОН'), ('Cambridge', 'Cambridge University Press'),
+               ('Новоуральск', ''), ('Екатеринбург', 'УГТУ-УПИ'), ('М.', 'ИНФРА-М')]
+_SERIES  = ['Высшее образование', 'Учебники для вузов', 'Библиотека студента',
+            'Классика', 'Профессиональное образование']
+_STORAGE = ['АБ', 'ЧЗ', 'КХ', 'АНЛ', 'АУЛ']
+_PRICES  = ['120,50', '1 200 р.', '35.00', '87', '2500,00', '', '1.234.56', '15 р']
+
+
+class _Gen:
+    """Состояние генератора: ГСЧ, параметры и счётчики номеров."""
+
+    def __init__(self, seed: int, bbk_codes: Sequence[str], udc_codes: Sequence[str],
+                 broken_rate: float, non_ibis_rate: float, caret_rate: float):
+        self.rnd = random.Random(seed)
+        self.bbk_codes = list(bbk_codes)
+        self.udc_codes = list(udc_codes)
+        self.broken_rate = broken_rate
+        self.non_ibis_rate = non_ibis_rate
+        self.caret_rate = caret_rate
+        self.next_inv = 100000
+        self.next_shelf = 1
+
+    # ───── поля ─────
+    def _code(self, codes: List[str], tails: List[str]) -> str:
+        r = self.rnd
+        x = r.random()
+        if x < 0.03:
+            return r.choice(_UNKNOWN)
+        code = r.choice(codes)
+        return code + r.choice(tails) if x < 0.35 else code
+
+    def _codes(self, codes: List[str], tails: List[str], sep: str) -> str:
+        n = self.rnd.choice((0, 1, 1, 1, 2, 2, 3))
+        return sep.join(self._code(codes, tails) for _ in range(n))
+
+    def _initials(self) -> str:
+        r = self.rnd
+        a, b = r.choice(_INITIALS), r.choice(_INITIALS)
+        return r.choice((f'{a}.{b}.', f'{a}.{b}.', f'{a}. {b}.', f'{a}.{b}',
+                         f'{a} .{b}', f'{a}.', ''))
+
+    def _surname(self) -> str:
+        r = self.rnd
+        name = r.choice(_SURNAMES)
+        if r.random() < 0.3:
+            name += 'а'                                 # Иванова, Петрова
+        if r.random() < 0.02:
+            name = name[0] + name[1:].translate(_LOOKALIKE)
+        return name
+
+    def _title(self) -> str:
+        words = self.rnd.choices(_WORDS, k=self.rnd.randint(2, 6))
+        return ' '.join(words).capitalize()
+
+    def _date(self) -> str:
+        r = self.rnd
+        d, m, y = r.randint(1, 28), r.randint(1, 12), r.randint(1965, 2024)
+        return r.choice((f'{d:02}.{m:02}.{y}', f'{d:02}.{m:02}.{y % 100:02}',
+                         f'{y}-{m:02}-{d:02}', f'{y}{m:02}{d:02}', ''))
+
+    def _copy(self, s: str, inv: Optional[str] = None) -> str:
+        r = self.rnd
+        if inv is None:
+            inv = str(self.next_inv)
+            self.next_inv += 1
+        return (f'{s}B{inv}{s}C{self._date()}{s}D{r.choice(_STORAGE)}'
+                f'{s}E{r.choice(_PRICES)}')
+
+    # ───── запись ─────
+    def record(self) -> str:
+        r = self.rnd
+        s = '^' if r.random() < self.caret_rate else '\x1f'
+        lines = [f'#920: {"IBIS" if r.random() >= self.non_ibis_rate else r.choice(("PAZK", "ASP"))}',
+                 f'#903: {self.next_shelf}']
+        self.next_shelf += 1
+
+        authors = [(self._surname(), self._initials()) for _ in range(r.choice((0, 1, 1, 1, 2, 3)))]
+        resp = ', '.join(f'{i} {n}' for n, i in authors)
+        lines.append(f'#200: {s}A{self._title()}{s}E{r.choice(_TYPES)}{s}F{resp}')
+        if r.random() < 0.25:
+            lines.append(f'#205: {s}A{r.randint(2, 9)}-е изд., перераб. и доп.')
+        city, pub = r.choice(_PUBLISHERS)
+        year = '' if r.random() < 0.05 else str(r.randint(1950, 2024))
+        lines.append(f'#210: {s}A{city}' + (f'{s}C{pub}' if pub else '') +
+                     (f'{s}D{year}' if year else ''))
+        lines.append(f'#215: {s}A{r.randint(16, 900)} с.' +
+                     (f'{s}1ил.' if r.random() < 0.4 else ''))
+        if r.random() < 0.2:
+            lines.append(f'#225: {s}A{r.choice(_SERIES)}' +
+                         (f'{s}V{r.randint(1, 5)}' if r.random() < 0.3 else ''))
+        if r.random() < 0.9:
+            lines.append('#964: ' + self._codes(self.bbk_codes, _BBK_TAILS, r.choice((', ', '; '))))
+        if r.random() < 0.8:
+            lines.append('#675: ' + self._codes(self.udc_codes, _UDC_TAILS, '; '))
+        for i, (name, initials) in enumerate(authors):
+            tag = '700' if i == 0 else '701'
+            lines.append(f'#{tag}: {s}A{name}' + (f'{s}B{initials}' if initials else ''))
+
+        last_inv = None
+        for _ in range(r.choice((0, 1, 1, 1, 2, 2, 3, 5))):
+            if r.random() < self.broken_rate:
+                lines.append(r.choice((f'#910: {s}A0{s}C{self._date()}{s}DАБ', '#910: ')))
+                continue
+            # изредка несколько экземпляров в одном поле или повтор номера
+            body = self._copy(s, last_inv if last_inv and r.random() < 0.05 else None)
+            if r.random() < 0.05:
+                body += self._copy(s)
+            lines.append(f'#910: {s}A0{body}')
+            last_inv = body[2:body.index(s, 2)]
+        return '\n'.join(lines)
+
+
+def generate(records: int, seed: int = 1, *,
+             bbk_codes: Sequence[str] = DEFAULT_BBK,
+             udc_codes: Sequence[str] = DEFAULT_UDC,
+             dup_rate: float = 0.02, broken_rate: float = 0.05,
+             non_ibis_rate: float = 0.05, caret_rate: float = 0.5) -> Iterator[str]:
+    """
+    *records* записей (текст без разделителя &laquo;*****&raquo;).  С вероятностью
+    dup_rate запись повторяет одну из недавних записей целиком.
+    """
+    g = _Gen(seed, bbk_codes, udc_codes, broken_rate, non_ibis_rate, caret_rate)
+    recent: List[str] = []
+    for _ in range(records):
+        if recent and g.rnd.random() < dup_rate:
+            yield g.rnd.choice(recent)
+            continue
+        rec = g.record()
+        if len(recent) < 1000:
+            recent.append(rec)
+        else:
+            recent[g.rnd.randrange(1000)] = rec
+        yield rec
+
+
+def write_corpus(path: str, records: int, seed: int = 1, **opts) -> int:
+    """
+    Пишет экспорт в *path* (UTF-8; .gz / .bz2 / .xz – сжатым);
+    возвращает размер файла в байтах.
+    """
+    with open_stream(path, 'w', encoding='utf-8', newline='\n') as f:
+        for rec in generate(records, seed, **opts):
+            f.write(rec)
+            f.write(f'\n{RECORD_SEP}\n')
+    return os.path.getsize(path)
+
+
+def snapshot_codes(path: str) -> Dict[str, List[str]]:
+    """Коды BBK / UDC из снимка справочников – чтобы корпус бил в живой словарь."""
+    from dict_snapshot import load_snapshot
+    bbk_map, udc_map = load_snapshot(path)
+    return {'bbk_codes': sorted(bbk_map), 'udc_codes': sorted(udc_map)}
+
+# ──────────────── CLI ────────────────
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Синтетический экспорт ИРБИС.')
+    ap.add_argument('output_file')
+    ap.add_argument('--records', type=int, default=10000, metavar='N',
+                    help='число записей (по умолчанию 10000)')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--dict-snapshot', metavar='FILE',
+                    help='брать коды BBK/UDC из снимка справочников (dict_snapshot.py)')
+    ap.add_argument('--dup-rate', type=float, default=0.02,
+                    help='доля записей-дубликатов (по умолчанию 0.02)')
+    ap.add_argument('--broken-rate', type=float, default=0.05,
+                    help='доля битых полей #910 (по умолчанию 0.05)')
+    ap.add_argument('--non-ibis-rate', type=float, default=0.05,
+                    help='доля записей не из IBIS (по умолчанию 0.05)')
+    ap.add_argument('--caret-rate', type=float, default=0.5,
+                    help='доля записей с разделителем &laquo;^&raquo; вместо \\x1f (по умолчанию 0.5)')
+    args = ap.parse_args()
+
+    codes = snapshot_codes(args.dict_snapshot) if args.dict_snapshot else {}
+    size = write_corpus(args.output_file, args.records, args.seed,
+                        dup_rate=args.dup_rate, broken_rate=args.broken_rate,
+                        non_ibis_rate=args.non_ibis_rate, caret_rate=args.caret_rate,
+                        **codes)
+    print(f"{args.output_file}: {args.records} записей, {size / 2**20:.1f} МиБ")
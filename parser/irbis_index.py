@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+irbis_index.py – индекс смещений записей экспорта ИРБИС
+=======================================================
+
+Чтобы разобрать одну запись, не нужно читать весь экспорт.  Индекс –
+это смещения начала каждой записи (array('Q'), 8 байт на запись) и
+номера записей IBIS по порядку.  Строится одним проходом по mmap файла
+и хранится рядом с ним (<file>.idx); если файл изменился (размер /
+mtime), индекс перестраивается.
+
+По id книги запись находится, только если дамп нумеровал книги подряд
+в порядке записей.  Так у полного дампа (с 1), а у --append – с первого
+id, выданного последовательностью, и то если выданные id шли без
+разрывов; у --delta – нет (у изменённых книг прежние id, неизменённые
+пропущены).  Поэтому parse_irbis_file --index записывает в заголовок
+индекса нумерацию своего дампа (first_id):
+
+    first_id ≥ 1  – книга с этим id – первая IBIS-запись, дальше подряд;
+    NOT_IN_ORDER  – id не по порядку записей: book отказывает;
+    0             – дампа с --index по файлу не было: book считает с 1
+                    (как полный дамп) и предупреждает.
+
+Нумерация записей – как у irbis_reader.iter_records(): пустые записи
+(два разделителя подряд) не считаются.
+
+Тот же индекс делит файл на куски примерно равного размера по
+границам записей – их parse_irbis_file --index раздаёт процессам пула.
+
+Запуск:
+    python irbis_index.py build  irbis_data.txt
+    python irbis_index.py record irbis_data.txt N [--parse]
+    python irbis_index.py book   irbis_data.txt ID [--parse]
+    python irbis_index.py ranges irbis_data.txt K
+"""
+
+from __future__ import annotations
+import argparse, io, mmap, os, struct, sys
+from array import array
+from bisect import bisect_left
+from typing import Iterator, List, Tuple
+
+from irbis_reader import RECORD_SEP, iter_records_at
+from streams import codec_of
+
+INDEX_MAGIC = b'IRBIDX02'
+_HEADER = struct.Struct('<8sQQQQq')     # magic, размер, mtime_ns, записей, книг, first_id
+NOT_IN_ORDER = -1                       # first_id: id книг дампа не по порядку записей
+_SEP = RECORD_SEP.encode('ascii')
+_IBIS_TAG = b'#920:'
+
+
+class RecordIndex:
+    """
+    starts[i] – смещение записи i (с нуля), books[k] – номер k-й (с нуля)
+    IBIS-записи.  size / mtime_ns – файла, по которому построен;
+    first_id – нумерация книг дампа (см. описание модуля).
+    """
+
+    def __init__(self, path: str, starts: array, books: array, size: int, mtime_ns: int,
+                 first_id: int = 0):
+        self.path = path
+        self.starts = starts
+        self.books = books
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.first_id = first_id
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    # ───── извлечение ─────
+    def record(self, n: int, encoding: str = 'utf-8') -> List[str]:
+        """Строки записи номер *n* (с 1)."""
+        if not 1 <= n <= len(self.starts):
+            raise IndexError(f"записи {n} нет: в файле {len(self.starts)}")
+        with open(self.path, 'rb') as f:
+            lines, _ = next(iter_records_at(f, self.starts[n - 1], encoding))
+        return lines
+
+    def book_record(self, book_id: int) -> int:
+        """
+        Номер записи (с 1), из которой получена книга *book_id*.  Нумерация
+        не записана (first_id 0) – с 1; ValueError, если id не по порядку.
+        """
+        if self.first_id == NOT_IN_ORDER:
+            raise ValueError("id книг последнего дампа (--delta, --append с разрывами) "
+                             "идут не по порядку записей – запись по id не найти")
+        first = self.first_id or 1
+        if not first <= book_id < first + len(self.books):
+            raise IndexError(f"книги {book_id} нет: id книг {first}..{first + len(self.books) - 1}")
+        return self.books[book_id - first] + 1
+
+    # ───── деление на куски ─────
+    def ranges(self, parts: int, start: int = 0) -> List[Tuple[int, int]]:
+        """
+        Байты [start, размер файла) &rarr; до *parts* кусков (начало, конец)
+        примерно равной длины; границы – на началах записей.
+        """
+        first = bisect_left(self.starts, start)
+        if first >= len(self.starts):
+            return []
+        begin = self.starts[first]
+        step = max((self.size - begin) / max(parts, 1), 1)
+        bounds = [begin]
+        for k in range(1, parts):
+            i = bisect_left(self.starts, begin + k * step, first)
+            if i < len(self.starts) and self.starts[i] > bounds[-1]:
+                bounds.append(self.starts[i])
+        bounds.append(self.size)
+        return list(zip(bounds, bounds[1:]))
+
+    # ───── файл индекса ─────
+    def save(self, idx_path: str) -> None:
+        tmp = f"{idx_path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(INDEX_MAGIC, self.size, self.mtime_ns,
+                                 len(self.starts), len(self.books), self.first_id))
+            _to_le(self.starts).tofile(f)
+            _to_le(self.books).tofile(f)
+        os.replace(tmp, idx_path)
+
+    @classmethod
+    def load(cls, path: str, idx_path: str) -> 'RecordIndex':
+        with open(idx_path, 'rb') as f:
+            magic, size, mtime_ns, n_rec, n_books, first_id = _HEADER.unpack(
+                f.read(_HEADER.size))
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"{idx_path}: не индекс записей ИРБИС (или старого формата)")
+            starts, books = array('Q'), array('Q')
+            starts.fromfile(f, n_rec)
+            books.fromfile(f, n_books)
+        return cls(path, _to_le(starts), _to_le(books), size, mtime_ns, first_id)
+
+    def record_numbering(self, first_id: int) -> None:
+        """Записать в <файл>.idx нумерацию книг дампа (только заголовок)."""
+        self.first_id = first_id
+        with open(f"{self.path}.idx", 'r+b') as f:
+            f.write(_HEADER.pack(INDEX_MAGIC, self.size, self.mtime_ns,
+                                 len(self.starts), len(self.books), first_id))
+
+
+def _to_le(a: array) -> array:
+    """Файл индекса – little-endian; на big-endian машине байты переставляются."""
+    if sys.byteorder == 'big':
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a
+
+
+def _is_sep_line(mm: mmap.mmap, pos: int) -> Tuple[bool, int, int]:
+    """(строка с *pos* – разделитель?, начало строки, начало следующей)."""
+    ls = mm.rfind(b'\n', 0, pos) + 1
+    le = mm.find(b'\n', pos)
+    le = len(mm) if le < 0 else le + 1
+    return mm[ls:le].strip() == _SEP, ls, le
+
+
+def _is_ibis(mm: mmap.mmap, begin: int, end: int) -> bool:
+    """Есть ли в записи [begin, end) строка &laquo;#920: IBIS&raquo; (как в parse_record)."""
+    pos = mm.find(_IBIS_TAG, begin, end)
+    while pos >= 0:
+        if pos == begin or mm[pos - 1] == 0x0A:
+            le = mm.find(b'\n', pos, end)
+            if mm[pos + len(_IBIS_TAG):le if le >= 0 else end].strip() == b'IBIS':
+                return True
+        pos = mm.find(_IBIS_TAG, pos + 1, end)
+    return False
+
+
+def _segments(mm: mmap.mmap) -> Iterator[Tuple[int, int]]:
+    """Непустые куски между строками-разделителями: (начало, конец)."""
+    begin, pos = 0, mm.find(_SEP)
+    while pos >= 0:
+        is_sep, ls, le = _is_sep_line(mm, pos)
+        if is_sep:
+            if ls > begin:
+                yield begin, ls
+            begin = le
+        pos = mm.find(_SEP, le if is_sep else pos + 1)
+    if begin < len(mm):
+        yield begin, len(mm)
+
+
+def build_index(path: str) -> RecordIndex:
+    """Один проход по mmap файла *path*."""
+    if codec_of(path):
+        raise ValueError(f"{path}: сжатый файл – индекс строится только по несжатому")
+    st = os.stat(path)
+    starts, books = array('Q'), array('Q')
+    with open(path, 'rb') as f:
+        if st.st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for n, (begin, end) in enumerate(_segments(mm)):
+                    starts.append(begin)
+                    if _is_ibis(mm, begin, end):
+                        books.append(n)
+    return RecordIndex(path, starts, books, st.st_size, st.st_mtime_ns)
+
+
+def open_index(path: str, rebuild: bool = False) -> Tuple[RecordIndex, bool]:
+    """
+    Индекс <path>.idx, если он свежий, иначе строится и сохраняется.
+    Возвращает (индекс, был_ли_перестроен).
+    """
+    idx_path = f"{path}.idx"
+    st = os.stat(path)
+    if not rebuild and os.path.exists(idx_path):
+        try:
+            index = RecordIndex.load(path, idx_path)
+        except (ValueError, EOFError, struct.error):
+            index = None
+        if index is not None and (index.size, index.mtime_ns) == (st.st_size, st.st_mtime_ns):
+            return index, False
+    index = build_index(path)
+    index.save(idx_path)
+    return index, True
+
+
+def read_range(path: str, begin: int, end: int,
+               encoding: str = 'utf-8') -> Iterator[Tuple[List[str], int]]:
+    """(запись, смещение после неё) для записей куска [begin, end) файла."""
+    with open(path, 'rb') as f:
+        f.seek(begin)
+        data = f.read(end - begin)
+    for lines, off in iter_records_at(io.BytesIO(data), encoding=encoding):
+        yield lines, begin + off
+
+# ──────────────── CLI ────────────────
+def _print_record(lines: List[str], parse: bool) -> None:
+    print('\n'.join(lines))
+    if parse:
+        from parse_irbis_file import parse_record
+        parsed = parse_record(lines)
+        print(f"{RECORD_SEP}\n" + ('не IBIS' if parsed is None else
+              '\n'.join(f"{k:<18}: {v!r}" for k, v in parsed._asdict().items())))
+
+
+def _cli() -> None:
+    ap = argparse.ArgumentParser(description='Индекс смещений записей экспорта ИРБИС.')
+    ap.add_argument('command', choices=('build', 'record', 'book', 'ranges'))
+    ap.add_argument('input_file')
+    ap.add_argument('n', nargs='?', type=int,
+                    help='номер записи (с 1), id книги или число кусков')
+    ap.add_argument('--parse', action='store_true',
+                    help='показать и результат parse_record()')
+    ap.add_argument('--rebuild', action='store_true', help='перестроить индекс')
+    args = ap.parse_args()
+    if args.command != 'build' and args.n is None:
+        ap.error(f"{args.command}: нужен номер")
+
+    try:
+        index, rebuilt = open_index(args.input_file, args.rebuild or args.command == 'build')
+        if args.command == 'build':
+            print(f"{args.input_file}.idx: записей {len(index)}, IBIS {len(index.books)}")
+        elif args.command == 'record':
+            _print_record(index.record(args.n), args.parse)
+        elif args.command == 'book':
+            if not index.first_id:
+                print("Внимание: нумерация книг дампа в индексе не записана (дампа с "
+                      "--index не было) – id считаются с 1 по порядку записей, как у "
+                      "полного дампа; для --append / --delta это неверно.", file=sys.stderr)
+            n = index.book_record(args.n)
+            print(f"-- книга {args.n} = запись {n}, байт {index.starts[n - 1]}")
+            _print_record(index.record(n), args.parse)
+        else:
+            for begin, end in index.ranges(args.n):
+                print(f"{begin}\t{end}\t{end - begin}")
+    except (IndexError, ValueError, FileNotFoundError) as e:
+        sys.exit(f"Ошибка: {e}")
+
+if __name__ == '__main__':
+    _cli()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+irbis_reader.py – потоковое чтение экспорта ИРБИС
+=================================================
+
+Экспорт ИРБИС — это последовательность записей, разделённых строкой
+&laquo;*****&raquo;.  Файл читается построчно из бинарного потока, в памяти
+держится только текущая запись, поэтому потребление памяти не зависит
+от размера входного файла.
+
+Функции
+-------
+iter_records(f) -> Iterator[list[str]]
+    Отдаёт записи по одной: список строк без символов перевода строки.
+
+iter_records_at(f, start) -> Iterator[tuple[list[str], int]]
+    То же с позиции *start* (байт), вместе с каждой записью отдаёт
+    смещение сразу за ней – по нему можно продолжить чтение позже.
+"""
+
+from __future__ import annotations
+from typing import BinaryIO, Iterator, List, Tuple
+
+RECORD_SEP  = '*****'
+READ_BUFFER = 1 << 20           # размер буфера чтения, байт
+
+
+def iter_records(f: BinaryIO, encoding: str = 'utf-8') -> Iterator[List[str]]:
+    """
+    Генератор записей из бинарного потока *f*.
+
+    Строки декодируются по одной, &laquo;\\r\\n&raquo; и &laquo;\\n&raquo; отбрасываются.
+    Пустые записи (два разделителя подряд) пропускаются.
+    """
+    for lines, _ in iter_records_at(f, encoding=encoding):
+        yield lines
+
+
+def iter_records_at(f: BinaryIO, start: int = 0,
+                    encoding: str = 'utf-8') -> Iterator[Tuple[List[str], int]]:
+    """
+    Генератор (запись, смещение_после_записи) начиная с байта *start*.
+    *start* должен указывать на начало строки (обычно – смещение,
+    полученное от этого же генератора).
+    """
+    if start:
+        f.seek(start)
+    offset = start
+    lines: List[str] = []
+    for raw in f:
+        offset += len(raw)
+        line = raw.decode(encoding).rstrip('\r\n')
+        if line.strip() == RECORD_SEP:
+            if lines:
+                yield lines, offset
+                lines = []
+        else:
+            lines.append(line)
+    if lines:
+        yield lines, offset
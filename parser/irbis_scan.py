@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+irbis_scan.py – быстрая разведка экспорта без дампа (parse_irbis_file --scan)
+============================================================================
+
+Перед полным импортом хочется знать, что в файле: сколько записей,
+какая доля не-IBIS (без &laquo;#920: IBIS&raquo;), сколько кодов BBK/UDC отбросит
+filter_links и сколько строк #910 parse_copies сочтёт битыми.  Скан
+разбирает в записи только это (parse_irbis_file.scan_record) и не пишет
+ни строки SQL.
+
+С sample (доля, 0 < F < 1) читается только часть файла, равномерно:
+    • с индексом (--index, irbis_index.py) – каждая 1/F-я запись по
+      смещениям из индекса, число записей известно точно;
+    • без индекса – файл делится на окна, в каждом с начала окна
+      (после ближайшего разделителя &laquo;*****&raquo;) читается доля F байт;
+      итоги по файлу – оценка пропорционально прочитанным байтам;
+    • сжатый файл по смещениям не читается – берётся каждая 1/F-я
+      запись подряд (распаковывается всё, но разбирается только выборка).
+"""
+
+from __future__ import annotations
+import os
+from collections import Counter
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from code_index import CodeIndex
+from irbis_reader import RECORD_SEP, iter_records_at
+from streams import codec_of
+
+MIN_WINDOW_SAMPLE = 1 << 16     # байт выборки в одном окне, не меньше
+MAX_WINDOWS = 1000
+TOP_DROPPED = 10
+
+_MODES = {
+    'full': 'весь файл',
+    'index': 'выборка по индексу',
+    'windows': 'выборка окнами по файлу',
+    'stride': 'выборка подряд, сжатый файл прочитан целиком',
+}
+
+
+class ScanStats:
+    """Счётчики скана; bbk / udc – Counter кодов (сколько книг с кодом)."""
+
+    def __init__(self):
+        self.records = self.ibis = 0
+        self.copies = self.copy_dupes = self.broken = self.no_copies = 0
+        self.bbk: Counter = Counter()
+        self.udc: Counter = Counter()
+        self.bytes = 0                  # прочитано байт (для оценки по выборке)
+
+    def add(self, fields) -> None:
+        self.records += 1
+        if fields is None:
+            return
+        bbk, udc, inv_nos, broken = fields
+        self.ibis += 1
+        self.bbk.update(bbk)
+        self.udc.update(udc)
+        unique = len(set(inv_nos))
+        self.copies += unique
+        self.copy_dupes += len(inv_nos) - unique
+        self.broken += broken
+        if not inv_nos:
+            self.no_copies += 1
+
+
+def dropped_codes(codes: Counter, code_map: Dict[str, int], filter_links,
+                  index: Optional[CodeIndex]) -> Counter:
+    """
+    Коды, которые filter_links отбросит, с числом пар.  filter_links
+    вызывается по разу на каждый различный код (book_id – номер кода).
+    """
+    distinct = list(codes)
+    links, _ = filter_links(enumerate(distinct), code_map, index)
+    kept = {n for n, _ in links}
+    return Counter({code: codes[code] for n, code in enumerate(distinct) if n not in kept})
+
+
+# ───── чтение: всё или выборка ─────
+def _resync(f: BinaryIO, pos: int) -> int:
+    """Смещение первой записи после *pos* (за ближайшей строкой-разделителем)."""
+    if pos == 0:
+        return 0
+    f.seek(pos)
+    for raw in f:
+        pos += len(raw)
+        if raw.strip() == RECORD_SEP.encode('ascii'):
+            return pos
+    return pos
+
+
+def iter_windows(f: BinaryIO, size: int, fraction: float
+                 ) -> Iterator[Tuple[List[str], int]]:
+    """(запись, её длина в байтах) – доля *fraction* каждого из окон файла."""
+    windows = max(1, min(MAX_WINDOWS, int(size * fraction / MIN_WINDOW_SAMPLE)))
+    step = size / windows
+    for w in range(windows):
+        begin = int(w * step)
+        take_until = begin + step * fraction
+        pos = _resync(f, begin)
+        f.seek(pos)
+        for lines, end in iter_records_at(f, pos):
+            yield lines, end - pos
+            pos = end
+            if pos >= take_until:
+                break
+
+
+def iter_indexed(f: BinaryIO, starts, fraction: float) -> Iterator[Tuple[List[str], int]]:
+    """Равномерно *fraction* записей по смещениям индекса."""
+    n = len(starts)
+    k = max(1, round(n * fraction))
+    for i in range(k):
+        start = starts[i * n // k]
+        f.seek(start)
+        for lines, end in iter_records_at(f, start):
+            yield lines, end - start
+            break
+
+
+def iter_stride(f: BinaryIO, fraction: float = 1.0) -> Iterator[Tuple[List[str], int]]:
+    """Каждая 1/fraction-я запись подряд (для сжатых файлов; 1.0 – все)."""
+    prev, taken = 0, 0
+    for n, (lines, end) in enumerate(iter_records_at(f), 1):
+        if int(n * fraction) > taken:
+            taken += 1
+            yield lines, end - prev
+        prev = end
+
+
+def scan(f: BinaryIO, path: str, scan_record, sample: Optional[float] = None,
+         index=None) -> Tuple[ScanStats, Dict]:
+    """
+    Скан потока *f* файла *path*; (счётчики, как считали): 'mode', а для
+    выборки ещё 'total_records' – точное (по индексу) или оценка.
+    """
+    stats = ScanStats()
+    size = os.path.getsize(path)
+    if sample is None:
+        source, mode = iter_stride(f), 'full'
+    elif index is not None:
+        source, mode = iter_indexed(f, index.starts, sample), 'index'
+    elif codec_of(path):
+        source, mode = iter_stride(f, sample), 'stride'
+    else:
+        source, mode = iter_windows(f, size, sample), 'windows'
+    for lines, length in source:
+        stats.add(scan_record(lines))
+        stats.bytes += length
+    info: Dict = {'mode': mode}
+    if mode == 'index':
+        info['total_records'] = len(index)
+    elif mode == 'windows' and stats.bytes:
+        info['total_records'] = round(stats.records * size / stats.bytes)
+    elif mode == 'stride':
+        info['total_records'] = round(stats.records / sample)
+    return stats, info
+
+
+# ───── отчёт ─────
+def _share(part: int, whole: int) -> str:
+    return f"{100 * part / whole:.1f} %" if whole else '–'
+
+
+def _top(dropped: Counter) -> str:
+    return ', '.join(f"{code} ×{n}" for code, n in dropped.most_common(TOP_DROPPED))
+
+
+def report(stats: ScanStats, info: Dict, bbk_dropped: Counter, udc_dropped: Counter,
+           match: str = '') -> str:
+    """
+    Текст отчёта.  По выборке счётчики – в выборке; у числа записей, пар,
+    экземпляров и т.п. рядом оценка на весь файл (× total_records /
+    записей), доли переносятся как есть.  Число различных кодов и
+    частоты отброшенных кодов не масштабируются – только &laquo;в выборке&raquo;.
+    """
+    s = stats
+    sampled = info['mode'] != 'full'
+    scale = info.get('total_records', 0) / s.records if sampled and s.records else 1
+
+    def n(x: int) -> str:
+        return f"{x} в выборке, ≈ {round(x * scale)}" if sampled else str(x)
+
+    in_sample = ' в выборке' if sampled else ''
+    bbk_pairs, udc_pairs = sum(s.bbk.values()), sum(s.udc.values())
+    bbk_lost, udc_lost = sum(bbk_dropped.values()), sum(udc_dropped.values())
+    lines = [f"Скан завершён ({_MODES[info['mode']]}).",
+             f"- Записей               : {s.records}{in_sample}"]
+    if sampled:
+        exact = info['mode'] == 'index'
+        lines.append(f"  ▸ во всём файле        : {'' if exact else '≈ '}{info['total_records']}")
+    lines += [
+        f"- Записей IBIS          : {n(s.ibis)}",
+        f"  ▸ не IBIS             : {n(s.records - s.ibis)}  "
+        f"({_share(s.records - s.ibis, s.records)})",
+    ]
+    for name, codes, dropped, pairs, lost in (('BBK', s.bbk, bbk_dropped, bbk_pairs, bbk_lost),
+                                              ('UDC', s.udc, udc_dropped, udc_pairs, udc_lost)):
+        lines += [
+            f"- {name} пар (книга-код)   : {n(pairs)}; различных кодов{in_sample} {len(codes)}",
+            f"  ▸ отбросит filter_links: пар {n(lost)} ({_share(lost, pairs)}), "
+            f"различных кодов{in_sample} {len(dropped)}",
+        ]
+        if dropped:
+            lines.append(f"  ▸ чаще всего{in_sample:<10}: {_top(dropped)}")
+    lines += [
+        f"- Экземпляров           : {n(s.copies)}",
+        f"  ▸ дубликаты           : {n(s.copy_dupes)}",
+        f"  ▸ битые строки #910   : {n(s.broken)}  "
+        f"({_share(s.broken, s.copies + s.copy_dupes + s.broken)} строк)",
+        f"  ▸ книг без экземпляров: {n(s.no_copies)}",
+    ]
+    if match:
+        lines.append(f"- Сопоставление кодов   : {match}")
+    return '\n'.join(lines)
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+load_shards.py – параллельная загрузка каталога шардов в БД
+===========================================================
+
+parse_irbis_file --format shards пишет вместо одного дампа каталог:
+файл COPY-строк на таблицу (большие – кусками, --shard-rows) и
+manifest.json с уровнями зависимостей.  Здесь каталог грузится так:
+
+    1. загружаемые таблицы должны быть пусты (иначе – отказ, см. ниже);
+    2. индексы, первичные/уникальные ключи и внешние ключи загружаемых
+       таблиц (и внешние ключи, которые на них ссылаются, например
+       borrow_record &rarr; book_copy) сохраняются в <каталог>/rebuild.sql и
+       удаляются – COPY в таблицу без индексов быстрее;
+    3. файлы грузятся COPY по --jobs соединениям, уровень за уровнем
+       (publisher / book / author, потом зависимые таблицы); уровень –
+       одна транзакция на соединение, фиксируются все вместе, когда
+       загружены все файлы уровня, при ошибке – все откатываются;
+    4. ключи и индексы создаются заново (таблицы – параллельно), затем
+       внешние ключи (заодно проверяется целостность), ANALYZE.
+
+Если загрузка упала, уже загруженные уровни очищаются (TRUNCATE – таблицы
+были пусты), а ключи и индексы по rebuild.sql восстанавливаются всегда
+(finally): БД остаётся такой, какой была до запуска.  Не удалось и это –
+сообщение говорит, что осталось сделать руками (psql -f rebuild.sql).
+
+Непустые таблицы: без ключей дубликаты всплыли бы только при их
+пересоздании, а откат TRUNCATE-ом стёр бы и прежние строки.  Поэтому
+тогда нужен --keep-indexes – ничего не удалять, только грузить по уровням
+(ключи ловят дубликаты сразу; упавший уровень откатывается, предыдущие
+остаются), или явно --allow-non-empty – как с пустыми, но при ошибке
+загруженные уровни остаются в БД, ключи восстанавливаются как получится.
+
+Запуск:
+    python load_shards.py <каталог> "<DSN>" [--jobs N] [--keep-indexes | --allow-non-empty]
+"""
+
+from __future__ import annotations
+import argparse, json, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import psycopg2
+
+from sql_writer import ShardWriter
+
+DEFAULT_JOBS = 4
+REBUILD_FILE = 'rebuild.sql'
+
+_CONSTRAINTS_SQL = """
+SELECT c.conname, c.conrelid::regclass::text, c.contype, pg_get_constraintdef(c.oid)
+  FROM pg_constraint c
+ WHERE (c.contype IN ('p', 'u', 'f') AND c.conrelid = ANY(%(tables)s::regclass[]))
+    OR (c.contype = 'f' AND c.confrelid = ANY(%(tables)s::regclass[]))
+ ORDER BY c.contype DESC, 2, 1
+"""
+# индексы, не принадлежащие ключам (те пересоздаются вместе с ключом)
+_INDEXES_SQL = """
+SELECT i.indexrelid::regclass::text, i.indrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+  FROM pg_index i
+ WHERE i.indrelid = ANY(%(tables)s::regclass[])
+   AND NOT EXISTS (SELECT 1 FROM pg_constraint c
+                    WHERE c.conindid = i.indexrelid AND c.conrelid = i.indrelid)
+ ORDER BY 2, 1
+"""
+
+
+def read_manifest(path: str) -> Dict:
+    try:
+        with open(os.path.join(path, ShardWriter.MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        sys.exit(f"Ошибка: в {path} нет {ShardWriter.MANIFEST} – дамп не дописан?")
+    if manifest.get('format') != ShardWriter.FORMAT:
+        sys.exit(f"Ошибка: {path}: не каталог шардов parse_irbis_file.")
+    return manifest
+
+
+class Schema:
+    """DDL ключей и индексов таблиц: удалить и создать заново."""
+
+    def __init__(self, cur, tables: Iterable[str]):
+        params = {'tables': [f"public.{t}" for t in tables]}
+        cur.execute(_CONSTRAINTS_SQL, params)
+        # таблица &rarr; [(удалить, создать)]; внешние ключи – отдельно, они последние
+        self.keys: Dict[str, List[Tuple[str, str]]] = {}
+        self.foreign: Dict[str, List[Tuple[str, str]]] = {}
+        for name, table, kind, definition in cur.fetchall():
+            target = self.foreign if kind == 'f' else self.keys
+            target.setdefault(table, []).append((
+                f'ALTER TABLE {table} DROP CONSTRAINT "{name}"',
+                f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}'))
+        cur.execute(_INDEXES_SQL, params)
+        for index, table, definition in cur.fetchall():
+            self.keys.setdefault(table, []).append((f"DROP INDEX {index}", definition))
+
+    def rebuild_sql(self) -> str:
+        lines = [create for group in (self.keys, self.foreign)
+                 for stmts in group.values() for _, create in stmts]
+        return ''.join(f"{line};\n" for line in lines)
+
+    def drop(self, cur) -> int:
+        n = 0
+        for group in (self.foreign, self.keys):
+            for stmts in group.values():
+                for drop, _ in stmts:
+                    cur.execute(drop)
+                    n += 1
+        return n
+
+
+class Loader:
+    """
+    Пул потоков; у каждого потока своё соединение.  run() фиксирует
+    каждую задачу сразу; run(atomic=True) оставляет транзакции открытыми –
+    их фиксирует / откатывает commit() / rollback(), все вместе.  DDL так
+    не выполнять: ALTER TABLE одного соединения ждал бы блокировок, которые
+    держит незафиксированная транзакция другого.
+    """
+
+    def __init__(self, dsn: str, jobs: int):
+        self.dsn = dsn
+        self.jobs = jobs
+        self._local = threading.local()
+        self._conns: List = []
+        self._lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=jobs)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = psycopg2.connect(self.dsn)
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def run(self, fn: Callable, tasks: Iterable[tuple], atomic: bool = False) -> list:
+        """
+        fn(cur, *task) по задачам параллельно; результаты по порядку.
+        Ошибка пробрасывается, когда закончатся все задачи.
+        """
+        def _call(task):
+            conn = self._conn()
+            try:
+                with conn.cursor() as cur:
+                    result = fn(cur, *task)
+                if not atomic:
+                    conn.commit()
+                return result
+            except BaseException:
+                if not atomic:
+                    conn.rollback()
+                raise
+        futures = [self.pool.submit(_call, task) for task in tasks]
+        wait(futures)
+        return [f.result() for f in futures]
+
+    def commit(self) -> None:
+        for conn in self._conns:
+            conn.commit()
+
+    def rollback(self) -> None:
+        for conn in self._conns:
+            if not conn.closed:
+                conn.rollback()
+
+    def close(self) -> None:
+        self.pool.shutdown()
+        for conn in self._conns:
+            conn.close()
+
+
+def _copy_file(cur, path: str, table: str, columns: List[str]) -> Tuple[str, float]:
+    t0 = time.perf_counter()
+    with open(path, encoding='utf-8', newline='\n') as f:
+        cur.copy_expert(f"COPY public.{table} ({', '.join(columns)}) FROM stdin", f)
+    return table, time.perf_counter() - t0
+
+
+def _execute_all(cur, statements: List[str]) -> None:
+    for statement in statements:
+        cur.execute(statement)
+
+
+def _non_empty(cur, tables: Iterable[str]) -> List[str]:
+    found = []
+    for table in tables:
+        cur.execute(f"SELECT EXISTS (SELECT 1 FROM public.{table})")
+        if cur.fetchone()[0]:
+            found.append(table)
+    return found
+
+
+def load_shards(path: str, dsn: str, jobs: int = DEFAULT_JOBS,
+                keep_indexes: bool = False, allow_non_empty: bool = False) -> None:
+    manifest = read_manifest(path)
+    tables = manifest['tables']
+    print(f"Каталог {path}: parser v{manifest.get('parser')}, таблиц {len(tables)}, "
+          f"файлов {sum(len(t['files']) for t in tables.values())}, "
+          f"строк {sum(t['rows'] for t in tables.values())}; соединений {jobs}.")
+    rebuild_path = os.path.join(path, REBUILD_FILE)
+
+    schema = None
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            busy = _non_empty(cur, tables)
+            if busy and not (keep_indexes or allow_non_empty):
+                sys.exit(f"Ошибка: таблицы не пусты ({', '.join(busy)}) – без ключей "
+                         f"дубликаты всплывут только в конце, а откат не вернёт БД как "
+                         f"была.  Грузите с --keep-indexes (или --allow-non-empty, если "
+                         f"так и задумано).")
+            if not keep_indexes:
+                schema = Schema(cur, tables)
+                with open(rebuild_path, 'w', encoding='utf-8') as f:
+                    f.write(schema.rebuild_sql())
+                t0 = time.perf_counter()
+                dropped = schema.drop(cur)
+        if schema is not None:
+            print(f"Удалено ключей и индексов: {dropped} ({time.perf_counter() - t0:.2f} с), "
+                  f"DDL для восстановления – {rebuild_path}")
+    finally:
+        conn.close()
+
+    loader = Loader(dsn, jobs)
+    seconds: Dict[str, float] = {t: 0.0 for t in tables}
+    loaded: List[str] = []                      # таблицы зафиксированных уровней
+    failed, restored = True, False
+    try:
+        for n, level in enumerate(manifest['levels'], 1):
+            t0 = time.perf_counter()
+            tasks = [(os.path.join(path, f['name']), t, tables[t]['columns'])
+                     for t in level for f in tables[t]['files']]
+            for table, sec in loader.run(_copy_file, tasks, atomic=True):
+                seconds[table] += sec
+            loader.commit()
+            loaded += level
+            print(f"Уровень {n}: {', '.join(level)} – {len(tasks)} файлов за "
+                  f"{time.perf_counter() - t0:.2f} с")
+        failed = False
+    except (psycopg2.Error, OSError) as e:
+        loader.rollback()
+        print(f"Ошибка загрузки: {e}".rstrip(), file=sys.stderr)
+        if loaded and not busy:
+            # таблицы были пусты – очистить зафиксированные уровни
+            loader.run(_execute_all, [([f"TRUNCATE {', '.join(f'public.{t}' for t in loaded)}"],)])
+            print(f"Загруженные уровни очищены: {', '.join(loaded)}.", file=sys.stderr)
+        elif loaded:
+            print(f"Остались в БД строки зафиксированных уровней: {', '.join(loaded)}.",
+                  file=sys.stderr)
+    finally:
+        if schema is not None:
+            restored = _restore(loader, schema, rebuild_path, failed)
+        if not failed:
+            t0 = time.perf_counter()
+            loader.run(_execute_all, [([f"ANALYZE public.{t}"],) for t in tables])
+            print(f"ANALYZE: {time.perf_counter() - t0:.2f} с")
+        loader.close()
+    if failed:
+        sys.exit("Загрузка не выполнена; " + (
+            "упавший уровень откачен." if schema is None else
+            "ключи и индексы восстановлены." if restored else
+            f"ключи и индексы восстановлены не все – см. {rebuild_path}."))
+
+    for table, info in tables.items():
+        sec = seconds[table]
+        print(f"  ▸ {table:<28}: {info['rows']:>9} строк, {len(info['files'])} файл(ов), "
+              f"COPY {sec:7.2f} с")
+
+
+def _restore(loader: Loader, schema: Schema, rebuild_path: str, failed: bool) -> bool:
+    """Ключи и индексы по Schema – и после ошибки загрузки; True – всё создано."""
+    try:
+        for title, group in (('ключи и индексы', schema.keys),
+                             ('внешние ключи', schema.foreign)):
+            t0 = time.perf_counter()
+            loader.run(_execute_all, [([create for _, create in stmts],)
+                                      for stmts in group.values()])
+            print(f"Созданы {title}: {sum(map(len, group.values()))} "
+                  f"за {time.perf_counter() - t0:.2f} с")
+        return True
+    except psycopg2.Error as e:
+        print(f"Ошибка: ключи и индексы не восстановлены ({str(e).strip()}).\n"
+              f"Таблицы без части ключей – исправьте данные и выполните "
+              f"psql -f {rebuild_path} (уже созданные ключи дадут ошибки «already "
+              f"exists» – их можно пропустить).", file=sys.stderr)
+        if not failed:
+            raise
+        return False
+
+# ──────────────── CLI ────────────────
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(
+        description="Загрузка каталога шардов parse_irbis_file (--format shards) "
+                    "по нескольким соединениям.")
+    ap.add_argument('path', help='каталог с manifest.json')
+    ap.add_argument('dsn', help='строка подключения psycopg2')
+    ap.add_argument('--jobs', type=int, default=DEFAULT_JOBS, metavar='N',
+                    help=f'соединений (по умолчанию {DEFAULT_JOBS})')
+    ap.add_argument('--keep-indexes', action='store_true',
+                    help='не удалять и не перестраивать ключи и индексы – '
+                         'только грузить по уровням зависимостей (можно в непустые таблицы)')
+    ap.add_argument('--allow-non-empty', action='store_true',
+                    help='удалять ключи и индексы, даже если таблицы не пусты '
+                         '(при ошибке загруженные уровни останутся в БД)')
+    args = ap.parse_args()
+    load_shards(args.path, args.dsn, args.jobs, args.keep_indexes, args.allow_non_empty)
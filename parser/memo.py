@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+memo.py – кэш для нормализаторов с ограничением размера и статистикой
+=====================================================================
+
+В каталоге одни и те же строки встречаются постоянно (#210, авторы,
+даты и цены #910), а нормализаторы чистые – результат зависит только
+от аргумента.  memoized(name) оборачивает функцию в functools.lru_cache
+(вытеснение давно не использованных) и регистрирует её под именем
+*name*, чтобы размеры можно было менять, а счётчики – печатать.
+
+    @memoized('parse_pub_info')
+    def parse_pub_info(raw): ...
+
+configure(size)           – один размер для всех (0 – кэш выключен);
+configure(size, name=n)   – размер для одного;
+stats()                   – {имя: (hits, misses, maxsize, currsize)}.
+"""
+
+from __future__ import annotations
+from functools import lru_cache, update_wrapper
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_SIZE = 1 << 16
+
+Stats = Dict[str, Tuple[int, int, int, int]]
+
+
+class Memo:
+    """Функция + lru_cache, размер которого можно поменять на ходу."""
+
+    def __init__(self, fn: Callable, maxsize: int):
+        self.fn = fn
+        self.resize(maxsize)
+        update_wrapper(self, fn)
+
+    def resize(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._cached = lru_cache(maxsize)(self.fn) if maxsize > 0 else None
+
+    def __call__(self, *args):
+        return (self._cached or self.fn)(*args)
+
+    def info(self) -> Tuple[int, int, int, int]:
+        if self._cached is None:
+            return 0, 0, 0, 0
+        ci = self._cached.cache_info()
+        return ci.hits, ci.misses, ci.maxsize, ci.currsize
+
+
+_REGISTRY: Dict[str, Memo] = {}
+
+
+def memoized(name: str, maxsize: int = DEFAULT_SIZE) -> Callable[[Callable], Memo]:
+    def wrap(fn: Callable) -> Memo:
+        memo = _REGISTRY[name] = Memo(fn, maxsize)
+        return memo
+    return wrap
+
+
+def configure(size: int, name: Optional[str] = None) -> None:
+    """Новый размер (кэш при этом очищается)."""
+    for key, memo in _REGISTRY.items():
+        if name is None or key == name:
+            memo.resize(size)
+
+
+def stats() -> Stats:
+    return {name: memo.info() for name, memo in _REGISTRY.items()}
+
+
+def merge_stats(*parts: Stats) -> Stats:
+    """Сумма счётчиков нескольких процессов."""
+    total: Dict[str, list] = {}
+    for part in parts:
+        for name, (hits, misses, maxsize, currsize) in part.items():
+            acc = total.setdefault(name, [0, 0, maxsize, 0])
+            acc[0] += hits
+            acc[1] += misses
+            acc[3] += currsize
+    return {name: tuple(v) for name, v in total.items()}
+
+
+def report(st: Stats) -> str:
+    lines = []
+    for name, (hits, misses, maxsize, currsize) in sorted(st.items()):
+        calls = hits + misses
+        if not maxsize:
+            lines.append(f"  ▸ {name:<20}: кэш выключен")
+            continue
+        rate = hits / calls * 100 if calls else 0.0
+        lines.append(f"  ▸ {name:<20}: попаданий {rate:5.1f}%  "
+                     f"({hits} / промахов {misses}), в кэше {currsize} из {maxsize}")
+    return '\n'.join(lines)
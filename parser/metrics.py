@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+metrics.py – время по этапам разбора и ход импорта
+==================================================
+
+Этап с точкой в имени (&laquo;parse.copies&raquo;) – часть этапа до точки
+(&laquo;parse&raquo;) и в отчёте показывается под ним.
+
+Этапы – объекты Stage, создаются один раз (обычно на уровне модуля) и
+служат контекстными менеджерами:
+
+    _COPIES = stage('parse.copies', detail=True)
+    ...
+    with _COPIES:                        # время и число входов в этап
+        ...
+
+Подробные этапы (detail=True – то, что выполняется несколько раз на
+запись) считаются только после configure(detail=True): вход в этап
+стоит около микросекунды, на запись их набирается десяток.
+
+Счётчики живут в модуле (как и кэши memo.py), каждый процесс пула
+копит свои; главный процесс складывает их через merge_stats().
+
+stats()          – {этап: (вызовов, секунд)};
+report(st, wall) – таблица для итоговой статистики;
+Progress         – строка хода импорта в stderr (записей/с, %, ETA).
+"""
+
+from __future__ import annotations
+import json, sys, time
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, TextIO, Tuple
+
+clock = time.perf_counter
+
+Stats = Dict[str, Tuple[int, float]]
+
+detail = False                  # считаются ли подробные этапы
+
+
+class Stage:
+    """Этап: число входов и суммарное время."""
+    __slots__ = ('name', 'detail', 'on', 'calls', 'seconds', 't0')
+
+    def __init__(self, name: str, detail: bool = False):
+        self.name = name
+        self.detail = detail
+        self.on = not detail or globals()['detail']
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __enter__(self) -> 'Stage':
+        if self.on:
+            self.t0 = clock()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.on:
+            self.calls += 1
+            self.seconds += clock() - self.t0
+
+
+_STAGES: Dict[str, Stage] = {}
+
+
+def stage(name: str, detail: bool = False) -> Stage:
+    """Этап *name* (один объект на имя)."""
+    st = _STAGES.get(name)
+    if st is None:
+        st = _STAGES[name] = Stage(name, detail)
+    return st
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Декоратор: каждый вызов функции – вход в этап *name* (всегда считается)."""
+    st = stage(name)
+    def wrap(fn: Callable) -> Callable:
+        @wraps(fn)
+        def inner(*args):
+            t0 = clock()
+            result = fn(*args)
+            st.calls += 1
+            st.seconds += clock() - t0
+            return result
+        return inner
+    return wrap
+
+
+def configure(detailed: bool) -> None:
+    """Включить / выключить подробные этапы."""
+    global detail
+    detail = detailed
+    for st in _STAGES.values():
+        st.on = not st.detail or detailed
+
+
+def reset() -> None:
+    for st in _STAGES.values():
+        st.calls, st.seconds = 0, 0.0
+
+
+def stats() -> Stats:
+    return {st.name: (st.calls, st.seconds) for st in _STAGES.values() if st.calls}
+
+
+def merge_stats(*parts: Stats) -> Stats:
+    """Сумма счётчиков нескольких процессов."""
+    total: Dict[str, list] = {}
+    for part in parts:
+        for name, (calls, seconds) in part.items():
+            acc = total.setdefault(name, [0, 0.0])
+            acc[0] += calls
+            acc[1] += seconds
+    return {name: tuple(v) for name, v in total.items()}
+
+
+def report(st: Stats, wall: float) -> str:
+    """
+    Этапы по убыванию времени: секунды, доля от *wall*, вызовы, мкс на
+    вызов.  Вложенные этапы (&laquo;parse.scan&raquo; внутри &laquo;parse&raquo;) идут
+    с отступом сразу под своим этапом.
+    """
+    def order(item):
+        name, (_, seconds) = item
+        top = name.split('.', 1)[0]
+        return (-st.get(top, (0, seconds))[1], top, top != name, -seconds)
+
+    lines = []
+    for name, (calls, seconds) in sorted(st.items(), key=order):
+        share = seconds / wall * 100 if wall else 0.0
+        per_call = seconds / calls * 1e6 if calls else 0.0
+        label = f"  {name}" if '.' in name else name
+        lines.append(f"  ▸ {label:<20}: {seconds:8.2f} с {share:5.1f}%  "
+                     f"{calls:>10} вызовов, {per_call:10.1f} мкс/вызов")
+    return '\n'.join(lines)
+
+
+def to_json(st: Stats) -> Dict[str, Dict[str, Any]]:
+    return {name: {'calls': calls, 'seconds': round(seconds, 6)}
+            for name, (calls, seconds) in sorted(st.items())}
+
+
+def write_report(path: str, payload: Dict[str, Any]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+# ───────────────────────── ход импорта ─────────────────────────
+class Progress:
+    """
+    Раз в *every* секунд переписывает строку в *stream*:
+    записей, записей/с, доля разобранных байт и ETA.  Скорость и ETA
+    считаются по байтам, разобранным в этом запуске (с *start* байта).
+
+    Для сжатого входа смещения записей – в распакованных данных, а
+    *total_bytes* – размер архива.  Позиция в архиве не годится: чтение
+    (распаковка блоками, пачки в пуле процессов) уходит далеко вперёд
+    разбора.  Поэтому *ratio*() – распаковано / прочитано из архива
+    (streams.compression_ratio) – даёт оценку распакованного размера, и
+    доля – смещение последней разобранной записи к ней (&laquo;≈&raquo;).  Пока
+    оценки нет – только записи и мегабайты.
+    """
+
+    def __init__(self, total_bytes: int, start: int = 0, every: float = 1.0,
+                 stream: Optional[TextIO] = None,
+                 ratio: Optional[Callable[[], float]] = None):
+        self.total = total_bytes
+        self.ratio = ratio
+        self.start = start
+        self.every = every
+        self.stream = stream or sys.stderr
+        self.t0 = self._last = clock()
+        self.records = 0
+        self.offset = start
+
+    def update(self, offset: int) -> None:
+        self.records += 1
+        self.offset = offset
+        if self.records & 0xFF == 0 and clock() - self._last >= self.every:
+            self._print()
+
+    def _print(self, end: str = '') -> None:
+        now = self._last = clock()
+        elapsed = now - self.t0 or 1e-9
+        pos, total = self.offset, self.total
+        if self.ratio is not None:
+            total = int(total * self.ratio())
+        done = pos - self.start
+        rate = self.records / elapsed
+        if not total:
+            share = f"{pos / (1 << 20):7,.0f} МиБ"
+        else:
+            share = f"{'≈' if self.ratio else ' '}{min(pos / total * 100, 100.0):5.1f}%"
+        if done and pos < total:
+            eta = (total - pos) * elapsed / done
+            left = f"осталось ~{int(eta) // 3600}:{int(eta) % 3600 // 60:02}:{int(eta) % 60:02}"
+        else:
+            left = f"прошло {elapsed:.0f} с"
+        self.stream.write(f"\r  {self.records:>10} записей  {rate:>9,.0f} зап/с  "
+                          f"{share}  {left}   {end}")
+        self.stream.flush()
+
+    def done(self) -> None:
+        self._print(end='\n')
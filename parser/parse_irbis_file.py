@@ -1,7 +1,270 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Парсер экспорта ИРБИС &rarr; SQL-дамп (v4.7, inline copies, dedup, авторы).
+Парсер экспорта ИРБИС &rarr; SQL-дамп (v4.32, streaming, workers, resume, COPY, direct load, inline copies, dedup, авторы, метрики, gz/bz2/xz, index, слияние авторов, дозагрузка, кэш записей, дельта, поиск, сводки, шарды, скан).
+
+Изменения v4.32
+───────────────
+• Привязка BBK/UDC к предку (code_index.CodeIndex) – только на границе
+  сегмента: за предком разделитель, конец кода или смена цифр на буквы
+  (&laquo;24.235я73&raquo; &rarr; &laquo;24.235&raquo;).  Посреди числа или слова код больше не
+  режется (&laquo;15&raquo; не &rarr; &laquo;1&raquo;, &laquo;99.999&raquo; не &rarr; &laquo;9&raquo;) – берётся предок на
+  прошлой границе.  Связи, уже лежащие в БД, пересоберите:
+  fix_bbk.py / fix_udc.py без --incremental.
+
+Изменения v4.31
+───────────────
+• --delta: DELETE пропавшей из экспорта книги – только если ни один её
+  экземпляр не на руках (borrow_record без return_date), иначе триггер
+  prevent_book_copy_deletion_if_borrowed обрывал весь дамп; после
+  DELETE – SELECT оставшихся.  Их book_id хранятся в STATE (таблица
+  gone), DELETE повторяется в каждой следующей дельте.  Так же не
+  удаляется выданный экземпляр, пропавший из изменённой записи.
+
+Изменения v4.30
+───────────────
+• С --checkpoint-every сброшенные на диск пары кодов и экземпляры
+  (--spill-rows) пишутся в каталог <input_file>.ckpt.spill, а в
+  контрольную точку идут только пути и длины файлов (после fsync), а не
+  их содержимое: точка снова стоит O(памяти), а не O(всего сброшенного).
+  --resume обрезает файлы до длин из точки.  Каталог удаляется в конце.
+
+Изменения v4.29
+───────────────
+• С --index дамп записывает в заголовок индекса (<input_file>.idx,
+  формат IRBIDX02) нумерацию своих книг: id первой книги, если id шли
+  подряд в порядке IBIS-записей, иначе отметку &laquo;не по порядку&raquo;.
+  irbis_index.py book находит запись по id и для --append (id с
+  последовательности БД), а для --delta и --append с разрывами id
+  отказывает, вместо того чтобы показать чужую запись.  Без записанной
+  нумерации book по-прежнему считает id с 1 и предупреждает.
+
+Изменения v4.28
+───────────────
+• --scan: разведка экспорта перед импортом, без SQL (irbis_scan.py) –
+  записи и доля не-IBIS, пары книга-код BBK/UDC и сколько из них
+  отбросит filter_links (с самыми частыми кодами), экземпляры,
+  дубликаты и битые строки #910 по parse_copies, книги без экземпляров.
+  Из записи разбираются только #964, #675, #910, #920 (scan_record),
+  filter_links вызывается по разу на различный код.  Справочники – как
+  у дампа (БД или --dict-snapshot с DSN "-"), --exact-codes учитывается.
+• --sample F: скан доли F файла.  С --index – каждая 1/F-я запись по
+  смещениям индекса (число записей точное); без индекса – окна по
+  файлу, в каждом читается доля F байт, итоги – оценка по прочитанным
+  байтам; сжатый файл распаковывается целиком, разбирается выборка.
+
+Изменения v4.27
+───────────────
+• --format shards: output_file – каталог, в нём файл COPY-строк на
+  таблицу (sql_writer.ShardWriter; с --shard-rows N большие таблицы
+  режутся на куски по N строк) и manifest.json – колонки, файлы, строки
+  и уровни зависимостей: publisher / book / author, затем book_pub_place,
+  book_author, RAW, book_bbk / book_udc, book_copy.  Контрольные точки
+  работают (откат – размер текущего куска).
+• load_shards.py – загрузка каталога: DDL ключей и индексов сохраняется
+  в rebuild.sql и они удаляются, файлы уровня грузятся COPY параллельно
+  по --jobs соединениям, затем ключи и индексы строятся заново, внешние
+  ключи – последними, ANALYZE.  На 200 тыс. записей – 6.8 с против
+  24.6 с у psql -f с COPY-дампом.
+
+Изменения v4.26
+───────────────
+• --report-tables: сводные таблицы отчётов считаются за тот же проход
+  по экземплярам #910 (report_tables.py) и пишутся в конце дампа:
+  report_copies_by_place (экземпляры, книги и сумма по месту хранения),
+  report_acquisitions_by_year (поступления по году даты ^C) и
+  report_stock_totals (итог фонда).  Отчёты читают готовые строки, а не
+  сканируют book_copy.  С --delta итоги – по всему экспорту, включая
+  книги без изменений, и таблицы перезаписываются целиком.  С --append
+  не работает: там таблицы пересчитывает public.refresh_report_tables()
+  (BDscript.txt) – она же после правок экземпляров через сервер.
+
+Изменения v4.25
+───────────────
+• --search-docs: на каждую книгу ещё и строка public.book_search
+  (search_docs.py) – заглавие, серия, авторы строкой, издатель, город,
+  год, RAW-коды BBK/UDC и search_text: всё словесное в нижнем регистре,
+  ё &rarr; е, без знаков препинания.  В схеме (BDscript.txt) по search_text –
+  сгенерированный tsvector и триграммный индекс, так что поиск по
+  каталогу – один индексный запрос вместо соединения пяти таблиц.
+  Авторы – уже после --dedup-authors.  С --delta строка изменённой
+  книги пишется заново.  Без ключа дамп прежний (таблица в старых
+  схемах может отсутствовать).
+
+Изменения v4.24
+───────────────
+• --delta STATE: дельта-дамп между двумя полными экспортами.  В STATE
+  (SQLite, delta_state.py) на каждую запись хранятся book_id и отпечаток
+  – blake2b нормализованных полей ParsedRecord, по идентичности записи:
+  шифру хранения #903 (у повторов шифра – с номером вхождения), а без
+  него – хэшу заглавия, авторов и выходных данных.  Следующий запуск
+  пишет только разницу:
+    – новая запись – INSERT, как обычно;
+    – отпечаток изменился – UPDATE book, связи книги (авторы, место
+      публикации, коды RAW и очищенные) удаляются и пишутся заново,
+      экземпляры – INSERT ... ON CONFLICT DO UPDATE, удаляются лишь
+      пропавшие из записи (на экземпляры ссылается borrow_record);
+    – записи больше нет в экспорте – DELETE FROM book (каскадом);
+    – отпечаток тот же – ничего.
+  Издатели, авторы и счётчики id тоже в STATE; с --append id новых
+  книг – из последовательностей БД.  Первый запуск с пустым STATE даёт
+  полный дамп.  STATE фиксируется, только когда дамп дописан.  Только
+  --format sql, без --load и контрольных точек.
+• ParsedRecord.shelf – шифр #903.
+
+Изменения v4.23
+───────────────
+• --cache FILE: разобранные IBIS-записи (ParsedRecord) сохраняются в
+  кэш – NDJSON, по записи на строку, со сжатием по расширению
+  (parsed_cache.py).  Кэш помечен sha256 входного файла и версией
+  парсера; если они совпадают, следующий запуск записи не разбирает, а
+  читает из кэша и пишет дамп в любом формате (--format, --load,
+  другой снимок справочников, --dedup-authors) – на 200 тыс. записей
+  вдвое быстрее полного разбора.  Вместе с контрольными точками не
+  работает.  python parsed_cache.py <кэш> [файл] – что в кэше и годен ли.
+
+Изменения v4.22
+───────────────
+• Пары (книга, код) BBK/UDC и экземпляры, которые копятся до конца
+  разбора, хранятся в столбцах array (compact_store.py): book_id –
+  array('I'), коды, даты, места хранения и цены – номерами в словаре
+  значений.  Сверх --spill-rows строк в памяти столбцы сбрасываются во
+  временный файл.  На 200 тыс. записей пик памяти – 196 МБ вместо 340.
+• Дубликаты экземпляров (book_id, inv_no) ищутся при разборе записи, а
+  не в общем множестве на весь файл: book_id у каждой записи свой.
+  filter_links гасит повторные связи по ключу book_id << 32 | id.
+• Контрольные точки меньше: столбцы пиклятся как байты.
+
+Изменения v4.21
+───────────────
+• --append: дозагрузка в непустую БД вместо полной перезаливки.
+  Издатели и авторы, которые уже есть в БД, читаются заранее (один
+  запрос на таблицу, append_ids.load_existing) и в дамп не попадают –
+  новые книги ссылаются на их id.  id книг, издателей и авторов больше
+  не с 1: IdPool резервирует их блоками из последовательностей SERIAL
+  (nextval, один запрос на блок для нескольких таблиц), перед этим
+  последовательности поднимаются до max(id) – после полной загрузки
+  они стоят на месте.  Без --append id по-прежнему с 1.
+• В итоговой статистике – сколько издателей вставлено.
+
+Изменения v4.20
+───────────────
+• --dedup-authors: варианты написания одного автора (&laquo;ИВАНОВ И.И.&raquo;,
+  &laquo;Иванов И.&raquo;, &laquo;Семёнов&raquo; / &laquo;Семенов&raquo;, латинские буквы-двойники в
+  фамилии) становятся одной строкой public.author.  Перед разбором –
+  быстрый проход только по #700/#701 (record_authors), author_dedup
+  строит карту слияния: сравнение лишь внутри блока &laquo;нормализованная
+  фамилия + первый инициал&raquo;, поэтому линейно по числу авторов.
+  Карта применяется в DumpBuilder до назначения id; в статистике –
+  сколько вариантов слито.  Без ключа дамп прежний.
+
+Изменения v4.19
+───────────────
+• --index: индекс смещений записей рядом с файлом (irbis_index.py,
+  <input_file>.idx, mmap + array('Q')); строится, если его нет или
+  файл изменился.  С --workers N файл делится по индексу на куски
+  примерно равной длины (не меньше 4·N, около 4 МиБ каждый) по
+  границам записей, и каждый процесс пула читает свой кусок сам –
+  в пул уходят только смещения, а не строки записей.  Дамп тот же.
+  По индексу же отдельную запись можно достать и разобрать:
+  python irbis_index.py record|book <файл> N --parse.
+
+Изменения v4.18
+───────────────
+• Сжатые файлы (streams.py): входной экспорт &laquo;.gz&raquo; / &laquo;.bz2&raquo; / &laquo;.xz&raquo;
+  читается с распаковкой на лету, дамп с таким расширением пишется
+  сжатым.  Временных файлов нет.  Контрольные точки со сжатым дампом
+  не работают (откат вывода невозможен) – только с несжатым или --load;
+  сжатый вход возобновляется, смещения считаются в распакованных данных.
+
+Изменения v4.17
+───────────────
+• Время и число вызовов по этапам (metrics.py): чтение, разбор, запись
+  строк, filter_links, контрольные точки.  Таблица этапов – в итоговой
+  статистике, с --workers время складывается по процессам.
+• Ход импорта в stderr: записей, записей/с, доля файла и ETA по
+  смещению во входном файле (--progress / --no-progress; по умолчанию
+  – если stderr терминал).
+• --metrics FILE: то же плюс счётчики и кэши в JSON – для графиков по
+  ночным импортам.  С --metrics разбор записи расписывается подробно:
+  строки записи, каждый обработчик тега (#200, #210, ...), авторы,
+  parse_pub_info, parse_copies, коды.  Без него эти замеры выключены –
+  они добавляют к разбору записи несколько процентов.
+
+Изменения v4.16
+───────────────
+• Нормализаторы parse_pub_info, parse_author_700_701, normalize_author,
+  _normalize_date и _normalize_price кэшируются (memo.py, LRU).
+  Размер – --memo-size (0 – без кэша); в итоговой статистике –
+  попадания/промахи по каждому, с --workers – суммарно по процессам.
+
+Изменения v4.15
+───────────────
+• parse_record() – один проход по строкам записи: тег и содержимое
+  выделяются один раз, дальше работают обработчики из таблицы
+  _FIELD_HANDLERS, и только для последнего вхождения тега.  Подполя
+  разбираются лишь те, что нужны обработчику.  Не-IBIS записи
+  отбрасываются до какого-либо разбора подполей.
+• parse_copies() без замыкания и словаря на каждое поле #910.
+
+Изменения v4.14
+───────────────
+• Коды BBK/UDC, которых нет в справочнике дословно, привязываются к
+  самому длинному предку (code_index.CodeIndex, префиксное дерево,
+  O(длина кода)): &laquo;32.973.26-018.2&raquo; &rarr; &laquo;32.973&raquo;, &laquo;004.42:681.3&raquo; &rarr; &laquo;004.42&raquo;.
+  В статистике – сколько кодов найдено точно, сколько по предку и на
+  каких уровнях.  --exact-codes возвращает прежнее точное сопоставление.
+
+Изменения v4.13
+───────────────
+• --dict-snapshot FILE: справочники BBK/UDC берутся из локального
+  снимка (dict_snapshot.py, SQLite + md5 исходной таблицы).  С БД снимок
+  обновляется, только если таблица изменилась; с DSN &laquo;-&raquo; парсер
+  работает без БД вообще (кроме --load).
+
+Изменения v4.12
+───────────────
+• Контрольные точки: с --checkpoint-every N каждые N входных записей в
+  файл <input_file>.ckpt сохраняются смещение во входном файле,
+  состояние DumpBuilder (счётчики и словари id издателей/авторов,
+  накопленные связи и экземпляры) и позиция вывода.  --resume
+  продолжает с последней точки; итоговый дамп совпадает с дампом
+  непрерывного прогона.  Для --format copy строки таблиц копятся в
+  каталоге <output_file>.spool, для --load каждая точка – это COMMIT.
+
+Изменения v4.11
+───────────────
+• Разбор записи (parse_record) отделён от назначения id и записи строк
+  (DumpBuilder): parse_record – чистая функция, её результат –
+  ParsedRecord.  Экземпляры (#910) разбираются там же, по записи.
+• Ключ --workers N: записи разбираются пачками в пуле из N процессов,
+  id книг, издателей и авторов назначаются в главном процессе строго
+  в порядке входного файла, поэтому дамп побайтно совпадает с
+  однопроцессным.  В работе одновременно не более 2·N пачек.
+
+Изменения v4.10
+───────────────
+• Ключ --load: строки не пишутся в файл, а сразу грузятся в БД через
+  COPY (sql_writer.DbLoader) пачками по --batch-size строк в одной
+  транзакции; в итоговой статистике – строк/сек по каждой таблице.
+
+Изменения v4.9
+──────────────
+• Запись дампа вынесена в sql_writer.py.  Ключ --format выбирает формат:
+    – sql  (по умолчанию) – INSERT на каждую строку, как раньше;
+    – copy – один блок COPY ... FROM stdin на таблицу в порядке
+      зависимостей, в одной транзакции.  Загружается в разы быстрее.
+• Повторяющиеся коды BBK/UDC и авторы внутри одной записи отбрасываются
+  сразу (раньше их гасил ON CONFLICT, в COPY он недоступен).
+• Цена, не помещающаяся в NUMERIC(12,2) или некорректная (&laquo;1.234.56&raquo;),
+  пишется как NULL, а не роняет вставку экземпляра.
+
+Изменения v4.8
+──────────────
+• Входной файл больше не читается целиком через readlines(): записи
+  отдаёт генератор irbis_reader.iter_records(), в памяти одновременно
+  находится только одна запись.  Потребление памяти не зависит от
+  размера экспорта.
 
 Изменения v4.7
 ──────────────
@@ -16,23 +279,40 @@
 """
 
 from __future__ import annotations
-import sys, os, re, psycopg2
+import sys, os, re, argparse, pickle, psycopg2
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime
-from typing import Dict, List, Set, Tuple, Iterable, Optional
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Set, Tuple, Iterable, Iterator, NamedTuple, Optional
 
 from fix_bbk      import load_bbk_map, filter_links as filter_bbk_links
 from fix_udc      import load_udc_map, filter_links as filter_udc_links
 from fix_pub_info import parse_pub_info
 from fix_authors  import normalize_author, parse_author_700_701
+from author_dedup import AuthorKey, AuthorResolver
+from append_ids   import IdPool, MIN_BLOCK, load_existing
+from compact_store import CodePairs, CopyRows, DEFAULT_SPILL_ROWS
+from parsed_cache import CacheWriter, file_digest, is_valid, iter_cache, read_header
+from delta_state  import DeltaState, content_key, fingerprint
+from search_docs  import author_name, search_row
+from report_tables import REPORT_TABLES, ReportTotals
+from irbis_reader import iter_records_at, READ_BUFFER
+from irbis_index  import NOT_IN_ORDER, open_index, read_range
+from streams      import open_stream, codec_of, compression_ratio
+from checkpoint   import save_checkpoint, load_checkpoint, remove_checkpoint
+from dict_snapshot import refresh_snapshot, load_snapshot
+from code_index   import CodeIndex
+import irbis_scan, memo, metrics
+from memo         import memoized
+from metrics      import stage, timed
+from sql_writer   import (WRITERS, DELTA_ON_CONFLICT, ON_LOAN, CopyWriter, DbLoader, InsertWriter,
+                          ShardWriter, sql_literal)
 
-# ───────────────────────── utils ─────────────────────────
-def sql_escape(s: str) -> str:
-    return s.replace("'", "''")
-
-def sql_val(s: str | None) -> str:
-    """Строка &rarr; SQL-литерал или NULL."""
-    return f"'{sql_escape(s)}'" if s else "NULL"
+__version__ = '4.32'
 
+# ───────────────────────── utils ─────────────────────────
 _split_codes_re = re.compile(r'[;,]\s*|\s{2,}')
 def split_codes(raw: str) -> List[str]:
     return [x.strip() for x in _split_codes_re.split(raw) if x.strip()]
@@ -57,6 +337,7 @@ def split_author_fields(author: str) -> Tuple[str, str, str]:
 # ───── helpers: 910 (экземпляры) ─────
 _SUBFIELD_SEP = '\x1f'
 _PRICE_RE     = re.compile(r'[\d\.,]+')
+_PRICE_MAX    = Decimal(10) ** 10       # NUMERIC(12,2)
 _DATE_FORMATS = [
     ("%d.%m.%Y", re.compile(r"^\d{2}\.\d{2}\.\d{4}$")),
     ("%d.%m.%y", re.compile(r"^\d{2}\.\d{2}\.\d{2}$")),
@@ -70,6 +351,7 @@ def _iter_subfields(text: str) -> Iterable[tuple[str,str]]:
         if chunk:
             yield chunk[0].upper(), chunk[1:].strip()
 
+@memoized('normalize_date')
 def _normalize_date(raw: str) -> Optional[str]:
     raw = raw.strip()
     if not raw:
@@ -85,284 +367,1189 @@ def _normalize_date(raw: str) -> Optional[str]:
     except Exception:
         return None
 
+@memoized('normalize_price')
 def _normalize_price(raw: str) -> Optional[str]:
+    """&laquo;1 200,50 р.&raquo; &rarr; '1200.50'; всё, что не влезает в NUMERIC(12,2), &rarr; None."""
     if not raw:
         return None
     m = _PRICE_RE.search(raw.replace(' ', ''))
     if not m:
         return None
     val = m.group(0).replace(',', '.')
-    return val[:-1] if val.endswith('.') else val
+    val = val[:-1] if val.endswith('.') else val
+    try:
+        num = Decimal(val)
+    except InvalidOperation:            # &laquo;1.234.56&raquo;, &laquo;.&raquo;
+        return None
+    return val if abs(num) < _PRICE_MAX else None
 
 def parse_copies(
     pairs: List[Tuple[int,str]]
 ) -> Tuple[List[Tuple[int,str|None,str|None,str|None,str|None]], int]:
+    """
+    [(book_id, содержимое #910), …] &rarr; (экземпляры, число битых).
+    Одно поле может описывать несколько экземпляров: каждый ^B начинает
+    новый.  Экземпляр без инвентарного номера (^B) считается битым.
+    """
     cleaned: List[Tuple[int,str|None,str|None,str|None,str|None]] = []
     skipped = 0
     for book_id, raw in pairs:
-        subs = list(_iter_subfields(raw))
-        if not subs:
+        if _SUBFIELD_SEP not in raw and '^' in raw:
+            raw = raw.replace('^', _SUBFIELD_SEP)
+        inv = date_in = storage = price = None
+        empty = True
+        for chunk in raw.split(_SUBFIELD_SEP):
+            chunk = chunk.strip()
+            if not chunk:
+                continue
+            empty = False
+            code, val = chunk[0].upper(), chunk[1:].strip()
+            if code == 'B':
+                if inv or date_in or storage or price:
+                    if inv:
+                        cleaned.append(_copy_row(book_id, inv, date_in, storage, price))
+                    else:
+                        skipped += 1
+                    date_in = storage = price = None
+                inv = val
+            elif code == 'C':
+                date_in = val
+            elif code == 'D':
+                storage = val
+            elif code == 'E':
+                price = val
+        if empty:
             skipped += 1
-            continue
-        cur = {"B": None, "C": None, "D": None, "E": None}
-        def _flush():
-            nonlocal skipped
-            if cur["B"]:
-                cleaned.append((
-                    book_id,
-                    cur["B"],
-                    _normalize_date(cur["C"] or ''),
-                    cur["D"] or '',
-                    _normalize_price(cur["E"] or '')
-                ))
+        elif inv or date_in or storage or price:
+            if inv:
+                cleaned.append(_copy_row(book_id, inv, date_in, storage, price))
             else:
                 skipped += 1
-            for k in cur:
-                cur[k] = None
-
-        for code, val in subs:
-            if code == 'B':
-                if any(cur.values()):
-                    _flush()
-                cur['B'] = val
-            elif code in cur:
-                cur[code] = val
-        if any(cur.values()):
-            _flush()
     return cleaned, skipped
 
+def _copy_row(book_id: int, inv: str, date_in: Optional[str], storage: Optional[str],
+              price: Optional[str]) -> Tuple[int,str,str|None,str,str|None]:
+    return (book_id, inv, _normalize_date(date_in or ''), storage or '',
+            _normalize_price(price or ''))
+
+# ───── разбор одной записи (чистая функция, годится для пула процессов) ─────
+Copy = Tuple[str, Optional[str], str, Optional[str]]   # inv_no, date, storage, price
+
+class ParsedRecord(NamedTuple):
+    title: str
+    type_: str
+    edit: str
+    edition_statement: str
+    phys_desc: str
+    series: str
+    publisher: Optional[str]
+    city: Optional[str]
+    year: Optional[int]
+    authors: Tuple[Tuple[str, str, str], ...]      # (last, first, patr), отсортированы
+    bbk_codes: Tuple[str, ...]
+    udc_codes: Tuple[str, ...]
+    copies: Tuple[Copy, ...]
+    broken_copies: int
+    shelf: str = ''                                # шифр хранения #903 (идентичность для --delta)
+
+
+# ───── поля записи: подполя, обработчики тегов ─────
+def _pick_subfields(text: str, wanted: str) -> Dict[str, str]:
+    """
+    Как {k: v for k, v in _iter_subfields(text)}, но только коды из
+    *wanted* (при повторе кода побеждает последний).
+    """
+    if _SUBFIELD_SEP not in text and '^' in text:
+        text = text.replace('^', _SUBFIELD_SEP)
+    sd: Dict[str, str] = {}
+    for chunk in text.split(_SUBFIELD_SEP):
+        chunk = chunk.strip()
+        if chunk:
+            code = chunk[0].upper()
+            if code in wanted:
+                sd[code] = chunk[1:].strip()
+    return sd
+
+def _join(sep: str, *parts: str) -> str:
+    return sep.join(x for x in parts if x)
+
+def _on_200(content: str, f: Dict[str, str]) -> None:
+    sd = _pick_subfields(content, 'AEF')
+    f['title'], f['type_'], f['edit'] = sd.get('A', ''), sd.get('E', ''), sd.get('F', '')
+
+def _on_205(content: str, f: Dict[str, str]) -> None:
+    # первое подполе A, а не последнее – как было всегда
+    f['edition_statement'] = next((v for k, v in _iter_subfields(content) if k == 'A'), '')
+
+def _on_210(content: str, f: Dict[str, str]) -> None:
+    sd = _pick_subfields(content, 'ACD')
+    f['pub_info'] = _join(', ', sd.get('A', ''), sd.get('C', ''), sd.get('D', ''))
+
+def _on_215(content: str, f: Dict[str, str]) -> None:
+    sd = _pick_subfields(content, 'A1')
+    f['phys_desc'] = _join(' ', sd.get('A', ''), sd.get('1', ''))
+
+def _on_225(content: str, f: Dict[str, str]) -> None:
+    sd = _pick_subfields(content, 'VA')
+    f['series'] = _join(' ', sd.get('V', ''), sd.get('A', ''))
+
+def _on_675(content: str, f: Dict[str, str]) -> None:
+    f['udc'] = content.strip()
+
+def _on_964(content: str, f: Dict[str, str]) -> None:
+    f['bbk'] = content.strip()
+
+def _on_903(content: str, f: Dict[str, str]) -> None:
+    f['shelf'] = content.strip()
+
+# неповторяемые поля: при повторе тега действует последнее вхождение,
+# поэтому обработчик вызывается один раз – для последнего
+_FIELD_HANDLERS = {
+    '200': _on_200, '205': _on_205, '210': _on_210, '215': _on_215,
+    '225': _on_225, '675': _on_675, '964': _on_964, '903': _on_903,
+}
+# те же обработчики с замером времени (этапы &laquo;parse.#200&raquo;, ...) – при metrics.detail
+_TIMED_HANDLERS = {tag: timed(f'parse.#{tag}')(fn) for tag, fn in _FIELD_HANDLERS.items()}
+_AUTHOR_TAGS = frozenset(('700', '701'))
+
+# ───── этапы для metrics ─────
+_ST_READ     = stage('read')
+_ST_PARSE    = stage('parse')
+_ST_WRITE    = stage('write')
+_ST_SCAN     = stage('parse.scan', detail=True)
+_ST_AUTHORS  = stage('parse.authors', detail=True)
+_ST_PUB_INFO = stage('parse.pub_info', detail=True)
+_ST_COPIES   = stage('parse.copies', detail=True)
+_ST_CODES    = stage('parse.codes', detail=True)
+
+
+def _author_fields(authors_raw: List[str]) -> Tuple[Tuple[str, str, str], ...]:
+    """Содержимое #700/#701 &rarr; уникальные (last, first, patr), отсортированы."""
+    authors: Set[str] = set()
+    for content in authors_raw:
+        a = parse_author_700_701(content)
+        if a:
+            authors.add(normalize_author(a))
+    return tuple(split_author_fields(a) for a in sorted(authors))
+
+
+def record_authors(rec: List[str]) -> Optional[Tuple[Tuple[str, str, str], ...]]:
+    """Только авторы записи (как ParsedRecord.authors); не-IBIS &rarr; None."""
+    authors_raw: List[str] = []
+    ibis = False
+    for line in rec:
+        if line.startswith(('#700:', '#701:')):
+            authors_raw.append(line[5:])
+        elif not ibis and line.startswith('#920:'):
+            ibis = line[5:].strip() == 'IBIS'
+    return _author_fields(authors_raw) if ibis else None
+
+
+ScanFields = Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...], int]
+
+def scan_record(rec: List[str]) -> Optional[ScanFields]:
+    """
+    Для --scan: (коды BBK, коды UDC, инв. номера экземпляров, битых строк
+    #910) – как их получил бы parse_record(); не-IBIS &rarr; None.  Прочие
+    поля не разбираются.
+    """
+    last: Dict[str, str] = {}
+    copies: List[str] = []
+    ibis = False
+    for line in rec:
+        if line.startswith(('#964:', '#675:')):
+            last[line[1:4]] = line[5:]
+        elif line.startswith('#910:'):
+            copies.append(line[5:].strip())
+        elif not ibis and line.startswith('#920:'):
+            ibis = line[5:].strip() == 'IBIS'
+    if not ibis:
+        return None
+    cleaned, broken = parse_copies([(0, cp) for cp in copies])
+    return (tuple(dict.fromkeys(split_codes(last.get('964', '').strip()))),
+            tuple(dict.fromkeys(split_codes(last.get('675', '').strip()))),
+            tuple(c[1] for c in cleaned), broken)
+
+
+def parse_record(rec: List[str]) -> Optional[ParsedRecord]:
+    """
+    Запись ИРБИС (строки) &rarr; ParsedRecord; не-IBIS записи &rarr; None.
+
+    Один проход по строкам: каждая строка режется на тег и содержимое
+    один раз, содержимое запоминается только для нужных тегов.  Пока не
+    ясно, что запись IBIS (#920), подполя не разбираются вовсе.
+    """
+    last: Dict[str, str] = {}
+    authors_raw: List[str] = []
+    copies: List[str] = []
+    ibis = False
+
+    with _ST_SCAN:
+        for line in rec:
+            if not line.startswith('#'):
+                continue
+            tag, _, content = line.partition(':')
+            tag = tag[1:]
+            if tag in _FIELD_HANDLERS:
+                last[tag] = content
+            elif tag in _AUTHOR_TAGS:
+                authors_raw.append(content)
+            elif tag == '910':
+                copies.append(content.strip())
+            elif tag == '920' and not ibis:
+                ibis = content.strip() == 'IBIS'
+
+    if not ibis:
+        return None
+
+    f: Dict[str, str] = {}
+    handlers = _TIMED_HANDLERS if metrics.detail else _FIELD_HANDLERS
+    for tag, content in last.items():
+        handlers[tag](content, f)
+
+    with _ST_AUTHORS:
+        author_fields = _author_fields(authors_raw)
+
+    with _ST_PUB_INFO:
+        publisher_name, pub_city, pub_year = parse_pub_info(f.get('pub_info', ''))
+    with _ST_COPIES:
+        cleaned, broken = parse_copies([(0, cp) for cp in copies])
+    with _ST_CODES:
+        bbk_codes = tuple(dict.fromkeys(split_codes(f.get('bbk', ''))))
+        udc_codes = tuple(dict.fromkeys(split_codes(f.get('udc', ''))))
+
+    return ParsedRecord(
+        f.get('title', ''), f.get('type_', ''), f.get('edit', ''),
+        f.get('edition_statement', ''), f.get('phys_desc', ''), f.get('series', ''),
+        publisher_name, pub_city, pub_year,
+        author_fields, bbk_codes, udc_codes,
+        tuple(c[1:] for c in cleaned),
+        broken, f.get('shelf', ''),
+    )
+
+
+WorkerStats = Tuple[memo.Stats, metrics.Stats]
+RANGE_BYTES = 4 << 20           # примерный размер куска файла для --index
+
+def _parse_batch(batch: List[List[str]]) -> Tuple[int, WorkerStats, List[Optional[ParsedRecord]]]:
+    # вместе с результатом – накопленные счётчики кэша и этапов этого процесса
+    with _ST_PARSE:
+        parsed = [parse_record(rec) for rec in batch]
+    return os.getpid(), (memo.stats(), metrics.stats()), parsed
+
+
+def _parse_range(path: str, begin: int, end: int
+                 ) -> Tuple[int, WorkerStats, List[Tuple[Optional[ParsedRecord], int]]]:
+    # кусок файла процесс читает сам – записи не гоняются через pickle
+    with _ST_READ:
+        records = list(read_range(path, begin, end))
+    with _ST_PARSE:
+        parsed = [(parse_record(rec), off) for rec, off in records]
+    return os.getpid(), (memo.stats(), metrics.stats()), parsed
+
+
+def _pool_map(fn, tasks: Iterable[tuple], workers: int,
+              worker_stats: Optional[Dict[int, WorkerStats]]) -> Iterator[list]:
+    """
+    fn(*task) в пуле из *workers* процессов, результаты – строго в
+    порядке задач; в работе одновременно не более 2·workers задач.
+    """
+    if worker_stats is None:
+        worker_stats = {}
+    def _take(fut) -> list:
+        pid, st, result = fut.result()
+        worker_stats[pid] = st
+        return result
+
+    sizes = {name: info[2] for name, info in memo.stats().items()}
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(sizes, metrics.detail)) as pool:
+        pending: deque = deque()
+        for task in tasks:
+            pending.append(pool.submit(fn, *task))
+            if len(pending) >= 2 * workers:
+                yield _take(pending.popleft())
+        while pending:
+            yield _take(pending.popleft())
+
+
+def iter_parsed(records: Iterable[List[str]], workers: int = 1,
+                batch_size: int = 500,
+                worker_stats: Optional[Dict[int, WorkerStats]] = None,
+                ) -> Iterator[Optional[ParsedRecord]]:
+    """
+    parse_record() по всем записям, результаты – строго в порядке входа.
+    При workers > 1 пачки по batch_size записей разбираются в пуле
+    процессов; в работе одновременно не более 2·workers пачек.
+    В worker_stats собираются счётчики кэшей нормализаторов и этапов
+    (metrics) процессов пула.
+    """
+    if workers <= 1:
+        for rec in records:
+            with _ST_PARSE:
+                parsed = parse_record(rec)
+            yield parsed
+        return
+
+    def _batches() -> Iterator[tuple]:
+        batch: List[List[str]] = []
+        for rec in records:
+            batch.append(rec)
+            if len(batch) >= batch_size:
+                yield (batch,)
+                batch = []
+        if batch:
+            yield (batch,)
+
+    for parsed in _pool_map(_parse_batch, _batches(), workers, worker_stats):
+        yield from parsed
+
+
+def iter_parsed_ranges(path: str, ranges: Iterable[Tuple[int, int]], workers: int,
+                       worker_stats: Optional[Dict[int, WorkerStats]] = None,
+                       ) -> Iterator[Tuple[Optional[ParsedRecord], int]]:
+    """
+    То же по кускам файла (irbis_index.RecordIndex.ranges): каждый
+    процесс пула сам читает и разбирает свой кусок.  Отдаёт
+    (результат, смещение после записи) строго в порядке файла.
+    """
+    for parsed in _pool_map(_parse_range, ((path, b, e) for b, e in ranges),
+                            workers, worker_stats):
+        yield from parsed
+
+
+def _init_worker(sizes: Dict[str, int], detail: bool) -> None:
+    for name, size in sizes.items():
+        memo.configure(size, name)
+    metrics.configure(detail)
+    metrics.reset()                     # при fork счётчики главного процесса копируются
+
+# ───── сборка дампа: id и строки таблиц ─────
+class DumpBuilder:
+    """
+    Принимает ParsedRecord по порядку, назначает id книг, издателей и
+    авторов и передаёт строки писателю (sql_writer).  Ссылки BBK/UDC и
+    экземпляры копятся до finish().
+
+    С delta (DeltaState, --delta) пишется только разница с прошлым
+    запуском: книга с прежним отпечатком пропускается, изменённая –
+    UPDATE и заново её связи, пропавшие из экспорта – DELETE в finish().
+    """
+
+    def __init__(self, out, bbk_map: Dict[str,int], udc_map: Dict[str,int],
+                 exact_codes: bool = False,
+                 author_map: Optional[Dict[AuthorKey, AuthorKey]] = None,
+                 ids: Optional[IdPool] = None,
+                 spill_rows: int = DEFAULT_SPILL_ROWS,
+                 delta: Optional[DeltaState] = None,
+                 search_docs: bool = False, report_tables: bool = False,
+                 spill_dir: Optional[str] = None):
+        self.out = out
+        self.delta = delta
+        # строка public.book_search на книгу (search_docs.py)
+        self.search_docs = search_docs
+        self.search_rows = 0
+        # итоги по экземплярам для сводных таблиц отчётов (report_tables.py)
+        self.reports = ReportTotals() if report_tables else None
+        # id книг / издателей / авторов: с 1 или из последовательностей БД (--append)
+        self.ids = ids or IdPool(('book', 'publisher', 'author'))
+        self.bbk_map, self.udc_map = bbk_map, udc_map
+        # без exact_codes код без точного совпадения привязывается к предку
+        self.bbk_index = None if exact_codes else CodeIndex(bbk_map)
+        self.udc_index = None if exact_codes else CodeIndex(udc_map)
+        # вариант автора &rarr; канонический (author_dedup), до назначения id
+        self.author_map = author_map
+        self.record_count = 0
+        # id книг подряд в порядке записей? (нумерация для irbis_index --book)
+        self.first_book_id: Optional[int] = None
+        self.last_book_id: Optional[int] = None
+        self.book_ids_in_order = True
+        # маппинг издателей: name &rarr; id, авторов: (last, first, patr, birth) &rarr; id
+        self.publisher_ids: Dict[str,int] = {}
+        self.author_ids: Dict[Tuple[str,str,str,None], int] = {}
+        self.new_publishers = self.new_authors = 0
+        self.total_book_author_links = 0
+        # (book_id, code) и экземпляры до finish() – в компактных столбцах;
+        # со spill_dir (контрольные точки) сброс – в именованные файлы в нём
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        def spill(name: str) -> Optional[str]:
+            return os.path.join(spill_dir, f"{name}.cols") if spill_dir else None
+        self.bbk_pairs_raw = CodePairs(spill_rows, spill('bbk'))
+        self.udc_pairs_raw = CodePairs(spill_rows, spill('udc'))
+        self.cleaned_copies = CopyRows(spill_rows, spill('copies'))
+        self.skipped_copies = 0
+        self.skipped_dupes = 0
+
+    _NOT_STATE = ('out', 'bbk_map', 'udc_map', 'bbk_index', 'udc_index', 'author_map', 'ids',
+                  'delta')
+
+    def state(self) -> Dict:
+        """Всё, кроме писателя и справочников, – для контрольной точки."""
+        state = {k: v for k, v in self.__dict__.items() if k not in self._NOT_STATE}
+        state['ids'] = self.ids.checkpoint()
+        return state
+
+    def restore(self, state: Dict) -> None:
+        state = dict(state)
+        self.ids.restore(state.pop('ids'))
+        self.__dict__.update(state)
+
+    def preload(self, publisher_ids: Dict[str, int],
+                author_ids: Dict[Tuple[str, str, str, Optional[int]], int]) -> None:
+        """Издатели и авторы, уже имеющиеся в БД (--append): строки для них не пишутся."""
+        self.publisher_ids.update(publisher_ids)
+        self.author_ids.update(author_ids)
+
+    def _delta_book(self, p: ParsedRecord) -> Tuple[Optional[int], bool]:
+        """(book_id, книга уже в БД) по STATE; (None, _) – запись не менялась."""
+        delta = self.delta
+        identity = delta.identity(p.shelf or content_key(p.title, p.authors, p.publisher, p.year))
+        fp = fingerprint(p)
+        prev = delta.lookup(identity)
+        if prev is None:
+            book_id, known = self.ids.take('book'), False
+            delta.new += 1
+        elif prev[1] == fp:
+            delta.unchanged += 1
+            return None, True
+        else:
+            book_id, known = prev[0], True
+            delta.changed += 1
+        delta.put(identity, book_id, fp)
+        return book_id, known
+
+    def _delta_clear(self, book_id: int, p: ParsedRecord) -> None:
+        """
+        Прежние строки изменённой книги: связи удаляются (ниже пишутся
+        заново), экземпляры – только те, которых в записи больше нет;
+        оставшиеся обновит INSERT ... ON CONFLICT DO UPDATE в finish().
+        """
+        out = self.out
+        out.comment(f"\n-- --- Книга #{book_id} изменена: прежние связи ---\n")
+        where = f"book_id={book_id}"
+        for table in ('book_pub_place', 'book_author', 'book_bbk_raw', 'book_udc_raw',
+                      'book_bbk', 'book_udc') + (('book_search',) if self.search_docs else ()):
+            out.delete(table, where)
+        inv_nos = dict.fromkeys(cp[0] for cp in p.copies)
+        if inv_nos:
+            where += f" AND inventory_no NOT IN ({','.join(map(sql_literal, inv_nos))})"
+        out.delete('book_copy', f"{where} AND NOT {ON_LOAN['book_copy']}")
+
+    def add(self, p: ParsedRecord) -> None:
+        out = self.out
+        self.record_count += 1
+        if self.reports is not None:
+            # с --delta – и по книгам без изменений: таблицы считаются по всему экспорту
+            self.reports.add(p.copies)
+        known = False
+        if self.delta is None:
+            book_id = self.ids.take('book')
+        else:
+            book_id, known = self._delta_book(p)
+            if book_id is None:
+                self.book_ids_in_order = False
+                return
+            if known:
+                self._delta_clear(book_id, p)
+        if self.first_book_id is None:
+            self.first_book_id = book_id
+        elif book_id != self.last_book_id + 1:
+            self.book_ids_in_order = False
+        self.last_book_id = book_id
+
+        # --- Издатели ---
+        out.comment("-- --- Издатели ---\n")
+        pub_id = None
+        if p.publisher:
+            pub_id = self.publisher_ids.get(p.publisher)
+            if pub_id is None:
+                pub_id = self.publisher_ids[p.publisher] = self.ids.take('publisher')
+                out.row('publisher', (pub_id, p.publisher))
+                self.new_publishers += 1
+
+        # --- Книга ---
+        out.comment(f"\n-- --- Книга #{book_id} ---\n")
+        (out.update if known else out.row)('book', (
+            book_id, p.title, p.type_, p.edit, p.edition_statement, p.phys_desc, p.series))
+
+        # --- Место публикации ---
+        out.comment("\n-- --- Место публикации ---\n")
+        out.row('book_pub_place', (book_id, pub_id, p.city, p.year))
+
+        # --- Авторы ---
+        if p.authors:
+            out.comment("\n-- --- Авторы ---\n")
+        linked: Set[int] = set()
+        names: List[str] = []
+        author_map = self.author_map
+        for author in p.authors:
+            if author_map:
+                author = author_map.get(author, author)
+            last, first, patr = author
+            key = (last, first, patr, None)
+            aid = self.author_ids.get(key)
+            if aid is None:
+                aid = self.author_ids[key] = self.ids.take('author')
+                out.row('author', (aid, last, first, patr, None))
+                self.new_authors += 1
+            if aid in linked:
+                continue
+            linked.add(aid)
+            names.append(author_name(last, first, patr))
+            out.row('book_author', (book_id, aid))
+            self.total_book_author_links += 1
+
+        # --- BBK / UDC RAW ---
+        out.comment("\n-- --- Коды BBK / UDC (RAW) ---\n")
+        for code in p.bbk_codes:
+            self.bbk_pairs_raw.append(book_id, code)
+            out.row('book_bbk_raw', (book_id, code))
+        for code in p.udc_codes:
+            self.udc_pairs_raw.append(book_id, code)
+            out.row('book_udc_raw', (book_id, code))
+
+        # --- Поисковый документ ---
+        if self.search_docs:
+            out.row('book_search', search_row(book_id, p.title, p.series, names, p.publisher,
+                                              p.city, p.year, p.bbk_codes, p.udc_codes))
+            self.search_rows += 1
+
+        # экземлпяры; book_id у каждой записи свой, поэтому дубликаты
+        # (book_id, inv_no) ищутся только внутри записи
+        seen_inv: Set[str] = set()
+        for cp in p.copies:
+            if cp[0] in seen_inv:
+                self.skipped_dupes += 1
+                continue
+            seen_inv.add(cp[0])
+            self.cleaned_copies.append(book_id, *cp)
+        self.skipped_copies += p.broken_copies
+
+    def book_numbering(self) -> int:
+        """first_id для индекса записей: id первой книги, если дальше подряд."""
+        if not self.book_ids_in_order:
+            return NOT_IN_ORDER
+        return self.first_book_id or 1
+
+    def finish(self) -> None:
+        out = self.out
+
+        # ───── дельта: книги, которых в экспорте больше нет ─────
+        # (и пропавшие раньше – вдруг тогда были на руках; уже удалённые – no-op)
+        if self.delta is not None:
+            gone = self.delta.deleted()
+            if gone:
+                out.comment("\n-- ======================================\n-- Удалённые книги\n-- ======================================\n"
+                            "-- выданные на руки не удаляются (повтор в следующей дельте);\n"
+                            "-- какие остались – покажет SELECT после DELETE\n")
+            for i in range(0, len(gone), 1000):
+                ids = ','.join(map(str, gone[i:i + 1000]))
+                out.delete('book', f"id IN ({ids}) AND NOT {ON_LOAN['book']}")
+                out.comment(f"SELECT id AS \"не удалена: на руках\" FROM public.book WHERE id IN ({ids});\n")
+
+        # ───── BBK / UDC clean ─────
+        with stage('filter_links'):
+            self.bbk_links, self.bbk_skipped = filter_bbk_links(
+                self.bbk_pairs_raw, self.bbk_map, self.bbk_index)
+            self.udc_links, self.udc_skipped = filter_udc_links(
+                self.udc_pairs_raw, self.udc_map, self.udc_index)
+
+        with stage('write_finish'):
+            out.comment("\n-- ======================================\n-- BBK (очищенные)\n-- ======================================\n")
+            for bid, bbkid in self.bbk_links:
+                out.row('book_bbk', (bid, bbkid))
+            out.comment(f"-- BBK: вставлено {len(self.bbk_links)}, пропущено {self.bbk_skipped}\n")
+
+            out.comment("\n-- ======================================\n-- UDC (очищенные)\n-- ======================================\n")
+            for bid, udcid in self.udc_links:
+                out.row('book_udc', (bid, udcid))
+            out.comment(f"-- UDC: вставлено {len(self.udc_links)}, пропущено {self.udc_skipped}\n")
+
+            # ───── Экземпляры ─────
+            out.comment("\n-- ======================================\n-- Экземпляры\n-- ======================================\n")
+            for bid, inv_no, date_in, storage, price in self.cleaned_copies:
+                out.row('book_copy', (bid, inv_no, date_in, storage,
+                                      Decimal(price) if price else None))
+            self.inserted_copies = len(self.cleaned_copies)
+
+            out.comment(
+                f"-- Экземпляры: вставлено {self.inserted_copies}, "
+                f"дубликатов пропущено {self.skipped_dupes}, битых строк {self.skipped_copies}\n")
+
+            # ───── Сводные таблицы отчётов ─────
+            if self.reports is not None:
+                out.comment("\n-- ======================================\n-- Сводные таблицы отчётов\n-- ======================================\n")
+                if self.delta is not None:
+                    for table in REPORT_TABLES:
+                        out.delete(table, 'TRUE')
+                for table, row in self.reports.rows():
+                    out.row(table, row)
+        with stage('close'):
+            out.close()
+            for store in (self.bbk_pairs_raw, self.udc_pairs_raw, self.cleaned_copies):
+                store.close()
+            if self.spill_dir:
+                os.rmdir(self.spill_dir)
+
+    def counts(self) -> Dict[str, int]:
+        """Итоговые счётчики (после finish) – для JSON-отчёта."""
+        return {
+            'records_ibis': self.record_count,
+            'bbk_raw': len(self.bbk_pairs_raw), 'bbk_links': len(self.bbk_links),
+            'bbk_skipped': self.bbk_skipped,
+            'udc_raw': len(self.udc_pairs_raw), 'udc_links': len(self.udc_links),
+            'udc_skipped': self.udc_skipped,
+            'copies': self.inserted_copies, 'copy_dupes': self.skipped_dupes,
+            'copies_broken': self.skipped_copies,
+            'publishers': self.new_publishers,
+            'authors': self.new_authors, 'book_author': self.total_book_author_links,
+            'author_variants_merged': len(self.author_map or ()),
+            'search_docs': self.search_rows,
+            **({'report_places': len(self.reports.places), 'report_years': len(self.reports.years),
+                'stock_total_price': str(self.reports.total)}
+               if self.reports is not None else {}),
+            **({'delta_new': self.delta.new, 'delta_changed': self.delta.changed,
+                'delta_unchanged': self.delta.unchanged, 'delta_deleted': self.delta.removed}
+               if self.delta is not None else {}),
+        }
+
+    def summary(self) -> str:
+        bbk_match = f"\n  ▸ сопоставление        : {self.bbk_index.summary()}" if self.bbk_index else ''
+        udc_match = f"\n  ▸ сопоставление        : {self.udc_index.summary()}" if self.udc_index else ''
+        merged = (f"\n  ▸ вариантов слито      : {len(self.author_map)}"
+                  if self.author_map is not None else '')
+        delta = (f"\n- Дельта                : {self.delta.summary()}"
+                 if self.delta is not None else '')
+        search = (f"\n- Поисковых документов  : {self.search_rows}"
+                  if self.search_docs else '')
+        r = self.reports
+        reports = (f"\n- Сводные таблицы       : мест хранения {len(r.places)}, годов {len(r.years)}, "
+                   f"экземпляров {r.copies}, сумма {r.total}" if r is not None else '')
+        return f"""\
+Обработка завершена.
+- Записей IBIS          : {self.record_count}
+- BBK RAW               : {len(self.bbk_pairs_raw)}  (очищено {len(self.bbk_links)}, пропущено {self.bbk_skipped}){bbk_match}
+- UDC RAW               : {len(self.udc_pairs_raw)}  (очищено {len(self.udc_links)}, пропущено {self.udc_skipped}){udc_match}
+- Экземпляры вставлено  : {self.inserted_copies}
+  ▸ дубликаты пропущено  : {self.skipped_dupes}
+  ▸ битые строки         : {self.skipped_copies}
+- Издателей вставлено   : {self.new_publishers}
+- Авторов вставлено     : {self.new_authors}{merged}
+- Связей книга-автор    : {self.total_book_author_links}{search}{reports}{delta}"""
+
 # ────────────────────── main ───────────────────────────
-def parse_irbis_file(dsn: str, infile: str, outfile: str) -> None:
+OFFLINE_DSN = '-'
+
+def load_dictionaries(conn, snapshot: Optional[str]) -> Tuple[Dict[str,int], Dict[str,int]]:
+    """
+    Справочники BBK/UDC: без снимка – прямо из БД; со снимком – снимок
+    сначала сверяется с БД (если она есть) и при необходимости обновляется.
+    """
+    if snapshot is None:
+        if conn is None:
+            sys.exit("Ошибка: для работы без БД нужен --dict-snapshot.")
+        with conn.cursor() as cur:
+            return load_bbk_map(cur), load_udc_map(cur)
+    if conn is not None:
+        with conn.cursor() as cur:
+            refreshed = refresh_snapshot(cur, snapshot)
+        changed = [name.upper() for name, flag in refreshed.items() if flag]
+        if changed:
+            print(f"Снимок справочников {snapshot} обновлён: {', '.join(changed)}")
+    try:
+        return load_snapshot(snapshot)
+    except FileNotFoundError:
+        sys.exit(f"Ошибка: снимок справочников {snapshot} не найден.")
+
+
+def collect_authors(infile: str, cache: Optional[str] = None) -> AuthorResolver:
+    """
+    Проход по экспорту только за авторами IBIS-записей (для --dedup-authors);
+    с *cache* – по кэшу разобранных записей.
+    """
+    resolver = AuthorResolver()
+    if cache is not None:
+        with open_stream(cache, 'rb') as f:
+            for record, _ in iter_cached(f):
+                if record.authors:
+                    resolver.update(record.authors)
+        return resolver
+    with open_stream(infile, 'rb', buffering=READ_BUFFER) as f:
+        for rec, _ in iter_records_at(f):
+            authors = record_authors(rec)
+            if authors:
+                resolver.update(authors)
+    return resolver
+
+
+def scan_irbis_file(dsn: str, infile: str, sample: Optional[float] = None,
+                    dict_snapshot: Optional[str] = None, exact_codes: bool = False,
+                    use_index: bool = False) -> None:
+    """
+    --scan: счётчики экспорта без дампа (irbis_scan.py) – записи, доля не-IBIS,
+    коды BBK/UDC, которые отбросит filter_links, битые строки #910.
+    sample – доля файла (0 < sample < 1); с use_index – по индексу смещений.
+    """
+    if use_index and codec_of(infile):
+        sys.exit(f"Ошибка: --index строится только по несжатому файлу, а {infile} сжат.")
+    index = None
+    if use_index and sample is not None:
+        index, rebuilt = open_index(infile)
+        print(f"Индекс {infile}.idx: записей {len(index)}"
+              f"{' (построен заново)' if rebuilt else ''}.")
+    with ExitStack() as db:
+        conn = None if dsn == OFFLINE_DSN else db.enter_context(psycopg2.connect(dsn))
+        bbk_map, udc_map = load_dictionaries(conn, dict_snapshot)
+
+    t0 = metrics.clock()
+    with open_stream(infile, 'rb', buffering=READ_BUFFER) as f:
+        stats, info = irbis_scan.scan(f, infile, scan_record, sample, index)
+    bbk_index = None if exact_codes else CodeIndex(bbk_map)
+    udc_index = None if exact_codes else CodeIndex(udc_map)
+    bbk_dropped = irbis_scan.dropped_codes(stats.bbk, bbk_map, filter_bbk_links, bbk_index)
+    udc_dropped = irbis_scan.dropped_codes(stats.udc, udc_map, filter_udc_links, udc_index)
+    match = (f"BBK {bbk_index.summary()}; UDC {udc_index.summary()} (по различным кодам)"
+             if bbk_index else '')
+    print(irbis_scan.report(stats, info, bbk_dropped, udc_dropped, match))
+    print(f"- Время                 : {metrics.clock() - t0:.2f} с")
+
+
+def iter_cached(stream) -> Iterator[Tuple[ParsedRecord, int]]:
+    """(запись, байт кэша прочитано) из кэша разобранных записей (parsed_cache)."""
+    for row, pos in iter_cache(stream):
+        if isinstance(row, dict):               # строка конца
+            return
+        yield ParsedRecord._make(row), pos
+
+
+def _input_id(infile: str) -> Tuple[str, int, float]:
+    st = os.stat(infile)
+    return os.path.abspath(infile), st.st_size, st.st_mtime
+
+
+def parse_irbis_file(dsn: str, infile: str, outfile: str, fmt: str = 'sql',
+                     load: bool = False, batch_size: int = 10000,
+                     workers: int = 1, checkpoint_every: int = 0,
+                     resume: bool = False, dict_snapshot: Optional[str] = None,
+                     exact_codes: bool = False,
+                     memo_size: int = memo.DEFAULT_SIZE,
+                     metrics_path: Optional[str] = None,
+                     progress: Optional[bool] = None,
+                     use_index: bool = False, dedup_authors: bool = False,
+                     append: bool = False,
+                     spill_rows: int = DEFAULT_SPILL_ROWS,
+                     cache: Optional[str] = None,
+                     delta: Optional[str] = None,
+                     search_docs: bool = False, report_tables: bool = False,
+                     shard_rows: int = 0) -> None:
+    """
+    Разбирает экспорт *infile* и пишет дамп в *outfile* (формат *fmt*),
+    либо при load=True грузит строки прямо в БД *dsn* одной транзакцией.
+    dsn == '-' – без БД, справочники из снимка *dict_snapshot*.
+    exact_codes – коды BBK/UDC только по точному совпадению, без предков.
+    workers > 1 – разбор записей в пуле процессов.
+    checkpoint_every > 0 – контрольная точка каждые N записей,
+    resume – продолжить с последней контрольной точки.
+    metrics_path – JSON-отчёт: время по этапам, скорость, счётчики
+    (с ним же считаются подробные этапы – обработчики тегов и т.п.).
+    progress – строка хода импорта в stderr (None – если stderr терминал).
+    use_index – индекс смещений записей (<infile>.idx, строится при
+    необходимости); с workers > 1 процессы пула сами читают куски файла.
+    dedup_authors – сначала отдельный проход за авторами, варианты одного
+    автора сливаются (author_dedup) до назначения id.
+    append – дозагрузка в непустую БД: издатели и авторы из БД не
+    повторяются, id берутся из её последовательностей (append_ids).
+    spill_rows – пары кодов и экземпляры сверх стольких строк в памяти
+    сбрасываются во временный файл (0 – не сбрасывать).
+    cache – кэш разобранных записей (parsed_cache): если он сделан по
+    этому же файлу этой же версией, записи берутся из него без разбора,
+    иначе разбираются и кэш пишется заново.
+    delta – файл состояния (delta_state): в дамп идут только новые,
+    изменённые и удалённые с прошлого запуска книги (только --format sql).
+    search_docs – ещё и строка public.book_search на книгу (search_docs.py).
+    report_tables – сводные таблицы отчётов по экземплярам (report_tables.py).
+    fmt == 'shards' – *outfile* – каталог: файл на таблицу (по shard_rows
+    строк в куске, 0 – один) и manifest.json для load_shards.py.
+    """
     print(f"Начало обработки файла: {infile}")
+    memo.configure(memo_size)
+    metrics.configure(detailed=metrics_path is not None)
+    metrics.reset()
+    started, t_start = datetime.now(), metrics.clock()
+    if progress is None:
+        progress = sys.stderr.isatty()
+
+    ckpt_path = f"{infile}.ckpt"
+    try:
+        ckpt = load_checkpoint(ckpt_path) if resume else None
+    except (ValueError, EOFError, OSError, pickle.UnpicklingError, AttributeError,
+            ImportError, IndexError, TypeError) as e:
+        sys.exit(f"Ошибка: контрольная точка {ckpt_path} не читается ({e}) – удалите её "
+                 f"(и {ckpt_path}.spill) или запустите без --resume.")
+    if resume and ckpt is None:
+        print(f"Контрольная точка {ckpt_path} не найдена – обработка с начала.")
+    if ckpt is not None:
+        if ckpt['input'] != _input_id(infile):
+            sys.exit(f"Ошибка: входной файл изменился после контрольной точки {ckpt_path}.")
+        if (ckpt['fmt'], ckpt['load']) != (fmt, load):
+            sys.exit(f"Ошибка: контрольная точка сделана для "
+                     f"{'--load' if ckpt['load'] else '--format ' + ckpt['fmt']}.")
+        if ckpt.get('append', False) != append:
+            sys.exit(f"Ошибка: контрольная точка сделана "
+                     f"{'без' if append else 'с'} --append.")
+        if ckpt.get('dedup_authors', False) != dedup_authors:
+            sys.exit(f"Ошибка: контрольная точка сделана "
+                     f"{'без' if dedup_authors else 'с'} --dedup-authors.")
+        if ckpt.get('search_docs', False) != search_docs:
+            sys.exit(f"Ошибка: контрольная точка сделана "
+                     f"{'без' if search_docs else 'с'} --search-docs.")
+        if ckpt.get('report_tables', False) != report_tables:
+            sys.exit(f"Ошибка: контрольная точка сделана "
+                     f"{'без' if report_tables else 'с'} --report-tables.")
+        checkpoint_every = checkpoint_every or ckpt['every']
+        print(f"Продолжение с байта {ckpt['offset']} "
+              f"(записей IBIS: {ckpt['dump']['record_count']}).")
+
+    if dsn == OFFLINE_DSN and (load or append):
+        sys.exit(f"Ошибка: {'--load' if load else '--append'} требует подключения к БД.")
+    if use_index and codec_of(infile):
+        sys.exit(f"Ошибка: --index строится только по несжатому файлу, а {infile} сжат.")
+    if fmt == 'shards' and codec_of(outfile):
+        sys.exit("Ошибка: для --format shards output_file – каталог, а не сжатый файл.")
+    if checkpoint_every and not load and codec_of(outfile):
+        sys.exit(f"Ошибка: контрольные точки откатывают вывод на место, в сжатом "
+                 f"{outfile} это невозможно – пишите дамп без сжатия или используйте --load.")
+
+    if delta and (load or fmt != 'sql'):
+        sys.exit("Ошибка: --delta пишет UPDATE / DELETE – только с --format sql, без --load.")
+    if report_tables and append:
+        sys.exit("Ошибка: при --append парсер видит только новые книги – сводные таблицы "
+                 "пересчитайте в БД: SELECT public.refresh_report_tables();")
+    if delta and (checkpoint_every or resume):
+        sys.exit("Ошибка: --delta и контрольные точки несовместимы "
+                 "(состояние фиксируется только после всего дампа).")
 
-    # маппинг авторов: (last, first, patr, birth) &rarr; id
-    author_ids: Dict[Tuple[str,str,str,None], int] = {}
-    next_author_id = 1
-    total_book_author_links = 0
+    from_cache, digest = False, None
+    if cache:
+        if checkpoint_every or resume:
+            sys.exit("Ошибка: --cache и контрольные точки несовместимы "
+                     "(из кэша дамп пишется со скоростью чтения файла).")
+        with stage('cache_check'):
+            digest = file_digest(infile)
+            from_cache = is_valid(read_header(cache), digest, __version__)
+        print(f"Кэш разобранных записей {cache}: "
+              f"{'записи берутся из него' if from_cache else 'нет или устарел – будет записан'}.")
 
-    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
-        bbk_map = load_bbk_map(cur)
-        udc_map = load_udc_map(cur)
+    author_map = None
+    if dedup_authors:
+        with stage('dedup_authors'):
+            resolver = collect_authors(infile, cache if from_cache else None)
+            author_map = resolver.merge_map()
+        print(f"Слияние авторов: {resolver.summary()}.")
 
+    index = None
+    if use_index and not from_cache:
+        index, rebuilt = open_index(infile)
+        print(f"Индекс {infile}.idx: записей {len(index)}"
+              f"{' (построен заново)' if rebuilt else ''}.")
+
+    with ExitStack() as db:
+        conn = None if dsn == OFFLINE_DSN else db.enter_context(psycopg2.connect(dsn))
+        bbk_map, udc_map = load_dictionaries(conn, dict_snapshot)
+
+        src_path = cache if from_cache else infile
         try:
-            with open(infile, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            src = open_stream(src_path, 'rb', buffering=READ_BUFFER)
         except FileNotFoundError:
-            sys.exit(f"Ошибка: файл &laquo;{infile}&raquo; не найден.")
+            sys.exit(f"Ошибка: файл &laquo;{src_path}&raquo; не найден.")
 
-        with open(outfile, 'w', encoding='utf-8') as sql_out:
-            sql_out.write(f"""\
+        with src, ExitStack() as stack:
+            if load:
+                out = DbLoader(conn, batch_size)
+            elif fmt == 'shards':
+                out = ShardWriter(outfile, shard_rows, resume=ckpt is not None, header={
+                    'parser': __version__, 'created': f"{datetime.now():%Y-%m-%dT%H:%M:%S}",
+                    'input': os.path.abspath(infile), 'append': append})
+            elif ckpt is not None:
+                try:
+                    sql_out = stack.enter_context(open(outfile, 'r+', encoding='utf-8'))
+                except FileNotFoundError:
+                    sys.exit(f"Ошибка: нет файла {outfile} для продолжения.")
+            else:
+                sql_out = stack.enter_context(open_stream(outfile, 'w', encoding='utf-8'))
+                sql_out.write(f"""\
 -- ======================================================
--- SQL-дамп, создан parse_irbis_file v4.7
+-- SQL-дамп, создан parse_irbis_file v{__version__}
 -- Дата создания : {datetime.now():%Y-%m-%d %H:%M:%S}
 -- Входной файл  : {infile}
+-- Формат        : {fmt}
+-- Режим         : {'дозагрузка, id из последовательностей БД' if append else 'пустая схема, id с 1'}{f'''
+-- Дельта        : изменения относительно {delta}''' if delta else ''}
 -- ======================================================
 
 """)
+            if not load and fmt != 'shards':
+                spool_dir = f"{outfile}.spool" if checkpoint_every else None
+                out = (CopyWriter(sql_out, spool_dir) if fmt == 'copy'
+                       else InsertWriter(sql_out, DELTA_ON_CONFLICT) if delta
+                       else WRITERS[fmt](sql_out))
 
-            record_lines: List[str] = []
-            record_count = 0
-            publisher_ids: Dict[str,int] = {}
-            next_publisher_id = 1
-            bbk_pairs_raw: List[Tuple[int,str]] = []
-            udc_pairs_raw: List[Tuple[int,str]] = []
-            copies_pairs_raw: List[Tuple[int,str]] = []
-
-            # ───── process_record ─────
-            def process_record(rec: List[str]) -> None:
-                nonlocal record_count, next_publisher_id, next_author_id, total_book_author_links
-                if not any(l.startswith('#920:') and l.split(':',1)[1].strip() == 'IBIS' for l in rec):
-                    return
-
-                record_count += 1
-                # --- поля
-                title = type_ = edit = edition_statement = ''
-                pub_info_raw = phys_desc = series_ = ''
-                bbk_raw = udc_raw = ''
-                authors: Set[str] = set()
-                copies: List[str] = []
-
-                for line in rec:
-                    line = line.rstrip('\n')
-                    if not line.startswith('#'):
-                        continue
-                    tag, _, content = line.partition(':')
-                    tag = tag[1:]
-
-                    if tag == '200':
-                        subs = _iter_subfields(content)
-                        sd = {k:v for k,v in subs}
-                        title = sd.get('A','').strip()
-                        type_ = sd.get('E','').strip()
-                        edit  = sd.get('F','').strip()
-                    elif tag == '205':
-                        edition_statement = next((v for k,v in _iter_subfields(content) if k=='A'), '').strip()
-                    elif tag == '210':
-                        sd = {k:v for k,v in _iter_subfields(content)}
-                        pub_info_raw = ', '.join(x for x in (
-                            sd.get('A','').strip(), sd.get('C','').strip(), sd.get('D','').strip()) if x)
-                    elif tag == '215':
-                        sd = {k:v for k,v in _iter_subfields(content)}
-                        phys_desc = ' '.join(x for x in (sd.get('A','').strip(), sd.get('1','').strip()) if x)
-                    elif tag == '225':
-                        sd = {k:v for k,v in _iter_subfields(content)}
-                        series_ = ' '.join(x for x in (sd.get('V','').strip(), sd.get('A','').strip()) if x)
-                    elif tag == '675':
-                        udc_raw = content.strip()
-                    elif tag == '964':
-                        bbk_raw = content.strip()
-                    elif tag in ('700','701'):
-                        a = parse_author_700_701(content)
-                        if a:
-                            authors.add(normalize_author(a))
-                    elif tag == '910':
-                        copies.append(content.strip())
-
-                publisher_name, pub_city, pub_year = parse_pub_info(pub_info_raw)
-
-                # --- Издатели ---
-                sql_out.write("-- --- Издатели ---\n")
-                pub_id_sql = 'NULL'
-                if publisher_name:
-                    if publisher_name not in publisher_ids:
-                        publisher_ids[publisher_name] = next_publisher_id
-                        sql_out.write(
-                            f"INSERT INTO public.publisher(id,name) "
-                            f"VALUES ({next_publisher_id},'{sql_escape(publisher_name)}');\n")
-                        next_publisher_id += 1
-                    pub_id_sql = str(publisher_ids[publisher_name])
-
-                # --- Книга ---
-                sql_out.write(f"\n-- --- Книга #{record_count} ---\n")
-                sql_out.write(
-                    "INSERT INTO public.book("
-                    "id,title,\"type\",edit,edition_statement,phys_desc,series) VALUES("
-                    f"{record_count}, {sql_val(title)}, {sql_val(type_)}, {sql_val(edit)}, "
-                    f"{sql_val(edition_statement)}, {sql_val(phys_desc)}, {sql_val(series_)});\n"
-                )
-
-                # --- Место публикации ---
-                sql_out.write("\n-- --- Место публикации ---\n")
-                city_sql = sql_val(pub_city)
-                year_sql = str(pub_year) if pub_year else 'NULL'
-                sql_out.write(
-                    f"INSERT INTO public.book_pub_place(book_id,publisher_id,city,pub_year) "
-                    f"VALUES ({record_count},{pub_id_sql},{city_sql},{year_sql});\n")
-
-                # --- Авторы ---
-                if authors:
-                    sql_out.write("\n-- --- Авторы ---\n")
-                for author in sorted(authors):
-                    last, first, patr = split_author_fields(author)
-                    key = (last, first, patr, None)
-                    if key not in author_ids:
-                        author_ids[key] = next_author_id
-                        sql_out.write(
-                            "INSERT INTO public.author(id,last_name,first_name,patronymic,birth_year) "
-                            f"VALUES ({next_author_id}, {sql_val(last)}, {sql_val(first)}, "
-                            f"{sql_val(patr)}, NULL);\n"
-                        )
-                        next_author_id += 1
-                    aid = author_ids[key]
-                    sql_out.write(
-                        f"INSERT INTO public.book_author(book_id,author_id) "
-                        f"VALUES ({record_count},{aid}) ON CONFLICT DO NOTHING;\n"
-                    )
-                    total_book_author_links += 1
-
-                # --- BBK / UDC RAW ---
-                sql_out.write("\n-- --- Коды BBK / UDC (RAW) ---\n")
-                for code in split_codes(bbk_raw):
-                    bbk_pairs_raw.append((record_count, code))
-                    sql_out.write(
-                        f"INSERT INTO public.book_bbk_raw(book_id,bbk_code) "
-                        f"VALUES ({record_count},{sql_val(code)}) ON CONFLICT DO NOTHING;\n")
-                for code in split_codes(udc_raw):
-                    udc_pairs_raw.append((record_count, code))
-                    sql_out.write(
-                        f"INSERT INTO public.book_udc_raw(book_id,udc_code) "
-                        f"VALUES ({record_count},{sql_val(code)}) ON CONFLICT DO NOTHING;\n")
-
-                # экземлпяры
-                for cp in copies:
-                    copies_pairs_raw.append((record_count, cp))
-
-            # ───── чтение входного файла ─────
-            for ln in lines:
-                if ln.strip() == '*****':
-                    if record_lines:
-                        process_record(record_lines)
-                        record_lines.clear()
-                else:
-                    record_lines.append(ln)
-            if record_lines:
-                process_record(record_lines)
-
-            # ───── BBK / UDC clean ─────
-            bbk_links, bbk_skipped = filter_bbk_links(bbk_pairs_raw, bbk_map)
-            udc_links, udc_skipped = filter_udc_links(udc_pairs_raw, udc_map)
-
-            sql_out.write("\n-- ======================================\n-- BBK (очищенные)\n-- ======================================\n")
-            for bid, bbkid in bbk_links:
-                sql_out.write(f"INSERT INTO public.book_bbk(book_id,bbk_id) "
-                              f"VALUES ({bid},{bbkid}) ON CONFLICT DO NOTHING;\n")
-            sql_out.write(f"-- BBK: вставлено {len(bbk_links)}, пропущено {bbk_skipped}\n")
-
-            sql_out.write("\n-- ======================================\n-- UDC (очищенные)\n-- ======================================\n")
-            for bid, udcid in udc_links:
-                sql_out.write(f"INSERT INTO public.book_udc(book_id,udc_id) "
-                              f"VALUES ({bid},{udcid}) ON CONFLICT DO NOTHING;\n")
-            sql_out.write(f"-- UDC: вставлено {len(udc_links)}, пропущено {udc_skipped}\n")
+            ids = IdPool(('book', 'publisher', 'author'), conn if append else None)
+            delta_state = None
+            if delta:
+                try:
+                    delta_state = DeltaState(delta)
+                except ValueError as e:
+                    sys.exit(f"Ошибка: {e}")
+                stack.callback(delta_state.close)
+                if not append:
+                    ids.next.update(delta_state.next_ids())
+            dump = DumpBuilder(out, bbk_map, udc_map, exact_codes, author_map, ids,
+                               spill_rows, delta_state, search_docs, report_tables,
+                               f"{ckpt_path}.spill" if checkpoint_every else None)
+            start = 0
+            if delta_state is not None:
+                publishers, authors = delta_state.entities()
+                dump.preload(publishers, authors)
+                print(f"Дельта: состояние {delta}"
+                      f"{' новое – все записи пойдут как новые' if delta_state.fresh else ''}"
+                      f", издателей {len(publishers)}, авторов {len(authors)}.")
+            if ckpt is not None:
+                dump.restore(ckpt['dump'])
+                out.restore(ckpt['writer'])
+                start = ckpt['offset']
+            elif append:
+                with stage('preload'):
+                    publishers, authors = load_existing(conn)
+                    dump.preload(publishers, authors)
+                    ids.prefetch({'book': len(index.books) if index else MIN_BLOCK,
+                                  'publisher': MIN_BLOCK, 'author': MIN_BLOCK})
+                print(f"Дозагрузка: в БД издателей {len(publishers)}, авторов {len(authors)}.")
 
-            # ───── Экземпляры ─────
-            cleaned_copies, skipped_copies = parse_copies(copies_pairs_raw)
-            seen_pairs: set[tuple[int,str]] = set()
-            skipped_dupes = 0
-            sql_out.write("\n-- ======================================\n-- Экземпляры\n-- ======================================\n")
-            for bid, inv_no, date_in, storage, price in cleaned_copies:
-                if (bid, inv_no) in seen_pairs:
-                    skipped_dupes += 1
-                    continue
-                seen_pairs.add((bid, inv_no))
-                sql_out.write(
-                    "INSERT INTO public.book_copy(book_id,inventory_no,receipt_date,storage_place,price) "
-                    f"VALUES ({bid},{sql_val(inv_no)},{sql_val(date_in)},{sql_val(storage)},{price or 'NULL'}) "
-                    "ON CONFLICT (book_id,inventory_no) DO NOTHING;\n")
-
-            sql_out.write(
-                f"-- Экземпляры: вставлено {len(seen_pairs)}, "
-                f"дубликатов пропущено {skipped_dupes}, битых строк {skipped_copies}\n")
+            # смещения записей, которые уже прочитаны, но ещё в разборе
+            ends: deque = deque()
+            def _records() -> Iterator[List[str]]:
+                reader = iter_records_at(src, start)
+                while True:
+                    with _ST_READ:
+                        item = next(reader, None)
+                    if item is None:
+                        return
+                    ends.append(item[1])
+                    yield item[0]
+
+            def _cached() -> Iterator[Tuple[ParsedRecord, int]]:
+                reader = iter_cached(src)
+                while True:
+                    with _ST_READ:
+                        item = next(reader, None)
+                    if item is None:
+                        return
+                    yield item
+
+            input_size = os.path.getsize(infile)
+            worker_stats: Dict[int, WorkerStats] = {}
+            cache_out = None
+            if cache and not from_cache:
+                cache_out = CacheWriter(cache, {'parser': __version__, 'input_sha256': digest,
+                                                'input_bytes': input_size})
+                stack.callback(cache_out.abort)
+            if from_cache:
+                stream = _cached()
+            elif index is not None and workers > 1:
+                parts = max(4 * workers, input_size // RANGE_BYTES)
+                stream = iter_parsed_ranges(infile, index.ranges(parts, start),
+                                            workers, worker_stats)
+            else:
+                stream = ((parsed, ends.popleft())
+                          for parsed in iter_parsed(_records(), workers,
+                                                    worker_stats=worker_stats))
+            bar = (metrics.Progress(os.path.getsize(src_path), start,
+                                    ratio=(lambda: compression_ratio(src)) if codec_of(src_path) else None)
+                   if progress else None)
+            records_in = since_ckpt = 0
+            for parsed, end in stream:
+                records_in += 1
+                if parsed is not None:
+                    with _ST_WRITE:
+                        dump.add(parsed)
+                        if cache_out is not None:
+                            cache_out.write(parsed)
+                if bar:
+                    bar.update(end)
+                since_ckpt += 1
+                if checkpoint_every and since_ckpt >= checkpoint_every:
+                    with stage('checkpoint'):
+                        save_checkpoint(ckpt_path, {
+                            'input': _input_id(infile), 'fmt': fmt, 'load': load,
+                            'every': checkpoint_every, 'offset': end,
+                            'dedup_authors': dedup_authors, 'append': append,
+                            'search_docs': search_docs, 'report_tables': report_tables,
+                            'dump': dump.state(), 'writer': out.checkpoint()})
+                    since_ckpt = 0
+            if bar:
+                bar.done()
+            if cache_out is not None:
+                cache_out.close(records_in)
+            dump.finish()
+            if delta_state is not None:
+                with stage('delta_state'):
+                    delta_state.save_entities(dump.publisher_ids, dump.author_ids)
+                    delta_state.commit({} if append else ids.next, __version__)
+        if index is not None:
+            # нумерация книг дампа (уже записанного) – для irbis_index.py book
+            index.record_numbering(dump.book_numbering()
+                                   if dump.record_count == len(index.books) else NOT_IN_ORDER)
+        remove_checkpoint(ckpt_path)
+        wall = metrics.clock() - t_start
 
         # ───── финальная статистика ─────
-        print(f"""\
-Обработка завершена.
-- Записей IBIS          : {record_count}
-- BBK RAW               : {len(bbk_pairs_raw)}  (очищено {len(bbk_links)}, пропущено {bbk_skipped})
-- UDC RAW               : {len(udc_pairs_raw)}  (очищено {len(udc_links)}, пропущено {udc_skipped})
-- Экземпляры вставлено  : {len(seen_pairs)}
-  ▸ дубликаты пропущено  : {skipped_dupes}
-  ▸ битые строки         : {skipped_copies}
-- Авторов вставлено     : {len(author_ids)}
-- Связей книга-автор    : {total_book_author_links}
-- SQL-файл создан       : {outfile}
-""")
+        memo_stats = memo.merge_stats(memo.stats(), *(m for m, _ in worker_stats.values()))
+        stage_stats = metrics.merge_stats(metrics.stats(), *(t for _, t in worker_stats.values()))
+        print(dump.summary())
+        print(f"- Кэш нормализаторов    : размер {memo_size}\n{memo.report(memo_stats)}")
+        print(f"- Время                 : {wall:.2f} с, {records_in} записей "
+              f"({records_in / wall if wall else 0:,.0f} зап/с)"
+              f"{', этапы суммарно по процессам' if workers > 1 else ''}\n"
+              f"{metrics.report(stage_stats, wall)}")
+        if append:
+            print(f"- id из последовательностей: зарезервировано {ids.reserved}")
+        if load:
+            print(f"- Загружено в БД (COPY, пачки по {batch_size}):\n{out.report()}\n")
+        elif fmt == 'shards':
+            print(f"- Каталог шардов        : {outfile}  (manifest.json, грузить load_shards.py)\n")
+        else:
+            print(f"- SQL-файл создан       : {outfile}  (формат {fmt})\n")
+        if metrics_path:
+            metrics.write_report(metrics_path, {
+                'version': __version__,
+                'started': f"{started:%Y-%m-%dT%H:%M:%S}",
+                'input': os.path.abspath(infile), 'input_bytes': input_size,
+                'resumed_from': start,
+                'format': 'load' if load else fmt, 'workers': workers,
+                'append': append, 'from_cache': from_cache, 'delta': delta is not None,
+                'wall_seconds': round(wall, 3),
+                'records_in': records_in,
+                'records_per_sec': round(records_in / wall, 1) if wall else 0.0,
+                'counts': dump.counts(),
+                'tables': dict(getattr(out, 'rows', {})),
+                'stages': metrics.to_json(stage_stats),
+                'memo': {name: dict(zip(('hits', 'misses', 'maxsize', 'currsize'), v))
+                         for name, v in sorted(memo_stats.items())},
+            })
+            print(f"- Метрики               : {metrics_path}")
 
 # ──────────────── CLI ────────────────
 if __name__ == '__main__':
-    DEF_IN, DEF_OUT = "irbis_data.txt", "inserts.sql"
-    if len(sys.argv) < 2:
-        sys.exit("""\
-Использование:
-  python parse_irbis_file.py "dbname=library user=admin password=*** host=localhost port=5432"
-       [input_file] [output_file]
-
-По умолчанию:
-  input_file  = irbis_data.txt
-  output_file = inserts.sql
-""")
-    dsn     = sys.argv[1]
-    infile  = sys.argv[2] if len(sys.argv) > 2 else DEF_IN
-    outfile = sys.argv[3] if len(sys.argv) > 3 else DEF_OUT
-    if not os.path.exists(infile):
-        sys.exit(f"Ошибка: файл {infile} не найден.")
-    parse_irbis_file(dsn, infile, outfile)
\ No newline at end of file
+    ap = argparse.ArgumentParser(
+        description="Парсер экспорта ИРБИС &rarr; SQL-дамп.",
+        epilog='Пример: python parse_irbis_file.py '
+               '"dbname=library user=admin password=*** host=localhost port=5432" '
+               'irbis_data.txt inserts.sql --format copy')
+    ap.add_argument('dsn', help='строка подключения psycopg2 (справочники BBK/UDC); '
+                                '"-" – без БД, справочники из --dict-snapshot')
+    ap.add_argument('input_file',  nargs='?', default='irbis_data.txt',
+                    help='экспорт ИРБИС, можно .gz / .bz2 / .xz')
+    ap.add_argument('output_file', nargs='?', default='inserts.sql',
+                    help='дамп; с расширением .gz / .bz2 / .xz пишется сжатым')
+    ap.add_argument('--format', dest='fmt', choices=sorted(WRITERS), default='sql',
+                    help='sql – INSERT на строку (по умолчанию), '
+                         'copy – блоки COPY ... FROM stdin по таблицам, '
+                         'shards – output_file – каталог: файл на таблицу и manifest.json '
+                         '(параллельная загрузка – load_shards.py)')
+    ap.add_argument('--shard-rows', type=int, default=0, metavar='N',
+                    help='с --format shards – не больше N строк в файле, большие '
+                         'таблицы режутся на куски и грузятся параллельно (0 – файл на таблицу)')
+    ap.add_argument('--load', action='store_true',
+                    help='грузить строки прямо в БД (одна транзакция), '
+                         'без промежуточного файла; output_file игнорируется')
+    ap.add_argument('--batch-size', type=int, default=10000, metavar='N',
+                    help='строк в одной пачке COPY для --load (по умолчанию 10000)')
+    ap.add_argument('--workers', type=int, default=1, metavar='N',
+                    help='разбирать записи в N процессах (по умолчанию 1)')
+    ap.add_argument('--checkpoint-every', type=int, default=0, metavar='N',
+                    help='контрольная точка каждые N входных записей '
+                         '(<input_file>.ckpt); с --load каждая точка – COMMIT')
+    ap.add_argument('--resume', action='store_true',
+                    help='продолжить с последней контрольной точки')
+    ap.add_argument('--dict-snapshot', metavar='FILE',
+                    help='локальный снимок справочников BBK/UDC (SQLite); '
+                         'с БД обновляется, только если таблицы изменились')
+    ap.add_argument('--exact-codes', action='store_true',
+                    help='связывать коды BBK/UDC только при точном совпадении '
+                         '(по умолчанию – с самым длинным предком из справочника)')
+    ap.add_argument('--metrics', metavar='FILE',
+                    help='записать JSON-отчёт: время и вызовы по этапам (подробно, '
+                         'вплоть до обработчиков тегов), скорость, счётчики')
+    ap.add_argument('--index', action='store_true',
+                    help='индекс смещений записей <input_file>.idx (irbis_index.py, '
+                         'строится при необходимости); с --workers файл делится на '
+                         'куски по границам записей, процессы читают их сами')
+    ap.add_argument('--dedup-authors', action='store_true',
+                    help='сливать варианты написания одного автора (регистр, ё, '
+                         'латинские буквы-двойники, неполные инициалы) – author_dedup.py')
+    ap.add_argument('--append', action='store_true',
+                    help='дозагрузка в непустую БД: издатели и авторы, которые там уже '
+                         'есть, не повторяются, id книг/издателей/авторов резервируются '
+                         'из последовательностей БД')
+    ap.add_argument('--spill-rows', type=int, default=DEFAULT_SPILL_ROWS, metavar='N',
+                    help='пары (книга, код) и экземпляры копятся до конца разбора; '
+                         'сверх N строк в памяти они сбрасываются во временный файл '
+                         f'(0 – не сбрасывать, по умолчанию {DEFAULT_SPILL_ROWS})')
+    ap.add_argument('--cache', metavar='FILE',
+                    help='кэш разобранных записей (NDJSON, можно .gz): если он сделан по '
+                         'этому же input_file, записи не разбираются, а читаются из него '
+                         '(другой --format, справочники и т.п. без повторного разбора); '
+                         'иначе пишется заново')
+    ap.add_argument('--delta', metavar='STATE',
+                    help='дельта-дамп: только новые, изменённые (UPDATE) и исчезнувшие '
+                         '(DELETE) с прошлого запуска книги; STATE – SQLite-файл с '
+                         'отпечатками записей по шифру #903 (delta_state.py), '
+                         'создаётся при первом запуске')
+    ap.add_argument('--search-docs', action='store_true',
+                    help='писать и public.book_search – строку на книгу с заглавием, '
+                         'авторами, издателем, годом, кодами и нормализованным текстом '
+                         'для полнотекстового и триграммного поиска (search_docs.py); '
+                         'с --delta ключ должен быть одинаковым во всех запусках')
+    ap.add_argument('--report-tables', action='store_true',
+                    help='писать и сводные таблицы отчётов (экземпляры по местам '
+                         'хранения, поступления по годам, итог фонда), посчитанные '
+                         'за тот же проход (report_tables.py); не с --append')
+    ap.add_argument('--scan', action='store_true',
+                    help='только скан без дампа (irbis_scan.py): записи, доля не-IBIS, '
+                         'коды BBK/UDC, которые будут отброшены, битые строки #910; '
+                         'output_file игнорируется')
+    ap.add_argument('--sample', type=float, metavar='F',
+                    help='с --scan – разобрать долю F файла (0 < F < 1), равномерно по '
+                         'файлу; с --index – каждую 1/F-ю запись по индексу')
+    progress = ap.add_mutually_exclusive_group()
+    progress.add_argument('--progress', action='store_true', default=None,
+                          help='ход импорта в stderr (по умолчанию – если stderr терминал)')
+    progress.add_argument('--no-progress', dest='progress', action='store_false')
+    ap.add_argument('--memo-size', type=int, default=memo.DEFAULT_SIZE, metavar='N',
+                    help='размер LRU-кэша каждого нормализатора (parse_pub_info, '
+                         f'авторы, даты и цены #910); 0 – без кэша (по умолчанию {memo.DEFAULT_SIZE})')
+    args = ap.parse_args()
+    if not os.path.exists(args.input_file):
+        sys.exit(f"Ошибка: файл {args.input_file} не найден.")
+    if args.sample is not None and not args.scan:
+        ap.error('--sample только вместе с --scan')
+    if args.sample is not None and not 0 < args.sample < 1:
+        ap.error('--sample: доля F, 0 < F < 1 (весь файл – без --sample)')
+    if args.scan:
+        scan_irbis_file(args.dsn, args.input_file, args.sample, args.dict_snapshot,
+                        args.exact_codes, args.index)
+        sys.exit(0)
+    parse_irbis_file(args.dsn, args.input_file, args.output_file, args.fmt,
+                     load=args.load, batch_size=args.batch_size,
+                     workers=args.workers, checkpoint_every=args.checkpoint_every,
+                     resume=args.resume, dict_snapshot=args.dict_snapshot,
+                     exact_codes=args.exact_codes, memo_size=args.memo_size,
+                     metrics_path=args.metrics, progress=args.progress,
+                     use_index=args.index, dedup_authors=args.dedup_authors,
+                     append=args.append, spill_rows=args.spill_rows,
+                     cache=args.cache, delta=args.delta,
+                     search_docs=args.search_docs, report_tables=args.report_tables,
+                     shard_rows=args.shard_rows)
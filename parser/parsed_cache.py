@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+parsed_cache.py – кэш разобранных записей (NDJSON)
+==================================================
+
+Разбор экспорта – самая дорогая часть импорта, а результат его
+(ParsedRecord) не зависит ни от формата дампа, ни от справочников.
+parse_irbis_file --cache FILE сохраняет разобранные IBIS-записи по
+одной JSON-строке; следующий запуск с тем же кэшем и тем же входным
+файлом записи не разбирает, а читает – и пишет дамп любого формата со
+скоростью чтения файла.
+
+Файл кэша:
+    {"format": "irbis-parsed", "version": 1, "parser": "4.23",
+     "input_sha256": "...", "input_bytes": N}          – заголовок
+    ["Заглавие", "", ..., [["Иванов","И","И"]], ["32.973"], ..., 0]
+    ...                                                  – записи
+    {"records_in": N}                                    – конец
+
+Кэш годен, если совпадают sha256 входного файла и версия парсера
+(нормализаторы меняются от версии к версии).  Пишется во временный
+файл и переименовывается в конце, так что недописанного кэша не бывает.
+Сжимается по расширению (&laquo;.gz&raquo; / &laquo;.bz2&raquo; / &laquo;.xz&raquo;, streams.py).
+
+Запуск:
+    python parsed_cache.py <cache> [input_file]   – заголовок, записей, годен ли
+"""
+
+from __future__ import annotations
+import hashlib, json, os, sys
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+from streams import open_stream, codec_of
+
+CACHE_FORMAT = 'irbis-parsed'
+CACHE_VERSION = 1
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+
+def file_digest(path: str, chunk: int = 1 << 20) -> str:
+    """sha256 файла (hex)."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(chunk):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _tuples(value: Any) -> Any:
+    """JSON-списки &rarr; кортежи, как в ParsedRecord (вложенность до двух уровней)."""
+    if isinstance(value, list):
+        return tuple(tuple(v) if isinstance(v, list) else v for v in value)
+    return value
+
+
+class CacheWriter:
+    """write(запись) по одной; close(records_in) – конец и переименование."""
+
+    def __init__(self, path: str, header: Dict[str, Any]):
+        self.path = path
+        self.tmp = f"{path}.tmp{codec_of(path) or ''}"
+        self.out = open_stream(self.tmp, 'w', encoding='utf-8', newline='\n')
+        self.out.write(_dumps({'format': CACHE_FORMAT, 'version': CACHE_VERSION, **header}) + '\n')
+        self.records = 0
+
+    def write(self, record: Sequence) -> None:
+        self.out.write(_dumps(record) + '\n')
+        self.records += 1
+
+    def close(self, records_in: int) -> None:
+        self.out.write(_dumps({'records_in': records_in}) + '\n')
+        self.out.close()
+        self.out = None
+        os.replace(self.tmp, self.path)
+
+    def abort(self) -> None:
+        """Недописанный кэш удаляется (после close() – ничего не делает)."""
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+            os.remove(self.tmp)
+
+
+def read_header(path: str) -> Optional[Dict[str, Any]]:
+    """Заголовок кэша или None, если файла нет / это не кэш."""
+    try:
+        with open_stream(path, 'rb') as f:
+            header = json.loads(f.readline())
+    except (FileNotFoundError, ValueError, EOFError, OSError):
+        return None
+    if not isinstance(header, dict) or header.get('format') != CACHE_FORMAT \
+            or header.get('version') != CACHE_VERSION:
+        return None
+    return header
+
+
+def is_valid(header: Optional[Dict[str, Any]], digest: str, parser: str) -> bool:
+    return (header is not None and header.get('input_sha256') == digest
+            and header.get('parser') == parser)
+
+
+def iter_cache(stream) -> Iterator[Tuple[tuple, int]]:
+    """
+    (поля записи, байт прочитано) из открытого в 'rb' кэша – после
+    заголовка.  Последней отдаётся ({'records_in': N}, ...) – строка конца.
+    """
+    pos = len(stream.readline())
+    loads = json.loads
+    for line in stream:
+        pos += len(line)
+        row = loads(line)
+        if isinstance(row, dict):
+            yield row, pos
+            return
+        yield tuple(map(_tuples, row)), pos
+
+# ──────────────── CLI ────────────────
+def _cli(path: str, infile: Optional[str] = None) -> None:
+    header = read_header(path)
+    if header is None:
+        sys.exit(f"{path}: не кэш разобранных записей")
+    print(json.dumps(header, ensure_ascii=False, indent=2))
+    records, end = 0, None
+    with open_stream(path, 'rb') as f:
+        for row, _ in iter_cache(f):
+            if isinstance(row, dict):
+                end = row
+            else:
+                records += 1
+    print(f"Записей IBIS: {records}, входных записей: "
+          f"{end['records_in'] if end else '? (нет строки конца)'}")
+    if infile:
+        ok = header.get('input_sha256') == file_digest(infile)
+        print(f"{infile}: {'совпадает' if ok else 'НЕ совпадает'} с кэшем")
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Использование: python parsed_cache.py <cache> [input_file]")
+    _cli(*sys.argv[1:])
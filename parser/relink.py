@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+relink.py – пересборка связей book_bbk / book_udc по RAW-таблицам в БД
+======================================================================
+
+Общая часть CLI fix_bbk.py и fix_udc.py: после обновления справочника
+связи книг с кодами пересчитываются прямо в БД, без выгрузки всей
+RAW-таблицы в память.
+
+    • по умолчанию – RAW-строки читаются серверным курсором пачками,
+      каждая пачка сопоставляется filter_links() с CodeIndex (код без
+      точного совпадения – к самому длинному предку, как в парсере) и
+      вставляется одним INSERT ... ON CONFLICT DO NOTHING;
+    • --exact – только точные совпадения, целиком на сервере: один
+      INSERT ... SELECT с JOIN RAW-таблицы и справочника;
+    • --incremental – таблица связей не очищается (без него – TRUNCATE),
+      добавляются только недостающие связи.  Читаются (отбор на сервере)
+      только RAW-строки без связи с тем же кодом – несопоставленные и
+      привязанные к предку.  С --exact – они сверяются со справочником.
+      Без --exact каждая заново привязывается к самому длинному предку
+      по обновлённому справочнику: нет такой связи – вставляется, а связь
+      книги с менее точным предком (&laquo;32&raquo; у &laquo;32.973.26&raquo;, когда в справочник добавили
+      &laquo;32.973&raquo;) удаляется, если её не выбирает другая RAW-строка книги;
+    • --dry-run – всё то же, но в конце ROLLBACK: только статистика.
+
+Всё выполняется в одной транзакции.
+"""
+
+from __future__ import annotations
+import argparse
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from code_index import CodeIndex
+
+DEFAULT_BATCH = 10000
+
+
+class LinkSpec(NamedTuple):
+    """Таблицы и колонки одного классификатора."""
+    name: str           # 'BBK'
+    dict_table: str     # справочник:        bbk (id, bbk_abb)
+    abb_col: str
+    raw_table: str      # RAW-коды книг:     book_bbk_raw (book_id, bbk_code)
+    raw_col: str
+    link_table: str     # связи:             book_bbk (book_id, bbk_id)
+    id_col: str
+
+
+BBK = LinkSpec('BBK', 'bbk', 'bbk_abb', 'book_bbk_raw', 'bbk_code', 'book_bbk', 'bbk_id')
+UDC = LinkSpec('UDC', 'udc', 'udc_abb', 'book_udc_raw', 'udc_code', 'book_udc', 'udc_id')
+
+
+def raw_query(spec: LinkSpec, incremental: bool) -> str:
+    """SELECT book_id, code RAW-строк (для --incremental – только без точной связи)."""
+    s = spec
+    query = f"SELECT r.book_id, r.{s.raw_col} AS code FROM public.{s.raw_table} r"
+    if incremental:
+        query += (f" WHERE NOT EXISTS (SELECT 1 FROM public.{s.link_table} l"
+                  f" JOIN public.{s.dict_table} b ON b.id = l.{s.id_col}"
+                  f" WHERE l.book_id = r.book_id AND b.{s.abb_col} = r.{s.raw_col})")
+    return query
+
+
+def relink_exact(cur, spec: LinkSpec, incremental: bool) -> Tuple[int, int, int, int]:
+    """Точные совпадения одним запросом; (RAW-строк, пропущено, вставлено, удалено)."""
+    s = spec
+    cur.execute(f"""
+        WITH raw AS ({raw_query(spec, incremental)}),
+        matched AS (
+            SELECT raw.book_id, b.id FROM raw JOIN public.{s.dict_table} b
+              ON b.{s.abb_col} = raw.code
+        ), ins AS (
+            INSERT INTO public.{s.link_table} (book_id, {s.id_col})
+            SELECT DISTINCT book_id, id FROM matched
+            ON CONFLICT DO NOTHING
+            RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM raw), (SELECT count(*) FROM matched),
+               (SELECT count(*) FROM ins)""")
+    total, matched, inserted = cur.fetchone()
+    return total, total - matched, inserted, 0
+
+
+def _superseded(existing: Set[int], resolved: Set[int], codes: Dict[int, str]) -> List[int]:
+    """
+    Связи книги с предками, которые уточнились: код связи – собственный
+    префикс кода, к которому теперь привязывается RAW-строка книги, и сам
+    ни одной её RAW-строкой не выбран.
+    """
+    return [e for e in existing - resolved if e in codes
+            and any(codes[r].startswith(codes[e]) for r in resolved if r in codes)]
+
+
+def relink_stream(conn, spec: LinkSpec, code_map: Dict[str, int],
+                  filter_links: Callable, index: Optional[CodeIndex],
+                  incremental: bool, batch: int = DEFAULT_BATCH) -> Tuple[int, int, int, int]:
+    """
+    RAW-строки серверным курсором пачками по *batch*, сопоставление
+    filter_links() и вставка пачкой; (RAW-строк, пропущено, вставлено, удалено).
+
+    С *incremental* читаются только RAW-строки без точной связи (по
+    книгам): вставляются связи с кодом, к которому строка привязывается
+    сейчас (самый длинный предок по обновлённому справочнику), а связи
+    книги с его предками, которые этим уточнились, удаляются.  Связь,
+    точно совпавшая с какой-то RAW-строкой книги, не удаляется никогда.
+    """
+    s = spec
+    insert = (f"INSERT INTO public.{s.link_table} (book_id, {s.id_col}) VALUES %s "
+              f"ON CONFLICT DO NOTHING")
+    delete = (f"DELETE FROM public.{s.link_table} l USING (VALUES %s) AS v (book_id, id) "
+              f"WHERE l.book_id = v.book_id AND l.{s.id_col} = v.id")
+    codes = {v: k for k, v in code_map.items()}
+    total = skipped = inserted = deleted = 0
+    with conn.cursor(f'relink_{s.dict_table}') as src, conn.cursor() as dst:
+
+        def link(rows: List[Tuple[int, str]]) -> None:
+            nonlocal total, skipped, inserted, deleted
+            links, missed = filter_links(rows, code_map, index)
+            skipped += missed
+            stale: List[Tuple[int, int]] = []
+            total += len(rows)
+            if incremental:
+                # связи с предками (не точные ни для одной RAW-строки книги)
+                dst.execute(f"SELECT l.book_id, l.{s.id_col} FROM public.{s.link_table} l"
+                            f" JOIN public.{s.dict_table} b ON b.id = l.{s.id_col}"
+                            f" WHERE l.book_id = ANY(%s) AND NOT EXISTS ("
+                            f"SELECT 1 FROM public.{s.raw_table} r WHERE r.book_id = l.book_id"
+                            f" AND r.{s.raw_col} = b.{s.abb_col})",
+                            (list({b for b, _ in rows}),))
+                existing: Dict[int, Set[int]] = {}
+                for book_id, link_id in dst.fetchall():
+                    existing.setdefault(book_id, set()).add(link_id)
+                resolved: Dict[int, Set[int]] = {}
+                for book_id, link_id in links:
+                    resolved.setdefault(book_id, set()).add(link_id)
+                for book_id, ids in resolved.items():
+                    stale += [(book_id, e) for e in
+                              _superseded(existing.get(book_id, set()), ids, codes)]
+            if stale:
+                execute_values(dst, delete, stale, page_size=len(stale))
+                deleted += dst.rowcount
+            if links:
+                execute_values(dst, insert, links, page_size=len(links))
+                inserted += dst.rowcount
+
+        src.itersize = batch
+        if not incremental:
+            src.execute(raw_query(spec, False))
+            while rows := src.fetchmany(batch):
+                link(rows)
+            return total, skipped, inserted, deleted
+        # по книгам целиком: строки последней книги пачки ждут следующую пачку
+        src.execute(raw_query(spec, True) + " ORDER BY r.book_id")
+        pending: List[Tuple[int, str]] = []
+        while rows := src.fetchmany(batch):
+            rows = pending + rows
+            cut = len(rows)
+            while cut and rows[cut - 1][0] == rows[-1][0]:
+                cut -= 1
+            if cut:
+                link(rows[:cut])
+            pending = rows[cut:]
+        if pending:
+            link(pending)
+    return total, skipped, inserted, deleted
+
+
+def run_cli(spec: LinkSpec, load_map: Callable, filter_links: Callable,
+            prog: str) -> None:
+    ap = argparse.ArgumentParser(
+        prog=prog, description=f"Пересборка public.{spec.link_table} по "
+                               f"public.{spec.raw_table} и справочнику {spec.name}.")
+    ap.add_argument('dsn', help='строка подключения psycopg2')
+    ap.add_argument('--exact', action='store_true',
+                    help='только точные совпадения кодов – одним SQL-запросом на сервере')
+    ap.add_argument('--incremental', action='store_true',
+                    help='только недостающие связи (без --exact – и уточнение связей '
+                         'с предками по обновлённому справочнику); без ключа таблица '
+                         'связей пересобирается целиком')
+    ap.add_argument('--batch-size', type=int, default=DEFAULT_BATCH, metavar='N',
+                    help=f'RAW-строк в пачке (по умолчанию {DEFAULT_BATCH})')
+    ap.add_argument('--dry-run', action='store_true',
+                    help='ничего не менять (ROLLBACK), только статистика')
+    args = ap.parse_args()
+
+    with psycopg2.connect(args.dsn) as conn:
+        with conn.cursor() as cur:
+            if not args.incremental:
+                cur.execute(f"TRUNCATE public.{spec.link_table}")
+            if args.exact:
+                total, skipped, inserted, deleted = relink_exact(cur, spec, args.incremental)
+                index = None
+            else:
+                code_map = load_map(cur)
+                index = CodeIndex(code_map)
+                total, skipped, inserted, deleted = relink_stream(
+                    conn, spec, code_map, filter_links, index,
+                    args.incremental, args.batch_size)
+        print(f"Пар RAW{' без точной связи' if args.incremental else ''}: {total}")
+        print(f"Совпали: {total - skipped}   |   Пропущены: {skipped}")
+        if index is not None:
+            print(f"Сопоставление: {index.summary()}")
+        print(f"Вставлено в public.{spec.link_table}: {inserted}"
+              f"{'  (--dry-run: откат)' if args.dry_run else ''}")
+        if deleted:
+            print(f"Удалено связей с уточнёнными предками: {deleted}")
+        if args.dry_run:
+            conn.rollback()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+report_tables.py – сводные таблицы по экземплярам за тот же проход
+==================================================================
+
+Отчёты (экземпляры по местам хранения, поступления по годам, итог
+фонда) сервер считал бы по всей public.book_copy на каждый запрос.
+Парсер и так проходит каждый экземпляр #910 с нормализованными датой,
+местом хранения и ценой, поэтому ReportTotals копит итоги по ходу
+разбора, а в конце они пишутся готовыми строками:
+
+    report_copies_by_place      – место хранения: экземпляров, книг, сумма;
+    report_acquisitions_by_year – год поступления: экземпляров, сумма;
+    report_stock_totals         – одна строка: книг, книг с экземплярами,
+                                  экземпляров, с ценой, сумма.
+
+Считается так же, как public.refresh_report_tables() в BDscript.txt
+(по book_copy в БД): экземпляр – уникальный инвентарный номер книги,
+цена округляется до копеек, как в NUMERIC(12,2).  Пустое место / дата –
+строка с NULL.  Функцией же таблицы пересчитываются после --append и
+правок экземпляров через сервер.
+"""
+
+from __future__ import annotations
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+REPORT_TABLES = ('report_copies_by_place', 'report_acquisitions_by_year',
+                 'report_stock_totals')
+
+_CENT = Decimal('0.01')
+
+
+class ReportTotals:
+    """add(экземпляры книги) по каждой книге; rows() – строки таблиц."""
+
+    def __init__(self):
+        # место &rarr; [экземпляров, книг, сумма]; год &rarr; [экземпляров, сумма]
+        self.places: Dict[Optional[str], List] = {}
+        self.years: Dict[Optional[int], List] = {}
+        self.books = self.books_with_copies = 0
+        self.copies = self.priced = 0
+        self.total = Decimal(0)
+
+    def add(self, copies: Sequence[Tuple[str, Optional[str], Optional[str], Optional[str]]]) -> None:
+        """Экземпляры одной книги: (инв. номер, дата, место, цена); повторы номера не в счёт."""
+        self.books += 1
+        seen: Set[str] = set()
+        places: Set[Optional[str]] = set()
+        for inv_no, date_in, storage, price in copies:
+            if inv_no in seen:
+                continue
+            seen.add(inv_no)
+            value = Decimal(price).quantize(_CENT, ROUND_HALF_UP) if price else None
+            storage = storage or None
+            place = self.places.get(storage)
+            if place is None:
+                place = self.places[storage] = [0, 0, Decimal(0)]
+            place[0] += 1
+            if storage not in places:
+                places.add(storage)
+                place[1] += 1
+            year_key = int(date_in[:4]) if date_in else None
+            year = self.years.get(year_key)
+            if year is None:
+                year = self.years[year_key] = [0, Decimal(0)]
+            year[0] += 1
+            if value is not None:
+                place[2] += value
+                year[1] += value
+                self.priced += 1
+                self.total += value
+        if seen:
+            self.books_with_copies += 1
+            self.copies += len(seen)
+
+    def rows(self) -> Iterator[Tuple[str, tuple]]:
+        """(таблица, строка) в порядке REPORT_TABLES."""
+        for storage in sorted(self.places, key=lambda k: (k is None, k or '')):
+            copies, books, total = self.places[storage]
+            yield 'report_copies_by_place', (storage, copies, books, total)
+        for year in sorted(self.years, key=lambda k: (k is None, k or 0)):
+            copies, total = self.years[year]
+            yield 'report_acquisitions_by_year', (year, copies, total)
+        yield 'report_stock_totals', (self.books, self.books_with_copies, self.copies,
+                                      self.priced, self.total)
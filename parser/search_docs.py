@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+search_docs.py – строки public.book_search (parse_irbis_file --search-docs)
+==========================================================================
+
+Поиск по каталогу на сервере соединяет book, book_author, author,
+book_pub_place и publisher на каждый запрос.  У парсера все эти значения
+на руках при разборе записи, поэтому он может сразу написать одну
+денормализованную строку на книгу:
+
+    title, series, authors («Фамилия Имя Отчество; ...»), publisher,
+    city, pub_year, bbk_codes / udc_codes (RAW-коды через пробел),
+    search_text – всё словесное вместе, нормализовано для индексов.
+
+Нормализация search_text: casefold, ё &rarr; е, всё, кроме букв и цифр, – в
+пробел (&laquo;Е.Ф.&raquo; &rarr; &laquo;е ф&raquo;).  По нему в БД – сгенерированный tsvector
+(GIN) и триграммный GIN-индекс (pg_trgm), см. BDscript.txt; запрос с
+той же нормализацией искомой строки – один индексный поиск:
+
+    SELECT book_id FROM public.book_search
+     WHERE tsv @@ plainto_tsquery('russian', :q)      -- по словам
+        OR search_text LIKE '%' || :q || '%'          -- подстрока (триграммы)
+"""
+
+from __future__ import annotations
+import re
+from typing import Iterable, Optional, Sequence, Tuple
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize(text: str) -> str:
+    """Текст &rarr; нижний регистр, ё &rarr; е, только буквы и цифры через пробел."""
+    return _NON_WORD.sub(' ', text.casefold().replace('ё', 'е')).strip()
+
+
+def author_name(last: str, first: str, patr: str) -> str:
+    return ' '.join(x for x in (last, first, patr) if x)
+
+
+def search_row(book_id: int, title: str, series: str, authors: Iterable[str],
+               publisher: Optional[str], city: Optional[str], year: Optional[int],
+               bbk_codes: Sequence[str], udc_codes: Sequence[str]) -> Tuple:
+    """Строка public.book_search в порядке колонок sql_writer.TABLES."""
+    authors = '; '.join(authors)
+    text = normalize(' '.join(x for x in (title, series, authors, publisher, city) if x))
+    return (book_id, title, series, authors, publisher, city, year,
+            ' '.join(bbk_codes), ' '.join(udc_codes), text)
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+sql_writer.py – вывод строк таблиц библиотеки в SQL-дамп
+========================================================
+
+Парсер (parse_irbis_file.py) ничего не знает о формате дампа: он передаёт
+писателю строки вида (table, values).  Писатели:
+
+InsertWriter
+    Один &laquo;INSERT INTO ...;&raquo; на строку, в порядке поступления
+    (исходный формат дампа).  Умеет и UPDATE / DELETE – для дельта-дампа
+    (parse_irbis_file --delta).
+
+CopyWriter
+    Один блок &laquo;COPY public.<table> (...) FROM stdin;&raquo; на таблицу,
+    блоки идут в порядке зависимостей (TABLES).  Строки каждой таблицы
+    копятся во временных файлах, поэтому память не растёт с размером
+    дампа.  Весь дамп оборачивается в одну транзакцию.
+
+ShardWriter
+    Каталог: файл COPY-строк на таблицу (&laquo;<table>.0001.copy&raquo;, при
+    shard_rows – несколько кусков) и manifest.json с колонками, файлами и
+    уровнями зависимостей (load_levels).  Грузит load_shards.py –
+    независимые таблицы параллельно, по нескольким соединениям.
+
+DbLoader
+    Без промежуточного файла: строки пачками по batch_size уходят прямо
+    в БД через cursor.copy_expert() в транзакции вызывающего кода.
+    Считает строки и время по каждой таблице.
+
+Для возобновляемых импортов у писателей есть checkpoint() &rarr; состояние
+(всё записанное к этому моменту сбрасывается на диск / фиксируется в БД)
+и restore(состояние) – откат вывода к контрольной точке.
+
+Значения строк: None / '' &rarr; NULL, int и Decimal пишутся как числа,
+остальное – как текст.
+"""
+
+from __future__ import annotations
+import io, json, os, re, tempfile, time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, TextIO, Tuple
+
+# ───── таблицы: порядок = порядок зависимостей ─────
+TABLES: Dict[str, Tuple[str, ...]] = {
+    'publisher':      ('id', 'name'),
+    'book':           ('id', 'title', '"type"', 'edit', 'edition_statement',
+                       'phys_desc', 'series'),
+    'author':         ('id', 'last_name', 'first_name', 'patronymic', 'birth_year'),
+    'book_pub_place': ('book_id', 'publisher_id', 'city', 'pub_year'),
+    'book_author':    ('book_id', 'author_id'),
+    'book_bbk_raw':   ('book_id', 'bbk_code'),
+    'book_udc_raw':   ('book_id', 'udc_code'),
+    'book_bbk':       ('book_id', 'bbk_id'),
+    'book_udc':       ('book_id', 'udc_id'),
+    'book_copy':      ('book_id', 'inventory_no', 'receipt_date', 'storage_place',
+                       'price'),
+    'book_search':    ('book_id', 'title', 'series', 'authors', 'publisher', 'city',
+                       'pub_year', 'bbk_codes', 'udc_codes', 'search_text'),
+    'report_copies_by_place':      ('storage_place', 'copies', 'books', 'total_price'),
+    'report_acquisitions_by_year': ('receipt_year', 'copies', 'total_price'),
+    'report_stock_totals':         ('books', 'books_with_copies', 'copies',
+                                    'priced_copies', 'total_price'),
+}
+
+ON_CONFLICT: Dict[str, str] = {
+    'book_author':  ' ON CONFLICT DO NOTHING',
+    'book_bbk_raw': ' ON CONFLICT DO NOTHING',
+    'book_udc_raw': ' ON CONFLICT DO NOTHING',
+    'book_bbk':     ' ON CONFLICT DO NOTHING',
+    'book_udc':     ' ON CONFLICT DO NOTHING',
+    'book_copy':    ' ON CONFLICT (book_id,inventory_no) DO NOTHING',
+}
+
+# дельта-дамп: у изменённой книги экземпляры обновляются на месте, а не
+# удаляются и вставляются заново – на них ссылается borrow_record
+DELTA_ON_CONFLICT: Dict[str, str] = {
+    **ON_CONFLICT,
+    'book_copy': ' ON CONFLICT (book_id,inventory_no) DO UPDATE SET '
+                 'receipt_date=EXCLUDED.receipt_date,storage_place=EXCLUDED.storage_place,'
+                 'price=EXCLUDED.price',
+}
+
+# дельта-дамп: строка с экземпляром на руках (borrow_record без
+# return_date) не удаляется – триггеры prevent_*_deletion_if_borrowed
+# оборвали бы весь дамп; условие – для DELETE FROM <таблица>
+ON_LOAN: Dict[str, str] = {
+    'book':      'EXISTS (SELECT 1 FROM public.book_copy bc JOIN public.borrow_record br '
+                 'ON br.book_copy_id = bc.id WHERE bc.book_id = book.id AND br.return_date IS NULL)',
+    'book_copy': 'EXISTS (SELECT 1 FROM public.borrow_record br '
+                 'WHERE br.book_copy_id = book_copy.id AND br.return_date IS NULL)',
+}
+
+# внешние ключи между таблицами дампа: таблица &rarr; родительские таблицы
+DEPENDS: Dict[str, Tuple[str, ...]] = {
+    'book_pub_place': ('book', 'publisher'),
+    'book_author':    ('book', 'author'),
+    'book_bbk_raw':   ('book',),
+    'book_udc_raw':   ('book',),
+    'book_bbk':       ('book',),
+    'book_udc':       ('book',),
+    'book_copy':      ('book',),
+    'book_search':    ('book',),
+}
+
+Row = Sequence[object]
+
+
+def load_levels(tables: Sequence[str]) -> List[List[str]]:
+    """
+    *tables* по уровням: таблицы уровня зависят только от предыдущих
+    уровней и грузятся одновременно.  Порядок внутри уровня – как в TABLES.
+    """
+    levels: List[List[str]] = []
+    done: set = set()
+    left = [t for t in TABLES if t in tables]
+    while left:
+        level = [t for t in left if all(d in done or d not in tables for d in DEPENDS.get(t, ()))]
+        levels.append(level)
+        done.update(level)
+        left = [t for t in left if t not in done]
+    return levels
+
+# ───────────────────────── literals ─────────────────────────
+def sql_literal(v: object) -> str:
+    """Значение &rarr; SQL-литерал для INSERT."""
+    if v is None or v == '':
+        return 'NULL'
+    if isinstance(v, (int, Decimal)):
+        return str(v)
+    return "'" + str(v).replace("'", "''") + "'"
+
+
+_COPY_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'}
+_COPY_TRANS = str.maketrans({
+    **{chr(c): f'\\x{c:02x}' for c in range(0x20)},
+    **_COPY_ESCAPES,
+})
+
+def copy_literal(v: object) -> str:
+    """
+    Значение &rarr; поле COPY (text format).
+
+    NULL &rarr; \\N; обратный слэш, табуляция, переводы строк и прочие
+    управляющие символы (в т.ч. разделитель подполей \\x1f) экранируются.
+    """
+    if v is None or v == '':
+        return '\\N'
+    if isinstance(v, (int, Decimal)):
+        return str(v)
+    return str(v).translate(_COPY_TRANS)
+
+
+def copy_line(values: Row) -> str:
+    return '\t'.join(copy_literal(v) for v in values) + '\n'
+
+
+def copy_header(table: str) -> str:
+    return f"COPY public.{table} ({', '.join(TABLES[table])}) FROM stdin;\n"
+
+# ───────────────────────── writers ─────────────────────────
+class InsertWriter:
+    """INSERT на каждую строку, в порядке поступления."""
+
+    def __init__(self, out: TextIO, on_conflict: Dict[str, str] = ON_CONFLICT):
+        self.out = out
+        self.on_conflict = on_conflict
+
+    def comment(self, text: str) -> None:
+        self.out.write(text)
+
+    def row(self, table: str, values: Row) -> None:
+        self.out.write(
+            f"INSERT INTO public.{table}({','.join(TABLES[table])}) "
+            f"VALUES ({','.join(sql_literal(v) for v in values)})"
+            f"{self.on_conflict.get(table, '')};\n")
+
+    def update(self, table: str, values: Row) -> None:
+        """UPDATE строки по первой колонке (id) – остальные колонки из *values*."""
+        cols = TABLES[table]
+        sets = ','.join(f"{c}={sql_literal(v)}" for c, v in zip(cols[1:], values[1:]))
+        self.out.write(f"UPDATE public.{table} SET {sets} "
+                       f"WHERE {cols[0]}={sql_literal(values[0])};\n")
+
+    def delete(self, table: str, where: str) -> None:
+        """DELETE по готовому условию (литералы – через sql_literal)."""
+        self.out.write(f"DELETE FROM public.{table} WHERE {where};\n")
+
+    def checkpoint(self) -> Dict[str, Any]:
+        self.out.flush()
+        return {'pos': self.out.tell()}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.out.seek(state['pos'])
+        self.out.truncate()
+
+    def close(self) -> None:
+        pass
+
+
+class CopyWriter:
+    """
+    Блок COPY на таблицу; строки до закрытия лежат во временных файлах.
+    С spool_dir файлы именованные (<spool_dir>/<table>.copy) и переживают
+    падение процесса – это нужно для checkpoint()/restore().
+    """
+
+    def __init__(self, out: TextIO, spool_dir: Optional[str] = None):
+        self.out = out
+        self.spool_dir = spool_dir
+        self.rows: Dict[str, int] = {t: 0 for t in TABLES}
+        self._spool: Dict[str, Optional[TextIO]] = {t: None for t in TABLES}
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+
+    def _open_spool(self, table: str, mode: str = 'w+') -> TextIO:
+        if self.spool_dir is None:
+            spool = tempfile.TemporaryFile(mode, encoding='utf-8', newline='\n')
+        else:
+            spool = open(os.path.join(self.spool_dir, f"{table}.copy"), mode,
+                         encoding='utf-8', newline='\n')
+        self._spool[table] = spool
+        return spool
+
+    def comment(self, text: str) -> None:
+        pass                                    # в COPY-блоки комментарии не пишутся
+
+    def row(self, table: str, values: Row) -> None:
+        spool = self._spool[table] or self._open_spool(table)
+        spool.write(copy_line(values))
+        self.rows[table] += 1
+
+    def checkpoint(self) -> Dict[str, Any]:
+        sizes = {}
+        for table, spool in self._spool.items():
+            if spool is not None:
+                spool.flush()
+                sizes[table] = spool.tell()
+        self.out.flush()
+        return {'pos': self.out.tell(), 'rows': dict(self.rows), 'sizes': sizes}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.out.seek(state['pos'])
+        self.out.truncate()
+        self.rows = dict(state['rows'])
+        for table, size in state['sizes'].items():
+            spool = self._open_spool(table, 'r+')
+            spool.seek(size)
+            spool.truncate()
+
+    def close(self) -> None:
+        self.out.write("BEGIN;\n\n")
+        for table in TABLES:
+            spool = self._spool[table]
+            if spool is None:
+                continue
+            self.out.write(f"-- {table}: {self.rows[table]} строк\n")
+            self.out.write(copy_header(table))
+            spool.seek(0)
+            while chunk := spool.read(1 << 20):
+                self.out.write(chunk)
+            self.out.write("\\.\n\n")
+            spool.close()
+            self._spool[table] = None
+            if self.spool_dir:
+                os.remove(os.path.join(self.spool_dir, f"{table}.copy"))
+        self.out.write("COMMIT;\n")
+        if self.spool_dir:
+            os.rmdir(self.spool_dir)
+
+
+class ShardWriter:
+    """
+    COPY-строки в отдельный файл на таблицу, кусками по shard_rows строк
+    (0 – один файл); в close() – manifest.json.  Файлы открыты до конца,
+    поэтому checkpoint() / restore() – это размер текущего куска и список
+    уже готовых.
+    """
+
+    MANIFEST = 'manifest.json'
+    FORMAT = 'irbis-shards'
+    _NAME_RE = re.compile(r'^(?P<table>\w+)\.\d{4}\.copy$')
+
+    def __init__(self, out_dir: str, shard_rows: int = 0,
+                 header: Optional[Dict[str, Any]] = None, resume: bool = False):
+        self.out_dir = out_dir
+        self.shard_rows = shard_rows
+        self.header = header or {}
+        self.rows: Dict[str, int] = {t: 0 for t in TABLES}
+        self.files: Dict[str, List[List]] = {t: [] for t in TABLES}     # [[имя, строк], ...]
+        self._open: Dict[str, Optional[TextIO]] = {t: None for t in TABLES}
+        os.makedirs(out_dir, exist_ok=True)
+        if not resume:
+            self._remove_stale({})
+
+    def _remove_stale(self, keep: Dict[str, List[List]]) -> None:
+        """Куски и манифест прошлых запусков (кроме *keep*) – удалить."""
+        kept = {name for files in keep.values() for name, _ in files}
+        for name in os.listdir(self.out_dir):
+            if (name == self.MANIFEST or self._NAME_RE.match(name)) and name not in kept:
+                os.remove(os.path.join(self.out_dir, name))
+
+    def _new_shard(self, table: str) -> TextIO:
+        if self._open[table] is not None:
+            self._open[table].close()
+        name = f"{table}.{len(self.files[table]) + 1:04d}.copy"
+        self.files[table].append([name, 0])
+        shard = self._open[table] = open(os.path.join(self.out_dir, name), 'w',
+                                         encoding='utf-8', newline='\n')
+        return shard
+
+    def comment(self, text: str) -> None:
+        pass
+
+    def row(self, table: str, values: Row) -> None:
+        shard = self._open[table]
+        files = self.files[table]
+        if shard is None or (self.shard_rows and files[-1][1] >= self.shard_rows):
+            shard = self._new_shard(table)
+        shard.write(copy_line(values))
+        files[-1][1] += 1
+        self.rows[table] += 1
+
+    def checkpoint(self) -> Dict[str, Any]:
+        sizes = {}
+        for table, shard in self._open.items():
+            if shard is not None:
+                shard.flush()
+                sizes[table] = shard.tell()
+        return {'rows': dict(self.rows), 'sizes': sizes,
+                'files': {t: [list(f) for f in files] for t, files in self.files.items()}}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.rows = dict(state['rows'])
+        self.files = {t: [list(f) for f in files] for t, files in state['files'].items()}
+        self._remove_stale(self.files)
+        for table, size in state['sizes'].items():
+            name = self.files[table][-1][0]
+            shard = self._open[table] = open(os.path.join(self.out_dir, name), 'r+',
+                                             encoding='utf-8', newline='\n')
+            shard.seek(size)
+            shard.truncate()
+
+    def close(self) -> None:
+        for table, shard in self._open.items():
+            if shard is not None:
+                shard.close()
+                self._open[table] = None
+        tables = [t for t in TABLES if self.rows[t]]
+        manifest = {
+            'format': self.FORMAT, 'version': 1, **self.header,
+            'levels': load_levels(tables),
+            'tables': {t: {'columns': list(TABLES[t]), 'rows': self.rows[t],
+                           'depends': [d for d in DEPENDS.get(t, ()) if d in tables],
+                           'files': [{'name': n, 'rows': r} for n, r in self.files[t]]}
+                       for t in tables},
+        }
+        tmp = os.path.join(self.out_dir, f"{self.MANIFEST}.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(self.out_dir, self.MANIFEST))
+
+
+class DbLoader:
+    """
+    COPY прямо в БД пачками.  Когда буфер любой таблицы набирает
+    batch_size строк, сбрасываются все таблицы в порядке TABLES –
+    так родительские строки всегда попадают в БД раньше дочерних.
+    Фиксация транзакции – забота вызывающего кода; только checkpoint()
+    сам делает commit, чтобы загруженное до контрольной точки уцелело.
+    """
+
+    def __init__(self, conn, batch_size: int = 10000):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.rows: Dict[str, int] = {t: 0 for t in TABLES}
+        self.seconds: Dict[str, float] = {t: 0.0 for t in TABLES}
+        self._buf: Dict[str, List[str]] = {t: [] for t in TABLES}
+
+    def comment(self, text: str) -> None:
+        pass
+
+    def row(self, table: str, values: Row) -> None:
+        buf = self._buf[table]
+        buf.append(copy_line(values))
+        if len(buf) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.conn.cursor() as cur:
+            for table, buf in self._buf.items():
+                if not buf:
+                    continue
+                t0 = time.perf_counter()
+                cur.copy_expert(copy_header(table), io.StringIO(''.join(buf)))
+                self.seconds[table] += time.perf_counter() - t0
+                self.rows[table] += len(buf)
+                buf.clear()
+
+    def checkpoint(self) -> Dict[str, Any]:
+        self.flush()
+        self.conn.commit()
+        return {'rows': dict(self.rows), 'seconds': dict(self.seconds)}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.rows = dict(state['rows'])
+        self.seconds = dict(state['seconds'])
+
+    def close(self) -> None:
+        self.flush()
+
+    def report(self) -> str:
+        """Строки/сек по таблицам для итоговой статистики."""
+        lines = []
+        for table in TABLES:
+            n, sec = self.rows[table], self.seconds[table]
+            if n:
+                lines.append(f"  ▸ {table:<15}: {n:>9} строк за {sec:7.2f} с"
+                             f"  ({n / sec if sec else 0:,.0f} строк/с)")
+        return '\n'.join(lines)
+
+
+WRITERS = {'sql': InsertWriter, 'copy': CopyWriter, 'shards': ShardWriter}
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+streams.py – открытие файлов со сжатием по расширению
+=====================================================
+
+Экспорты ИРБИС приходят архивами, а SQL-дампы занимают гигабайты.
+open_stream() открывает &laquo;.gz&raquo; / &laquo;.bz2&raquo; / &laquo;.xz&raquo; через gzip / bz2 / lzma,
+остальное – обычным open().  Данные (раз)сжимаются на лету, временных
+файлов нет.
+
+    with open_stream('irbis_data.txt.gz', 'rb') as f: ...
+    with open_stream('inserts.sql.xz', 'w', encoding='utf-8') as out: ...
+"""
+
+from __future__ import annotations
+import bz2, gzip, lzma, os
+from functools import partial
+from typing import IO, Optional
+
+# gzip по умолчанию жмёт на уровне 9 – втрое медленнее 6 при почти том же размере
+CODECS = {
+    '.gz':  partial(gzip.open, compresslevel=6),
+    '.bz2': bz2.open,
+    '.xz':  lzma.open,
+}
+
+
+def codec_of(path: str) -> Optional[str]:
+    """Расширение сжатия (&laquo;.gz&raquo;, ...) или None."""
+    ext = os.path.splitext(str(path))[1].lower()
+    return ext if ext in CODECS else None
+
+
+def open_stream(path: str, mode: str = 'rb', encoding: Optional[str] = None,
+                newline: Optional[str] = None, buffering: int = -1) -> IO:
+    """
+    open() с прозрачным сжатием по расширению *path*.  Режимы – как у
+    open(): 'rb', 'wb', 'r', 'w' (текстовые – с encoding/newline).
+    """
+    codec = codec_of(path)
+    if codec is None:
+        return open(path, mode, buffering=buffering, encoding=encoding, newline=newline)
+    if 'b' in mode:
+        return CODECS[codec](path, mode)
+    return CODECS[codec](path, mode.replace('t', '') + 't',
+                         encoding=encoding, newline=newline)
+
+
+def disk_position(stream: IO) -> int:
+    """
+    Сколько байт файла на диске уже прочитано – для сжатого потока это
+    позиция в архиве, а не в распакованных данных (для хода импорта).
+    """
+    return os.lseek(stream.fileno(), 0, os.SEEK_CUR)
+
+
+def compression_ratio(stream: IO) -> float:
+    """
+    Распаковано / прочитано с диска для сжатого потока на чтение; 0 –
+    пока ничего не прочитано.  Размер архива × ratio – оценка размера
+    распакованных данных (для хода импорта).
+    """
+    disk = disk_position(stream)
+    return stream.tell() / disk if disk else 0.0
@@ -1,11 +1,35 @@
 #!/usr/bin/env python3
-# udc_excel_to_sql.py — Excel (2 колонки) &rarr; INSERT-ы PostgreSQL
-# pip install pandas openpyxl
+# udc_excel_to_sql.py — Excel (2 колонки) &rarr; INSERT-ы / COPY PostgreSQL
+# pip install openpyxl
+#
+# Лист читается потоком (openpyxl, read_only): строки по одной уходят в
+# rows_to_records(), весь лист в памяти не собирается.
+#   python udc_excel_to_sql.py udc.xlsx udc.sql                 – INSERT-ы
+#   python udc_excel_to_sql.py udc.xlsx udc.sql --format copy   – COPY-блок
+#   python udc_excel_to_sql.py udc.xlsx --load "<DSN>"          – сразу в БД
+# SQL может быть сжатым: .gz / .bz2 / .xz (см. streams.py).
 
-import sys, re, pandas as pd
+import argparse, io, re
+from typing import Iterable, Iterator, Tuple
+
+from streams import open_stream
+from sql_writer import copy_line
 
 COL_CODE, COL_DESC = "udc_abb", "description"
 space_re = re.compile(r'\s+')
+BATCH_ROWS = 10000          # строк в одной пачке COPY для --load
+
+# COPY не умеет ON CONFLICT: строки идут во временную таблицу, оттуда –
+# INSERT ... ON CONFLICT DO NOTHING, как у INSERT-ов.  ord – номер записи
+# в листе: при повторе кода (в udc.xlsx есть &laquo;-1&raquo;, &laquo;-35&raquo; ...) берётся
+# первое вхождение, как у INSERT-ов по порядку
+STAGE_DDL = (f"CREATE TEMP TABLE udc_load (ord INT, {COL_CODE} TEXT, {COL_DESC} TEXT) "
+             "ON COMMIT DROP")
+STAGE_COPY = f"COPY udc_load (ord, {COL_CODE}, {COL_DESC}) FROM stdin"
+STAGE_INSERT = (f"INSERT INTO public.udc ({COL_CODE}, {COL_DESC}) "
+                f"SELECT DISTINCT ON ({COL_CODE}) {COL_CODE}, {COL_DESC} FROM udc_load "
+                f"ORDER BY {COL_CODE}, ord "
+                f"ON CONFLICT ({COL_CODE}) DO NOTHING")
 
 def pg_escape(text: str) -> str:
     return text.replace("'", "''")
@@ -13,9 +37,29 @@ def pg_escape(text: str) -> str:
 def normalize(text: str) -> str:
     return space_re.sub(' ', text).strip()
 
-def rows_to_records(df):
+def cell_text(value) -> str:
+    """Значение ячейки &rarr; строка, как pandas.read_excel(dtype=str): 4.0 &rarr; '4'."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def iter_sheet_rows(src_xlsx: str) -> Iterator[Tuple[str, str]]:
+    """(код, описание) первых двух колонок первого листа, потоком."""
+    from openpyxl import load_workbook
+    wb = load_workbook(src_xlsx, read_only=True, data_only=True)
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            row = tuple(row[:2]) + (None,) * (2 - len(row))
+            yield cell_text(row[0]), cell_text(row[1])
+    finally:
+        wb.close()
+
+def rows_to_records(rows: Iterable[Tuple[str, str]]):
+    """Любые пары (код, описание) &rarr; записи; строки без кода продолжают описание."""
     code, parts = None, []
-    for raw_code, raw_desc in df.itertuples(index=False, name=None):
+    for raw_code, raw_desc in rows:
         c = normalize(str(raw_code))
         d = normalize(str(raw_desc))
 
@@ -29,20 +73,65 @@ def rows_to_records(df):
     if code and parts:
         yield code, ' '.join(parts)
 
-def main(src_xlsx: str, dst_sql: str):
-    df = pd.read_excel(src_xlsx, header=None, dtype=str).fillna('')
+def write_sql(records, f, src_xlsx: str) -> int:
+    f.write(f"-- INSERT-ы УДК, сгенерировано из {src_xlsx}\n")
+    n = 0
+    for code, desc in records:
+        f.write(
+            "INSERT INTO public.udc (udc_abb, description) "
+            f"VALUES ('{pg_escape(code)}', '{pg_escape(desc)}') "
+            "ON CONFLICT (udc_abb) DO NOTHING;\n"
+        )
+        n += 1
+    return n
+
+def write_copy(records, f, src_xlsx: str) -> int:
+    f.write(f"-- COPY УДК, сгенерировано из {src_xlsx}\n"
+            f"BEGIN;\n{STAGE_DDL};\n{STAGE_COPY};\n")
+    n = 0
+    for n, (code, desc) in enumerate(records, 1):
+        f.write(copy_line((n, code, desc)))
+    f.write(f"\\.\n{STAGE_INSERT};\nCOMMIT;\n")
+    return n
+
+def load(records, dsn: str) -> Tuple[int, int]:
+    """COPY пачками во временную таблицу и INSERT в public.udc; (строк, новых)."""
+    import psycopg2
+    n = 0
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute(STAGE_DDL)
+        batch = []
+        for ord_, (code, desc) in enumerate(records, 1):
+            batch.append(copy_line((ord_, code, desc)))
+            if len(batch) >= BATCH_ROWS:
+                cur.copy_expert(STAGE_COPY, io.StringIO(''.join(batch)))
+                n += len(batch)
+                batch.clear()
+        if batch:
+            cur.copy_expert(STAGE_COPY, io.StringIO(''.join(batch)))
+            n += len(batch)
+        cur.execute(STAGE_INSERT)
+        return n, cur.rowcount
 
-    with open(dst_sql, 'w', encoding='utf-8') as f:
-        f.write(f"-- INSERT-ы УДК, сгенерировано из {src_xlsx}\n")
-        for code, desc in rows_to_records(df):
-            f.write(
-                "INSERT INTO public.udc (udc_abb, description) "
-                f"VALUES ('{pg_escape(code)}', '{pg_escape(desc)}') "
-                "ON CONFLICT (udc_abb) DO NOTHING;\n"
-            )
+def main(src_xlsx: str, dst_sql: str = None, fmt: str = 'sql', dsn: str = None):
+    records = rows_to_records(iter_sheet_rows(src_xlsx))
+    if dsn:
+        n, new = load(records, dsn)
+        print(f"Загружено {n} УДК-записей, новых в public.udc: {new}")
+        return
+    with open_stream(dst_sql, 'w', encoding='utf-8', newline='\n') as f:
+        n = (write_copy if fmt == 'copy' else write_sql)(records, f, src_xlsx)
+    print(f"Сохранено {n} УДК-записей в {dst_sql}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Использование: python udc_excel_to_sql.py <вход.xlsx> <выход.sql>")
-        sys.exit(1)
-    main(sys.argv[1], sys.argv[2])
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="Excel УДК (2 колонки) &rarr; SQL / COPY / БД.")
+    ap.add_argument('src_xlsx')
+    ap.add_argument('dst_sql', nargs='?')
+    ap.add_argument('--format', dest='fmt', choices=('sql', 'copy'), default='sql',
+                    help='sql – INSERT на строку (по умолчанию), copy – один блок COPY')
+    ap.add_argument('--load', metavar='DSN',
+                    help='грузить прямо в БД (COPY + INSERT ... ON CONFLICT DO NOTHING)')
+    args = ap.parse_args()
+    if not args.load and not args.dst_sql:
+        ap.error("нужен выходной файл или --load DSN")
+    main(args.src_xlsx, args.dst_sql, args.fmt, args.load)